@@ -1,33 +1,55 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, session, stream_with_context
+import importlib.util
 import os
-import pandas as pd
 import json
 from datetime import datetime
-import tempfile
+import threading
+import time
 import traceback
 from werkzeug.utils import secure_filename
-import uuid
 
-# Import our PySpark workflow
-try:
-    from pyspark_workflow import InformaticaToPySparkWorkflow
-    PYSPARK_AVAILABLE = True
-except ImportError:
+# pandas, PySpark and the workflow module are imported on first use so that
+# worker boot only pays for Flask; a pre-warm thread can load them in the background
+PYSPARK_AVAILABLE = importlib.util.find_spec('pyspark') is not None
+if not PYSPARK_AVAILABLE:
     print("⚠️  PySpark not available. Running in demo mode.")
-    PYSPARK_AVAILABLE = False
+
+# Parquet staging of uploads and paged results need pyarrow; without it every
+# read parses the CSV, a pandas run keeps only its first rows in memory and
+# the PySpark engine does not run (it would have to collect its whole output)
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+from dashboard_metrics import (BIN_STRATEGIES, DEFAULT_BIN_STRATEGY, DashboardFilter, cached_profiles,
+                               dashboard_payload, profile_dataset)
+from ingest import UploadRequest, ingest_stream
+from jobs import DEFAULT_MAX_WORKERS, FAILED, SUCCEEDED, JobManager
+from mapping_compiler import compile_mapping
+from result_store import (DEFAULT_PAGE_SIZE, DOWNLOAD_FORMATS, MAX_PAGE_SIZE, known_index, page as result_page,
+                          stream_download, to_records)
+from run_state import (DEFAULT_RUN_MODE, DEFAULT_RUN_STATE_PATH, RUN_MODES, RunStateStore, format_watermark,
+                       parse_watermark)
+from staging import DEFAULT_MAX_STAGING_BYTES, DEFAULT_STAGING_DIR, StagingCache, read_staged_pandas, staging_key
+from target_merge import DEFAULT_TARGET_BUCKETS, DEFAULT_TARGET_DIR, MergeTarget, cluster_columns, merge_key
+from workspaces import DEFAULT_WORKSPACE_TTL_SECONDS, WorkspaceRegistry, remove_result
+
+MAPPING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wf_test_dev.XML')
+# How runs are partitioned: sized from the staged input with the session's repartition points ('auto'), exactly
+# as the session declares ('session') or Spark's defaults ('spark'). Uploads can be any size, and exports carry
+# a default config of one partition, so the app does not take the session's partition count by default
+PARTITIONING_MODE = os.environ.get('WORKFLOW_PARTITIONING', 'auto')
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-here'
+app.request_class = UploadRequest
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Uploads stream to disk, so there is no size cap unless MAX_UPLOAD_BYTES sets one
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ['MAX_UPLOAD_BYTES']) if os.environ.get('MAX_UPLOAD_BYTES') else None
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# Global variables to store workflow state
+# Shared workflow (and SparkSession) of all workspaces; per-client state lives in workspaces
 workflow_instance = None
-current_results = None
-uploaded_file_info = None
 
 def get_demo_business_logic():
     """Return demo business logic when PySpark is not available"""
@@ -81,15 +103,41 @@ def get_demo_business_logic():
         }
     }
 
-def process_with_pandas(file_path):
-    """Process data using pandas when PySpark is not available"""
+def read_source_pandas(file_path):
+    """Read the input with pandas; fixed-width sources go through the memory-mapped reader"""
+    import pandas as pd
+    from flat_file import is_fixed_width, read_fixed_width_pandas
+    
+    source = compile_mapping(MAPPING_PATH).graph.sources[0]
+    if is_fixed_width(source):
+        return read_fixed_width_pandas(source, file_path)
+    return pd.read_csv(file_path)
+
+def process_with_pandas(file_path, staged=None, since=None):
+    """
+    Process data using pandas when PySpark is not available
+    
+    Reads the staged Parquet copy of the input when there is one. With since
+    (the high-water mark of an incremental run) only records updated after it
+    are kept, skipping staged row groups that end at or before it. Returns the
+    processed DataFrame and a run report shaped like
+    InformaticaToPySparkWorkflow.get_run_report()
+    """
+    import pandas as pd
+    
     try:
-        # Read CSV
-        df = pd.read_csv(file_path)
+        if staged:
+            timestamp_staged = staged.columns.get('Last_Updated_Timestamp', {}).get('type', '').startswith('timestamp')
+            filters = [('Last_Updated_Timestamp', '>', since)] if since is not None and timestamp_staged else None
+            df = read_staged_pandas(staged, filters=filters)
+        else:
+            df = read_source_pandas(file_path)
         
         # Basic transformations
         df['Transaction_Date'] = pd.to_datetime(df['Transaction_Date'], errors='coerce')
         df['Last_Updated_Timestamp'] = pd.to_datetime(df['Last_Updated_Timestamp'], errors='coerce')
+        if since is not None:
+            df = df[df['Last_Updated_Timestamp'] > since]
         
         # Sort by Last_Updated_Timestamp descending for each Transaction_ID
         df_sorted = df.sort_values(['Transaction_ID', 'Last_Updated_Timestamp'], 
@@ -103,7 +151,22 @@ def process_with_pandas(file_path):
         df_deduped['processing_timestamp'] = datetime.now()
         df_deduped['batch_id'] = f"batch_{int(datetime.now().timestamp())}"
         
-        return df_deduped
+        run_report = {
+            'batch_id': df_deduped['batch_id'].iloc[0] if len(df_deduped) else None,
+            'mapping_name': None,
+            'stages': [
+                {'stage': 'source_qualifier', 'instance': None, 'rows': len(df)},
+                {'stage': 'sorter', 'instance': None, 'rows': len(df)},
+                {'stage': 'aggregator', 'instance': None, 'rows': len(df_deduped)},
+                {'stage': 'target', 'instance': None, 'rows': len(df_deduped)}
+            ],
+            'source_rows': len(df),
+            'output_rows': len(df_deduped),
+            'duplicates_removed': len(df) - len(df_deduped),
+            'watermark': format_watermark(df_deduped['Last_Updated_Timestamp'].max()) if len(df_deduped) else None
+        }
+        
+        return df_deduped, run_report
         
     except Exception as e:
         raise Exception(f"Error processing file with pandas: {str(e)}")
@@ -113,16 +176,22 @@ def index():
     """Main application page"""
     return render_template('index.html')
 
+@app.route('/api/health')
+def health():
+    """API endpoint reporting whether the shared SparkSession is up and warmed up"""
+    return jsonify({
+        'success': True,
+        'pyspark_available': PYSPARK_AVAILABLE,
+        'spark_session': workflow_instance is not None,
+        'warmed_up': warmed_up.is_set()
+    })
+
 @app.route('/api/business-logic')
 def get_business_logic():
     """API endpoint to get business logic configuration"""
-    global workflow_instance
-    
     try:
         if PYSPARK_AVAILABLE:
-            if workflow_instance is None:
-                workflow_instance = InformaticaToPySparkWorkflow()
-            business_logic = workflow_instance.get_business_logic_summary()
+            business_logic = get_workflow().get_business_logic_summary()
         else:
             business_logic = get_demo_business_logic()
         
@@ -141,51 +210,70 @@ def get_business_logic():
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    """API endpoint to handle file uploads"""
-    global uploaded_file_info
+    """
+    API endpoint to handle file uploads
     
+    Accepts a multipart form with a 'file' part, or the raw file as the request
+    body with its name in ?filename=. Either way the file streams to disk and is
+    profiled (hash, line count, schema, sample) in the same pass; see ingest.py.
+    """
+    ingested = None
     try:
-        if 'file' not in request.files:
-            return jsonify({'success': False, 'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'success': False, 'error': 'No file selected'}), 400
+        workspace = current_workspace()
+        if request.mimetype == 'multipart/form-data':
+            if 'file' not in request.files:
+                return jsonify({'success': False, 'error': 'No file provided'}), 400
+            
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'success': False, 'error': 'No file selected'}), 400
+            filename = file.filename
+            ingested = file.stream
+        else:
+            filename = request.args.get('filename', '')
+            if filename == '':
+                return jsonify({'success': False, 'error': 'No file name provided'}), 400
         
-        if not file.filename.lower().endswith('.csv'):
+        if not filename.lower().endswith('.csv'):
             return jsonify({'success': False, 'error': 'Only CSV files are supported'}), 400
         
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
+        if ingested is None:
+            ingested = ingest_stream(request.stream, app.config['UPLOAD_FOLDER'])
+        filename = secure_filename(filename)
         
-        # Analyze file structure
+        # Profile gathered while the file streamed in
         try:
-            df_sample = pd.read_csv(file_path, nrows=5)
-            file_info = {
-                'filename': filename,
-                'file_path': file_path,
-                'columns': df_sample.columns.tolist(),
-                'sample_data': df_sample.to_dict('records'),
-                'total_rows': len(pd.read_csv(file_path)),
-                'file_size': os.path.getsize(file_path)
-            }
-            uploaded_file_info = file_info
-            
-            return jsonify({
-                'success': True,
-                'message': f'File "{filename}" uploaded successfully',
-                'file_info': file_info
-            })
-            
+            profile = ingested.profile(filename)
         except Exception as e:
-            os.remove(file_path)  # Clean up on error
             return jsonify({
                 'success': False,
                 'error': f'Error analyzing uploaded file: {str(e)}'
             }), 400
+        
+        # A new upload replaces the previous one and its results
+        if workspace.upload and os.path.exists(workspace.upload['file_path']):
+            os.remove(workspace.upload['file_path'])
+        ingested.keep(workspace.upload_path(filename))
+        profile.file_path = ingested.path
+        file_info = profile.to_dict()
+        workspace.upload = file_info
+        workspace.results = None
+        
+        # Convert to Parquet in the background; runs and the dashboard wait for it
+        if PYARROW_AVAILABLE:
+            staging_job = job_manager.submit(
+                lambda job: stage_upload(file_info).to_dict(),
+                description=f"Staging {filename}",
+                workspace=workspace.id,
+                pool=workspace.pool
+            )
+            file_info['staging_job_id'] = staging_job.id
+        
+        return jsonify({
+            'success': True,
+            'message': f'File "{filename}" uploaded successfully',
+            'file_info': file_info
+        })
     
     except Exception as e:
         return jsonify({
@@ -193,66 +281,315 @@ def upload_file():
             'error': str(e),
             'traceback': traceback.format_exc()
         }), 500
+    finally:
+        # Deletes the file unless it was kept
+        if ingested is not None:
+            ingested.close()
+
+_workflow_lock = threading.Lock()
+warmed_up = threading.Event()
+
+def get_workflow():
+    """The shared workflow instance; its SparkSession is used by every run"""
+    global workflow_instance
+    with _workflow_lock:
+        if workflow_instance is None:
+            from pyspark_workflow import InformaticaToPySparkWorkflow
+            workflow_instance = InformaticaToPySparkWorkflow(partitioning=PARTITIONING_MODE)
+        return workflow_instance
+
+def prewarm():
+    """
+    Import the heavy modules, start the shared SparkSession and run a warm-up
+    job, so the first request does not pay for JVM startup, classloading and
+    code generation. Runs on a background thread; see start_prewarm().
+    """
+    start = time.time()
+    import pandas  # noqa: F401
+    if PYSPARK_AVAILABLE:
+        seconds = get_workflow().warm_up()
+        print(f"🔥 SparkSession warmed up in {time.time() - start:.1f}s (warm-up job {seconds:.1f}s)")
+    warmed_up.set()
+
+def start_prewarm():
+    """Start prewarm() on a daemon thread; requests are served meanwhile"""
+    thread = threading.Thread(target=prewarm, name='spark-prewarm', daemon=True)
+    thread.start()
+    return thread
+
+def current_spark_context():
+    """SparkContext runs execute on (None in demo mode or before the first run)"""
+    if PYSPARK_AVAILABLE and workflow_instance is not None:
+        return workflow_instance.spark.sparkContext
+    return None
+
+job_manager = JobManager(
+    max_workers=int(os.environ.get('WORKFLOW_WORKERS', DEFAULT_MAX_WORKERS)),
+    spark_context=current_spark_context
+)
+
+# Idle workspaces have their runs cancelled and their uploads deleted
+workspaces = WorkspaceRegistry(
+    app.config['UPLOAD_FOLDER'],
+    ttl_seconds=int(os.environ.get('WORKSPACE_TTL_SECONDS', DEFAULT_WORKSPACE_TTL_SECONDS)),
+    on_evict=lambda workspace: job_manager.cancel_all(workspace=workspace.id)
+)
+
+def current_workspace():
+    """Workspace of the requesting client session, created on first use"""
+    workspace = workspaces.get_or_create(session.get('workspace_id'))
+    session['workspace_id'] = workspace.id
+    return workspace
+
+@app.before_request
+def evict_idle_workspaces():
+    workspaces.evict_expired()
+
+staging_cache = StagingCache(
+    os.environ.get('STAGING_DIR', DEFAULT_STAGING_DIR),
+    max_bytes=int(os.environ.get('MAX_STAGING_BYTES', DEFAULT_MAX_STAGING_BYTES))
+)
+
+# High-water marks and ingested files of incremental runs, shared by all workspaces
+run_state = RunStateStore(os.environ.get('RUN_STATE_PATH', DEFAULT_RUN_STATE_PATH))
+
+def workflow_state_key():
+    """Key of the run state of the workflow the app executes"""
+    return compile_mapping(MAPPING_PATH).name
+
+def merge_target():
+    """The local Parquet copy of the workflow's target table that merging runs update"""
+    graph = compile_mapping(MAPPING_PATH).graph
+    return MergeTarget(
+        os.path.join(os.environ.get('TARGET_DIR', DEFAULT_TARGET_DIR), graph.primary_target.name),
+        merge_key(graph),
+        buckets=int(os.environ.get('TARGET_BUCKETS', DEFAULT_TARGET_BUCKETS)),
+        cluster_by=cluster_columns(graph)
+    )
+
+def stage_upload(upload, pin=False):
+    """
+    Typed Parquet staging copy of an upload, parsed by the engine in use on
+    first call and shared by every later run and dashboard read of the same
+    bytes; None when staging is not available. With pin, the copy is not
+    pruned until staging_cache.release(staged.key).
+    """
+    if not PYARROW_AVAILABLE:
+        return None
+    mapping = compile_mapping(MAPPING_PATH)
+    source = mapping.graph.sources[0]
+    engine = 'spark' if PYSPARK_AVAILABLE else 'pandas'
+    key = staging_key(upload['sha256'], mapping.content_hash, source.name, engine)
+    
+    if PYSPARK_AVAILABLE:
+        from spark_lowering import write_staged
+        spark = get_workflow().spark
+        write = lambda path: write_staged(spark, source, upload['file_path'], path)
+        timezone = spark.conf.get('spark.sql.session.timeZone')
+    else:
+        write = lambda path: read_source_pandas(upload['file_path']).to_parquet(path, index=False)
+        timezone = None
+    return staging_cache.stage(key, upload['file_path'], engine, write, timezone, pin=pin)
+
+def session_timezone():
+    """Time zone Spark wrote result timestamps in (None in demo mode)"""
+    return get_workflow().spark.conf.get('spark.sql.session.timeZone') if PYSPARK_AVAILABLE else None
+
+def stored_results(job_id, result_path, execution_method, run_report):
+    """Results payload of a run whose output is stored at result_path: its first page and where to get more"""
+    first_page = result_page(result_path, timezone=session_timezone())
+    return {
+        'result_id': job_id,
+        'result_path': result_path,
+        'total_records': first_page['total_records'],
+        'columns': first_page['columns'],
+        'data': first_page['data'],
+        'next_offset': first_page['next_offset'],
+        'rows_url': f'/api/jobs/{job_id}/rows',
+        'execution_method': execution_method,
+        'run_report': run_report
+    }
+
+def serialize_results(result_pandas, result_path, execution_method, run_report):
+    """Results payload of a demo-mode run stored as CSV (no pyarrow), with timestamps as strings for JSON"""
+    for col in result_pandas.columns:
+        if result_pandas[col].dtype == 'datetime64[ns]':
+            result_pandas[col] = result_pandas[col].astype(str)
+    
+    return {
+        'result_id': os.path.splitext(os.path.basename(result_path))[0],
+        'result_path': result_path,
+        'total_records': len(result_pandas),
+        'columns': result_pandas.columns.tolist(),
+        'data': result_pandas.to_dict('records')[:100],  # Limit to first 100 rows for UI
+        'execution_method': execution_method,
+        'run_report': run_report
+    }
+
+def skipped_results(job_id, execution_method, state):
+    """Results payload of an incremental run whose input file was already ingested"""
+    return {
+        'result_id': job_id,
+        'result_path': None,
+        'total_records': 0,
+        'columns': [],
+        'data': [],
+        'next_offset': None,
+        'execution_method': execution_method,
+        'run_report': {
+            'batch_id': None,
+            'mapping_name': state.workflow,
+            'stages': [],
+            'source_rows': 0,
+            'output_rows': 0,
+            'duplicates_removed': 0,
+            'watermark': format_watermark(state.watermark),
+            'incremental': {'since': format_watermark(state.watermark), 'skipped': True, 'state': state.to_dict()}
+        }
+    }
+
+def run_workflow(job, workspace, upload, mode=DEFAULT_RUN_MODE, merge=False):
+    """
+    Body of a submitted run; executes on a job pool thread
+    
+    An incremental run reads only the records changed after the workflow's
+    high-water mark and commits the new mark and the upload's fingerprint
+    once its output is stored; an upload already ingested is not read at all.
+    With merge, the stored output is then merged into the target table the
+    way the session's Post SQL MERGE does, before any mark is committed.
+    """
+    execution_method = 'PySpark' if PYSPARK_AVAILABLE else 'Pandas (Demo Mode)'
+    since = None
+    if mode == 'incremental':
+        state = run_state.get(workflow_state_key())
+        if state.is_ingested(upload['sha256']):
+            print(f"⏭️  {upload['filename']} was already ingested; nothing to process")
+            return skipped_results(job.id, execution_method, state)
+        since = state.watermark
+    
+    # Waits for the staging started by the upload if it is still running; the
+    # staged copy is pinned so other uploads do not prune it while the run reads it
+    job.set_phase('staging')
+    staged = stage_upload(upload, pin=True)
+    try:
+        if PYSPARK_AVAILABLE:
+            from pyspark_workflow import InformaticaToPySparkWorkflow
+            
+            # Each run gets its own workflow object (run report state) on the shared session
+            job.set_phase('planning')
+            workflow = InformaticaToPySparkWorkflow(spark_session=get_workflow().spark, partitioning=PARTITIONING_MODE)
+            result_df = workflow.execute_workflow(staged.path if staged else upload['file_path'], since)
+            
+            # A single job stores the full output (pages are read back from it, so
+            # the driver never holds the whole result) and fills in the per-stage
+            # row counts of the run report
+            job.set_phase('executing')
+            result_path = workspace.result_path(job.id)
+            result_df.write.parquet(result_path)
+            run_report = workflow.get_run_report()
+        else:
+            # Execute with pandas (demo mode)
+            job.set_phase('executing')
+            result_pandas, run_report = process_with_pandas(upload['file_path'], staged, since)
+            if PYARROW_AVAILABLE:
+                result_path = workspace.result_path(job.id)
+                result_pandas.to_parquet(result_path, index=False)
+            else:
+                result_path = workspace.result_path(job.id, '.csv')
+                result_pandas.to_csv(result_path, index=False)
+        
+        job.set_phase('finishing')
+        if PYARROW_AVAILABLE:
+            results = stored_results(job.id, result_path, execution_method, run_report)
+        else:
+            results = serialize_results(result_pandas, result_path, execution_method, run_report)
+        
+        # Results of a run outlived by a reset or a newer upload are not kept
+        if workspace.upload is upload:
+            if merge:
+                job.set_phase('merging')
+                run_report['merge'] = merge_target().merge(result_path).to_dict()
+            
+            # The delta is stored (and merged), so the high-water mark can move past it
+            if mode == 'incremental':
+                state = run_state.commit(
+                    workflow_state_key(), job.id, parse_watermark(run_report['watermark']),
+                    fingerprint=upload['sha256'], filename=upload['filename'], since=since,
+                    source_rows=run_report['source_rows'], output_rows=run_report['output_rows'],
+                    started_at=job.started_at
+                )
+                run_report['incremental'] = {'since': format_watermark(since), 'skipped': False, 'state': state.to_dict()}
+            # Profile the input and output for the dashboard while the data is hot;
+            # the dashboard retries on its first load if this fails
+            job.set_phase('profiling')
+            try:
+                run_profiles(workspace, upload, results)
+            except Exception as e:
+                print(f"⚠️  Dashboard profiling failed: {e}")
+            workspace.set_results(results)
+        else:
+            remove_result(result_path)
+        return results
+    finally:
+        if staged is not None:
+            staging_cache.release(staged.key)
 
 @app.route('/api/execute', methods=['POST'])
 def execute_workflow():
-    """API endpoint to execute the workflow on uploaded data"""
-    global workflow_instance, current_results, uploaded_file_info
+    """
+    API endpoint to submit a workflow run on the uploaded data
     
+    Returns a job id at once (202); poll /api/jobs/<job_id> for progress and
+    fetch /api/jobs/<job_id>/result once it has succeeded. ?mode=incremental
+    processes only the records changed since the last committed incremental
+    run (see /api/run-state); ?merge=true merges the output into the target
+    table (see /api/target).
+    """
     try:
-        if uploaded_file_info is None:
+        workspace = current_workspace()
+        if workspace.upload is None:
             return jsonify({
                 'success': False,
                 'error': 'No file uploaded. Please upload a test data file first.'
             }), 400
         
-        file_path = uploaded_file_info['file_path']
+        mode = request.args.get('mode', DEFAULT_RUN_MODE)
+        if mode not in RUN_MODES:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown run mode '{mode}'; expected one of {', '.join(RUN_MODES)}"
+            }), 400
+        merge = request.args.get('merge', 'false').lower()
+        if merge not in ('true', 'false'):
+            return jsonify({'success': False, 'error': "merge must be 'true' or 'false'"}), 400
+        merge = merge == 'true'
+        if merge and not PYARROW_AVAILABLE:
+            return jsonify({'success': False, 'error': 'Merging into the target needs pyarrow'}), 501
+        if PYSPARK_AVAILABLE and not PYARROW_AVAILABLE:
+            return jsonify({
+                'success': False,
+                'error': 'PySpark runs store and page their output as Parquet, which needs pyarrow (pip install pyarrow)'
+            }), 501
         
+        upload = workspace.upload
         if PYSPARK_AVAILABLE:
-            # Execute with PySpark
-            if workflow_instance is None:
-                workflow_instance = InformaticaToPySparkWorkflow()
-            
-            result_df = workflow_instance.execute_workflow(file_path)
-            
-            # Convert to pandas for JSON serialization
-            result_pandas = result_df.toPandas()
-            
-            # Convert timestamps to strings for JSON serialization
-            for col in result_pandas.columns:
-                if result_pandas[col].dtype == 'datetime64[ns]':
-                    result_pandas[col] = result_pandas[col].astype(str)
-            
-            results = {
-                'total_records': len(result_pandas),
-                'columns': result_pandas.columns.tolist(),
-                'data': result_pandas.to_dict('records')[:100],  # Limit to first 100 rows for UI
-                'execution_method': 'PySpark'
-            }
-        
-        else:
-            # Execute with pandas (demo mode)
-            result_pandas = process_with_pandas(file_path)
-            
-            # Convert timestamps to strings for JSON serialization
-            for col in result_pandas.columns:
-                if result_pandas[col].dtype == 'datetime64[ns]':
-                    result_pandas[col] = result_pandas[col].astype(str)
-            
-            results = {
-                'total_records': len(result_pandas),
-                'columns': result_pandas.columns.tolist(),
-                'data': result_pandas.to_dict('records')[:100],  # Limit to first 100 rows for UI
-                'execution_method': 'Pandas (Demo Mode)'
-            }
+            get_workflow()  # Start the session here so the run is tagged with its job group
         
-        current_results = results
+        job = job_manager.submit(
+            lambda job: run_workflow(job, workspace, upload, mode, merge),
+            description=f"{'Incremental workflow' if mode == 'incremental' else 'Workflow'} run on {upload['filename']}",
+            workspace=workspace.id,
+            pool=workspace.pool
+        )
         
         return jsonify({
             'success': True,
-            'message': 'Workflow executed successfully',
-            'results': results
-        })
+            'message': 'Workflow run submitted',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/jobs/{job.id}',
+            'result_url': f'/api/jobs/{job.id}/result'
+        }), 202
     
     except Exception as e:
         return jsonify({
@@ -261,57 +598,259 @@ def execute_workflow():
             'traceback': traceback.format_exc()
         }), 500
 
-@app.route('/api/download-results')
-def download_results():
-    """API endpoint to download execution results as CSV"""
-    global current_results
+@app.route('/api/run-state')
+def get_run_state():
+    """API endpoint reporting the high-water mark and last committed run of incremental runs"""
+    return jsonify({'success': True, 'state': run_state.get(workflow_state_key()).to_dict()})
+
+@app.route('/api/run-state/reset', methods=['POST'])
+def reset_run_state():
+    """API endpoint forgetting the incremental run state; the next incremental run processes everything"""
+    run_state.reset(workflow_state_key())
+    return jsonify({'success': True, 'message': 'Run state reset', 'state': run_state.get(workflow_state_key()).to_dict()})
+
+@app.route('/api/target')
+def get_target():
+    """API endpoint describing the committed version of the merged target table"""
+    target = merge_target()
+    manifest = target.manifest()
+    if manifest is None:
+        return jsonify({'success': True, 'target': None})
+    return jsonify({
+        'success': True,
+        'target': {
+            'path': target.path,
+            'key': manifest['key'],
+            'version': manifest['version'],
+            'buckets': manifest['buckets'],
+            'cluster_by': manifest['cluster_by'],
+            'files': sum(len(entries) for entries in manifest['files'].values()),
+            'rows': sum(entry['rows'] for entries in manifest['files'].values() for entry in entries),
+            'committed_at': manifest['committed_at'],
+            'last_merge': manifest['merge']
+        }
+    })
+
+@app.route('/api/target/rows')
+def get_target_rows():
+    """
+    API endpoint looking rows up in the merged target table
     
+    Query parameters: keys (comma-separated merge key values), column with
+    low and/or high (an inclusive range on one column), columns
+    (comma-separated projection) and limit (default 100, at most 1000). Only
+    the files and row groups the target's index cannot rule out are read; the
+    response's scan reports how many.
+    """
+    if not PYARROW_AVAILABLE:
+        return jsonify({'success': False, 'error': 'Reading the target needs pyarrow'}), 501
+    
+    keys = request.args.get('keys')
+    columns = request.args.get('columns')
+    column = request.args.get('column')
+    ranges = {column: (request.args.get('low') or None, request.args.get('high') or None)} if column else None
     try:
-        if current_results is None:
-            return jsonify({
-                'success': False,
-                'error': 'No results available. Please execute the workflow first.'
-            }), 400
-        
-        # Create temporary file
-        temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False)
-        
-        # Convert results to DataFrame and save as CSV
-        df = pd.DataFrame(current_results['data'])
-        df.to_csv(temp_file.name, index=False)
-        temp_file.close()
-        
-        return send_file(
-            temp_file.name,
-            as_attachment=True,
-            download_name=f'workflow_results_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
-            mimetype='text/csv'
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+        table, stats = merge_target().scan(
+            keys=keys.split(',') if keys else None,
+            ranges=ranges,
+            columns=columns.split(',') if columns else None
         )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if table is None:
+        return jsonify({'success': False, 'error': 'No run has been merged into the target yet'}), 404
     
-    except Exception as e:
+    return jsonify({
+        'success': True,
+        'rows': to_records(table.slice(0, limit), session_timezone()),
+        'matched': table.num_rows,
+        'scan': stats.to_dict()
+    })
+
+def job_not_found(job_id):
+    return jsonify({'success': False, 'error': f'Unknown job {job_id}'}), 404
+
+def workspace_job(job_id):
+    """The job if it was submitted from the requesting client's workspace"""
+    job = job_manager.get(job_id)
+    if job is None or job.workspace != current_workspace().id:
+        return None
+    return job
+
+@app.route('/api/jobs')
+def list_jobs():
+    """API endpoint listing the workspace's submitted runs, newest first"""
+    jobs = sorted(job_manager.jobs(current_workspace().id), key=lambda job: job.submitted_at, reverse=True)
+    return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs]})
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """API endpoint reporting a run's status, phase and Spark task progress"""
+    job = workspace_job(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    return jsonify({'success': True, 'job': job_manager.progress(job)})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """API endpoint cancelling a queued or running run"""
+    job = workspace_job(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    if not job_manager.cancel(job_id):
+        return jsonify({'success': False, 'error': f'Job {job_id} already {job.status}', 'job': job.to_dict()}), 409
+    return jsonify({'success': True, 'message': 'Cancellation requested', 'job': job.to_dict()})
+
+@app.route('/api/jobs/<job_id>/result')
+def get_job_result(job_id):
+    """API endpoint returning the results of a finished run"""
+    job = workspace_job(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    if job.status == SUCCEEDED:
+        return jsonify({
+            'success': True,
+            'message': 'Workflow executed successfully',
+            'job': job.to_dict(),
+            'results': job.result
+        })
+    if job.status == FAILED:
         return jsonify({
             'success': False,
-            'error': str(e)
+            'error': job.error,
+            'traceback': job.traceback,
+            'job': job.to_dict()
         }), 500
+    return jsonify({
+        'success': False,
+        'error': f'Job {job_id} is {job.status}',
+        'job': job.to_dict()
+    }), 409
+
+@app.route('/api/jobs/<job_id>/rows')
+def get_job_rows(job_id):
+    """
+    API endpoint returning one page of a succeeded run's output
+    
+    Query parameters: offset (default 0), limit (default 100, at most 1000),
+    columns (comma-separated projection), sort (column) and order (asc/desc).
+    The response's next_offset is the offset of the following page, or null.
+    """
+    job = workspace_job(job_id)
+    if job is None:
+        return job_not_found(job_id)
+    if job.status != SUCCEEDED:
+        return jsonify({'success': False, 'error': f'Job {job_id} is {job.status}', 'job': job.to_dict()}), 409
+    
+    if not PYARROW_AVAILABLE:
+        return jsonify({'success': False, 'error': 'Paging through results needs pyarrow'}), 501
+    
+    result_path = (job.result or {}).get('result_path')
+    if not result_path or not os.path.exists(result_path):
+        return jsonify({
+            'success': False,
+            'error': f'The output of job {job_id} is no longer stored; it was replaced by a newer run or reset'
+        }), 410
+    
+    try:
+        columns = request.args.get('columns')
+        rows = result_page(
+            result_path,
+            offset=int(request.args.get('offset', 0)),
+            limit=int(request.args.get('limit', DEFAULT_PAGE_SIZE)),
+            columns=columns.split(',') if columns else None,
+            sort=request.args.get('sort') or None,
+            descending=request.args.get('order', 'asc').lower() == 'desc',
+            spark=get_workflow().spark if PYSPARK_AVAILABLE else None,
+            timezone=session_timezone()
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'job_id': job_id, **rows})
+
+@app.route('/api/download-results')
+def download_results():
+    """
+    API endpoint streaming the complete output of the latest run
+    
+    format is csv (default), csv.gz or parquet. The file is generated batch
+    by batch from the stored output as it is sent, so server memory does not
+    grow with the result. Range requests resume a download once its size is
+    known: after one complete download of the format, or at once when the
+    stored file is sent as is.
+    """
+    results = current_workspace().results
+    if results is None:
+        return jsonify({
+            'success': False,
+            'error': 'No results available. Please execute the workflow first.'
+        }), 400
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in DOWNLOAD_FORMATS:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown format '{fmt}'; expected one of {', '.join(DOWNLOAD_FORMATS)}"
+        }), 400
+    if fmt == 'parquet' and not PYARROW_AVAILABLE:
+        return jsonify({'success': False, 'error': 'Parquet downloads need pyarrow'}), 501
+    
+    result_path = results['result_path']
+    if not os.path.exists(result_path):
+        return jsonify({
+            'success': False,
+            'error': 'The results are no longer stored; they were replaced by a newer run or reset'
+        }), 410
+    
+    mimetype, extension = DOWNLOAD_FORMATS[fmt]
+    downloads = results.setdefault('downloads', {})
+    index = downloads.get(fmt) or known_index(result_path, fmt)
+    etag = f'{results["result_id"]}-{fmt}'
+    headers = {
+        'Content-Disposition': f'attachment; filename=workflow_results_{results["result_id"]}.{extension}',
+        'ETag': f'"{etag}"'
+    }
+    
+    start, end, status = 0, None, 200
+    if index is not None:
+        headers['Accept-Ranges'] = 'bytes'
+        headers['Content-Length'] = str(index.size)
+        # Multi-range requests and a Range whose If-Range names another
+        # version get the whole file
+        byte_ranges, if_range = request.range, request.if_range
+        if (byte_ranges is not None and byte_ranges.units == 'bytes' and len(byte_ranges.ranges) == 1
+                and (if_range.etag is None or if_range.etag == etag)):
+            byte_range = byte_ranges.range_for_length(index.size)
+            if byte_range is None:
+                return Response(status=416, headers={'Content-Range': f'bytes */{index.size}'})
+            start, end = byte_range
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end - 1}/{index.size}'
+            headers['Content-Length'] = str(end - start)
+    
+    def remember_index(download_index):
+        downloads[fmt] = download_index
+    
+    chunks = stream_download(result_path, fmt, timezone=session_timezone(), start=start, end=end,
+                             index=index, on_complete=remember_index)
+    return Response(stream_with_context(chunks), status=status, mimetype=mimetype, headers=headers)
 
 @app.route('/api/reset')
 def reset_workflow():
-    """API endpoint to reset workflow state"""
-    global workflow_instance, current_results, uploaded_file_info
+    """
+    API endpoint to reset the client's workspace state
     
+    Cancels the workspace's runs and deletes its upload and results; the
+    shared SparkSession keeps serving the other workspaces.
+    """
     try:
-        # Clean up uploaded files
-        if uploaded_file_info and os.path.exists(uploaded_file_info['file_path']):
-            os.remove(uploaded_file_info['file_path'])
-        
-        # Reset global state
-        uploaded_file_info = None
-        current_results = None
-        
-        # Stop PySpark session if running
-        if PYSPARK_AVAILABLE and workflow_instance:
-            workflow_instance.stop()
-            workflow_instance = None
+        workspace = current_workspace()
+        job_manager.cancel_all(workspace=workspace.id)
+        workspace.clear()
         
         return jsonify({
             'success': True,
@@ -329,26 +868,76 @@ def dashboard():
     """Dashboard page route"""
     return render_template('dashboard.html')
 
+# Sketch-based (approximate) dashboard profiles: '1' always, '0' never, unset
+# for datasets of APPROXIMATE_MIN_ROWS rows or more
+DASHBOARD_APPROXIMATE = {'1': True, '0': False}.get(os.environ.get('DASHBOARD_APPROXIMATE', ''))
+
+def run_profiles(workspace, upload, results, bins=DEFAULT_BIN_STRATEGY):
+    """
+    Dashboard profiles (global statistics plus the pre-aggregated cube) of a
+    run's input and output, computed once per run and bin strategy and cached
+    by run id. Runs compute the default strategy when they finish; the others
+    cost one pass on first request.
+    """
+    def compute():
+        spark = get_workflow().spark if PYSPARK_AVAILABLE else None
+        # Read the original data from the staged Parquet copy when there is one
+        staged = stage_upload(upload, pin=True)
+        try:
+            before = profile_dataset(staged.path if staged else upload['file_path'], spark,
+                                     staged.timezone if staged else None, approximate=DASHBOARD_APPROXIMATE, bins=bins)
+        finally:
+            if staged is not None:
+                staging_cache.release(staged.key)
+        after = profile_dataset(results['result_path'], spark, session_timezone(),
+                                approximate=DASHBOARD_APPROXIMATE, bins=bins)
+        return {'before': before, 'after': after}
+    
+    return cached_profiles(workspace.metrics_path(results['result_id'], bins), compute)
+
+def dashboard_results():
+    """
+    The workspace's upload and results and the requested histogram bin
+    strategy (?bins=), or an error response when there is nothing to show
+    """
+    bins = request.args.get('bins') or DEFAULT_BIN_STRATEGY
+    if bins not in BIN_STRATEGIES:
+        return None, (jsonify({
+            'success': False,
+            'error': f"Unknown bin strategy '{bins}'; expected one of {', '.join(BIN_STRATEGIES)}"
+        }), 400)
+    
+    workspace = current_workspace()
+    upload, results = workspace.upload, workspace.results
+    if not upload or not results:
+        return None, (jsonify({
+            'success': False,
+            'error': 'No data available. Please execute workflow first.'
+        }), 400)
+    
+    if not os.path.exists(results['result_path']):
+        return None, (jsonify({
+            'success': False,
+            'error': 'The results are no longer stored; they were replaced by a newer run or reset'
+        }), 410)
+    return (workspace, upload, results, bins), None
+
 @app.route('/api/dashboard-data')
 def get_dashboard_data():
-    """API endpoint to get dashboard analysis data"""
-    global uploaded_file_info, current_results
+    """
+    API endpoint to get dashboard analysis data
     
+    The metrics compare the uploaded data with the full output of the latest
+    run. They are rolled up from the profiles the run computed when it
+    finished (or, failing that, on the first request). ?bins= picks the
+    histogram's bin strategy: equal-width (default), quantile or log.
+    """
     try:
-        if not uploaded_file_info or not current_results:
-            return jsonify({
-                'success': False,
-                'error': 'No data available. Please execute workflow first.'
-            }), 400
+        found, error = dashboard_results()
+        if error:
+            return error
         
-        # Read original data for before analysis
-        original_df = pd.read_csv(uploaded_file_info['file_path'])
-        
-        # Convert processed results to DataFrame
-        processed_df = pd.DataFrame(current_results['data'])
-        
-        # Analyze both datasets
-        dashboard_data = analyze_before_after_data(original_df, processed_df)
+        dashboard_data = dashboard_payload(run_profiles(*found))
         
         return jsonify({
             'success': True,
@@ -362,181 +951,56 @@ def get_dashboard_data():
             'traceback': traceback.format_exc()
         }), 500
 
-def analyze_before_after_data(before_df, after_df):
-    """Analyze before and after data for dashboard"""
-    
-    # Convert date columns for proper analysis
-    before_df['Transaction_Date'] = pd.to_datetime(before_df['Transaction_Date'], errors='coerce')
-    before_df['Last_Updated_Timestamp'] = pd.to_datetime(before_df['Last_Updated_Timestamp'], errors='coerce')
-    
-    # Handle after_df date conversion (might be strings from JSON)
-    if 'Transaction_Date' in after_df.columns:
-        after_df['Transaction_Date'] = pd.to_datetime(after_df['Transaction_Date'], errors='coerce')
-    if 'Last_Updated_Timestamp' in after_df.columns:
-        after_df['Last_Updated_Timestamp'] = pd.to_datetime(after_df['Last_Updated_Timestamp'], errors='coerce')
-    
-    # Convert amount columns to numeric
-    before_df['Amount'] = pd.to_numeric(before_df['Amount'], errors='coerce')
-    if 'Amount' in after_df.columns:
-        after_df['Amount'] = pd.to_numeric(after_df['Amount'], errors='coerce')
-    
-    analysis = {
-        'summary': {
-            'before': {
-                'total_records': len(before_df),
-                'total_amount': float(before_df['Amount'].sum()) if 'Amount' in before_df.columns else 0,
-                'avg_amount': float(before_df['Amount'].mean()) if 'Amount' in before_df.columns else 0,
-                'unique_transactions': len(before_df['Transaction_ID'].unique()) if 'Transaction_ID' in before_df.columns else 0,
-                'date_range': {
-                    'start': before_df['Transaction_Date'].min().strftime('%Y-%m-%d') if before_df['Transaction_Date'].notna().any() else None,
-                    'end': before_df['Transaction_Date'].max().strftime('%Y-%m-%d') if before_df['Transaction_Date'].notna().any() else None
-                }
-            },
-            'after': {
-                'total_records': len(after_df),
-                'total_amount': float(after_df['Amount'].sum()) if 'Amount' in after_df.columns else 0,
-                'avg_amount': float(after_df['Amount'].mean()) if 'Amount' in after_df.columns else 0,
-                'unique_transactions': len(after_df['Transaction_ID'].unique()) if 'Transaction_ID' in after_df.columns else 0,
-                'date_range': {
-                    'start': after_df['Transaction_Date'].min().strftime('%Y-%m-%d') if 'Transaction_Date' in after_df.columns and after_df['Transaction_Date'].notna().any() else None,
-                    'end': after_df['Transaction_Date'].max().strftime('%Y-%m-%d') if 'Transaction_Date' in after_df.columns and after_df['Transaction_Date'].notna().any() else None
-                }
-            }
-        },
-        
-        'distributions': {
-            'transaction_type': {
-                'before': before_df['Transaction_Type'].value_counts().to_dict() if 'Transaction_Type' in before_df.columns else {},
-                'after': after_df['Transaction_Type'].value_counts().to_dict() if 'Transaction_Type' in after_df.columns else {}
-            },
-            'status': {
-                'before': before_df['Status'].value_counts().to_dict() if 'Status' in before_df.columns else {},
-                'after': after_df['Status'].value_counts().to_dict() if 'Status' in after_df.columns else {}
-            },
-            'channel': {
-                'before': before_df['Channel'].value_counts().to_dict() if 'Channel' in before_df.columns else {},
-                'after': after_df['Channel'].value_counts().to_dict() if 'Channel' in after_df.columns else {}
-            },
-            'branch': {
-                'before': before_df['Branch_Code'].value_counts().to_dict() if 'Branch_Code' in before_df.columns else {},
-                'after': after_df['Branch_Code'].value_counts().to_dict() if 'Branch_Code' in after_df.columns else {}
-            }
-        },
-        
-        'amount_analysis': {
-            'before': {
-                'histogram': create_amount_histogram(before_df['Amount']) if 'Amount' in before_df.columns else [],
-                'stats': {
-                    'min': float(before_df['Amount'].min()) if 'Amount' in before_df.columns else 0,
-                    'max': float(before_df['Amount'].max()) if 'Amount' in before_df.columns else 0,
-                    'median': float(before_df['Amount'].median()) if 'Amount' in before_df.columns else 0,
-                    'std': float(before_df['Amount'].std()) if 'Amount' in before_df.columns else 0
-                }
-            },
-            'after': {
-                'histogram': create_amount_histogram(after_df['Amount']) if 'Amount' in after_df.columns else [],
-                'stats': {
-                    'min': float(after_df['Amount'].min()) if 'Amount' in after_df.columns else 0,
-                    'max': float(after_df['Amount'].max()) if 'Amount' in after_df.columns else 0,
-                    'median': float(after_df['Amount'].median()) if 'Amount' in after_df.columns else 0,
-                    'std': float(after_df['Amount'].std()) if 'Amount' in after_df.columns else 0
-                }
-            }
-        },
-        
-        'time_series': {
-            'before': create_time_series_data(before_df),
-            'after': create_time_series_data(after_df)
-        },
-        
-        'impact_metrics': {
-            'duplicate_reduction': {
-                'original_count': len(before_df),
-                'final_count': len(after_df),
-                'duplicates_removed': len(before_df) - len(after_df),
-                'reduction_percentage': round(((len(before_df) - len(after_df)) / len(before_df)) * 100, 2) if len(before_df) > 0 else 0
-            },
-            'data_quality': {
-                'completeness_before': calculate_completeness(before_df),
-                'completeness_after': calculate_completeness(after_df),
-                'accuracy_improvement': 'Enhanced through deduplication'
-            }
-        },
-        
-        'filter_options': {
-            'transaction_types': list(before_df['Transaction_Type'].unique()) if 'Transaction_Type' in before_df.columns else [],
-            'statuses': list(before_df['Status'].unique()) if 'Status' in before_df.columns else [],
-            'channels': list(before_df['Channel'].unique()) if 'Channel' in before_df.columns else [],
-            'branches': list(before_df['Branch_Code'].unique()) if 'Branch_Code' in before_df.columns else [],
-            'amount_range': {
-                'min': float(before_df['Amount'].min()) if 'Amount' in before_df.columns else 0,
-                'max': float(before_df['Amount'].max()) if 'Amount' in before_df.columns else 0
-            }
-        }
-    }
+@app.route('/api/dashboard-filter', methods=['POST'])
+def filter_dashboard_data():
+    """
+    API endpoint to get dashboard analysis data for a filter
     
-    return analysis
-
-def create_amount_histogram(amounts, bins=10):
-    """Create histogram data for amount analysis"""
-    try:
-        amounts_clean = amounts.dropna()
-        if len(amounts_clean) == 0:
-            return []
-        
-        hist, bin_edges = pd.cut(amounts_clean, bins=bins, retbins=True)
-        histogram_data = []
-        
-        for i in range(len(bin_edges) - 1):
-            count = len(amounts_clean[(amounts_clean >= bin_edges[i]) & (amounts_clean < bin_edges[i + 1])])
-            histogram_data.append({
-                'range': f"${bin_edges[i]:.0f}-${bin_edges[i + 1]:.0f}",
-                'count': count,
-                'min_value': float(bin_edges[i]),
-                'max_value': float(bin_edges[i + 1])
-            })
-        
-        return histogram_data
-    except Exception:
-        return []
-
-def create_time_series_data(df):
-    """Create time series data for transaction volume analysis"""
+    The JSON body may hold transaction_types, statuses, channels, branches
+    (lists of values), start_date/end_date (YYYY-MM-DD, inclusive) and
+    min_amount/max_amount (matched against whole histogram bins). The answer
+    rolls up the run's pre-aggregated cube, so its cost does not depend on
+    the number of rows; distinct counts, medians and completeness do not
+    roll up and are null for filtered data. ?bins= as for /api/dashboard-data.
+    """
     try:
-        if 'Transaction_Date' not in df.columns:
-            return []
-        
-        df_clean = df.dropna(subset=['Transaction_Date'])
-        if len(df_clean) == 0:
-            return []
+        found, error = dashboard_results()
+        if error:
+            return error
         
-        # Group by date and count transactions
-        daily_counts = df_clean.groupby(df_clean['Transaction_Date'].dt.date).size()
+        try:
+            dashboard_filter = DashboardFilter.from_dict(request.get_json(silent=True) or {})
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': f'Invalid filter: {e}'}), 400
         
-        time_series = []
-        for date, count in daily_counts.items():
-            time_series.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'count': int(count)
-            })
+        start = time.time()
+        dashboard_data = dashboard_payload(run_profiles(*found), dashboard_filter)
         
-        return sorted(time_series, key=lambda x: x['date'])
-    except Exception:
-        return []
-
-def calculate_completeness(df):
-    """Calculate data completeness percentage"""
-    try:
-        total_cells = df.size
-        non_null_cells = df.count().sum()
-        completeness = (non_null_cells / total_cells) * 100 if total_cells > 0 else 0
-        return round(completeness, 2)
-    except Exception:
-        return 0
+        return jsonify({
+            'success': True,
+            'data': dashboard_data,
+            'filters': dashboard_filter.to_dict(),
+            'elapsed_ms': round((time.time() - start) * 1000, 2)
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }), 500
 
 if __name__ == '__main__':
     print("🚀 Starting Informatica to PySpark Workflow UI...")
     print(f"📊 PySpark Available: {PYSPARK_AVAILABLE}")
     print("🌐 Access the application at: http://localhost:5000")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # The debug reloader runs the app twice (two job pools); opt in with FLASK_DEBUG=1
+    debug = os.environ.get('FLASK_DEBUG') == '1'
+    
+    # Build and warm the SparkSession while the server starts (in the serving
+    # process only, not the reloader's watcher); opt out with SPARK_PREWARM=0
+    if os.environ.get('SPARK_PREWARM', '1') == '1' and (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        start_prewarm()
+    
+    app.run(debug=debug, host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,689 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Spark lowering of Informatica mappings
+
+Run: python benchmarks.py dedup [--rows N] [--duplicate-ratios 0.1,0.5,0.9] [--repeat 3]
+     python benchmarks.py plan [--columns 50,100,300] [--repeat 3]
+     python benchmarks.py fixed-width [--rows N] [--repeat 3]
+     python benchmarks.py staging [--rows N] [--repeat 3]
+     python benchmarks.py startup [--repeat 3] [--port 5055] [--sample bank_transactions.csv]
+     python benchmarks.py merge [--rows N] [--delta-rows 1000,10000,100000] [--buckets 64]
+     python benchmarks.py scan [--rows N] [--buckets 16] [--lookups 100]
+     python benchmarks.py partitions [--rows 28,200000,2000000] [--repeat 3]
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+DEFAULT_DUPLICATE_RATIOS = [0.0, 0.25, 0.5, 0.75, 0.9]
+
+
+def _spark():
+    from pyspark.sql import SparkSession
+    return SparkSession.builder \
+        .appName("InformaticaBenchmarks") \
+        .config("spark.sql.adaptive.enabled", "true") \
+        .config("spark.sql.adaptive.coalescePartitions.enabled", "true") \
+        .getOrCreate()
+
+
+def _time(action, repeat: int) -> float:
+    """Best wall-clock time of repeat runs"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def transactions_profile(spark, rows: int, duplicate_ratio: float):
+    """
+    Synthetic bank transactions: rows records over rows * (1 - duplicate_ratio)
+    distinct Transaction_IDs, each version with its own Last_Updated_Timestamp
+    """
+    from pyspark.sql import functions as F
+
+    keys = max(1, int(rows * (1 - duplicate_ratio)))
+    return spark.range(rows).select(
+        (F.col("id") % keys).cast("int").alias("Transaction_ID"),
+        (F.col("id") % 997).cast("int").alias("Customer_ID"),
+        F.element_at(F.array(F.lit("DEPOSIT"), F.lit("WITHDRAWAL"), F.lit("TRANSFER")),
+                     (F.col("id") % 3 + 1).cast("int")).alias("Transaction_Type"),
+        (F.col("id") % 100000 / 100).cast("decimal(10,2)").alias("Amount"),
+        F.concat(F.lit("BR"), F.lpad((F.col("id") % 50).cast("string"), 3, "0")).alias("Branch_Code"),
+        F.timestamp_seconds(F.lit(1700000000) + F.col("id") * 37 % 31536000).alias("Last_Updated_Timestamp"),
+    )
+
+
+def benchmark_dedup(rows: int = 2_000_000,
+                    duplicate_ratios: List[float] = DEFAULT_DUPLICATE_RATIOS,
+                    repeat: int = 3,
+                    strategies: List[str] = None) -> Dict[float, Dict[str, float]]:
+    """
+    Time every dedup strategy on each duplicate-ratio profile and report the
+    fastest one. The input is cached first so only the dedup itself is timed;
+    the result is written to the noop sink to force full evaluation.
+    """
+    from spark_lowering import DEDUP_STRATEGIES, dedup_first
+
+    spark = _spark()
+    strategies = strategies or list(DEDUP_STRATEGIES)
+    groups = ["Transaction_ID"]
+    keys = [("Last_Updated_Timestamp", True, True), ("Customer_ID", False, False)]
+
+    print("🚀 Dedup strategy benchmark")
+    print(f"Rows: {rows:,}, strategies: {', '.join(strategies)}")
+    print("=" * 60)
+
+    results = {}
+    for ratio in duplicate_ratios:
+        df = transactions_profile(spark, rows, ratio).cache()
+        df.count()
+        distinct_keys = max(1, int(rows * (1 - ratio)))
+
+        timings = {}
+        checksums = {}
+        for strategy in strategies:
+            deduped = dedup_first(df, groups, keys, strategy)
+            timings[strategy] = _time(lambda: deduped.write.format("noop").mode("overwrite").save(), repeat)
+            checksums[strategy] = deduped.selectExpr(
+                "count(*)", "sum(hash(Transaction_ID, Last_Updated_Timestamp, Customer_ID))"
+            ).first()
+        df.unpersist()
+
+        fastest = min(timings, key=timings.get)
+        results[ratio] = timings
+        print(f"\n📊 duplicate ratio {ratio:.0%} ({distinct_keys:,} keys)")
+        for strategy in strategies:
+            marker = "  ⭐" if strategy == fastest else ""
+            print(f"  {strategy:<24} {timings[strategy]:8.3f}s{marker}")
+        if len(set(checksums.values())) > 1:
+            print(f"  ❌ strategies disagree: {checksums}")
+
+    print("\n📈 Fastest strategy per profile:")
+    for ratio, timings in results.items():
+        print(f"  {ratio:>5.0%} duplicates: {min(timings, key=timings.get)}")
+    return results
+
+
+def wide_mapping(columns: int):
+    """
+    Synthetic SQ -> EXP -> target mapping over a source with the given number
+    of fields (one in ten a datetime, the rest strings with a null character)
+    """
+    from mapping_compiler import (
+        EXPRESSION, SOURCE_DEFINITION, SOURCE_QUALIFIER, TARGET_DEFINITION,
+        CompiledMapping, Edge, MappingGraph, Node, Port,
+    )
+
+    def fields(porttype):
+        return [Port(name=f"col_{i:04d}",
+                     datatype="date/time" if i % 10 == 0 else "string",
+                     precision=19 if i % 10 == 0 else 100,
+                     porttype=porttype,
+                     expression=f"col_{i:04d}" if porttype == "INPUT/OUTPUT" else "",
+                     picture_text="A  19 YYYY-MM-DD HH24:MI:SS" if i % 10 == 0 else "")
+                for i in range(columns)]
+
+    nodes = {
+        "SRC_wide": Node("SRC_wide", SOURCE_DEFINITION, "SRC_wide", fields("OUTPUT"),
+                         flatfile={"DELIMITERS": ",", "SKIPROWS": "1", "NULL_CHARACTER": "*"}),
+        "SQ_wide": Node("SQ_wide", SOURCE_QUALIFIER, "SQ_wide", fields("INPUT/OUTPUT")),
+        "EXP_wide": Node("EXP_wide", EXPRESSION, "EXP_wide", fields("INPUT/OUTPUT")),
+        "TGT_wide": Node("TGT_wide", TARGET_DEFINITION, "TGT_wide", fields("INPUT")),
+    }
+    chain = ["SRC_wide", "SQ_wide", "EXP_wide", "TGT_wide"]
+    edges = [Edge(upstream, port.name, downstream, port.name)
+             for upstream, downstream in zip(chain, chain[1:])
+             for port in nodes[upstream].ports]
+    graph = MappingGraph(name=f"m_wide_{columns}", nodes=nodes, edges=edges)
+    return CompiledMapping(content_hash="", graph=graph)
+
+
+def _legacy_plan(spark, compiled, path: str):
+    """Per-column withColumn chain, as the hand-written workflow used to build it"""
+    from pyspark.sql import functions as F
+    from pyspark.sql.types import StringType, StructField, StructType
+
+    source = compiled.graph.nodes["SRC_wide"]
+    schema = StructType([StructField(port.name, StringType()) for port in source.ports])
+    df = spark.read.option("header", "true").schema(schema).csv(path)
+    for port in source.ports:
+        if port.datatype == "date/time":
+            df = df.withColumn(port.name, F.to_timestamp(F.col(port.name), "yyyy-MM-dd HH:mm:ss"))
+    for column in df.columns:
+        if df.schema[column].dataType.simpleString() == "string":
+            df = df.withColumn(column, F.when(F.col(column) == "*", None).otherwise(F.col(column)))
+    return df
+
+
+def benchmark_plan(columns: List[int] = (50, 100, 300), repeat: int = 3) -> Dict[int, Dict[str, float]]:
+    """
+    Time plan construction plus analysis for wide schemas: the compiled
+    single-projection lowering against a per-column withColumn chain
+    """
+    import os
+    import tempfile
+    from spark_lowering import build_plan
+
+    spark = _spark()
+    print("🚀 Plan construction benchmark (build + analyze, no job)")
+    print("=" * 60)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for width in columns:
+            compiled = wide_mapping(width)
+            path = os.path.join(tmp, f"wide_{width}.csv")
+            with open(path, "w") as handle:
+                handle.write(",".join(port.name for port in compiled.graph.nodes["SRC_wide"].ports) + "\n")
+
+            def analyze(build):
+                # Force analysis and optimization without running a job
+                build()._jdf.queryExecution().optimizedPlan()
+
+            timings = {
+                "single_select": _time(lambda: analyze(lambda: build_plan(compiled, spark, path)), repeat),
+                "withColumn_chain": _time(lambda: analyze(lambda: _legacy_plan(spark, compiled, path)), repeat),
+            }
+            results[width] = timings
+            print(f"\n📊 {width} columns")
+            for name, seconds in timings.items():
+                print(f"  {name:<20} {seconds:8.3f}s")
+    return results
+
+
+def _write_single(df, path: str, write) -> str:
+    """Write df as one part file under path and return the part file"""
+    import glob
+
+    write(df.coalesce(1).write.mode("overwrite"), path)
+    return glob.glob(f"{path}/part-*")[0]
+
+
+def benchmark_fixed_width(rows: int = 1_000_000, repeat: int = 3) -> Dict[str, float]:
+    """
+    Throughput of the fixed-width readers against the CSV reader on the same
+    records: bank_transactions.csv repeated to rows rows, written once as CSV
+    and once fixed-width with the SOURCEFIELD layout of wf_test_dev.XML
+    """
+    import dataclasses
+    import tempfile
+    import pandas as pd
+    from pyspark.sql import functions as F
+    from pyspark.sql.types import StringType, StructField, StructType
+    from flat_file import fixed_width_fields, read_fixed_width_pandas
+    from mapping_compiler import compile_mapping
+    from spark_lowering import read_source
+
+    spark = _spark()
+    source = compile_mapping("wf_test_dev.XML").graph.sources[0]
+    fixed_source = dataclasses.replace(source, flatfile={**source.flatfile, "DELIMITED": "NO", "SKIPROWS": "0"})
+    fields = fixed_width_fields(fixed_source)
+
+    print("🚀 Fixed-width reader benchmark")
+    print(f"Rows: {rows:,}, record width: {max(field.end for field in fields)} bytes")
+    print("=" * 60)
+
+    sample = spark.read.option("header", "true") \
+        .schema(StructType([StructField(port.name, StringType()) for port in source.ports])) \
+        .csv("bank_transactions.csv")
+    copies = max(1, rows // sample.count())
+    records = sample.crossJoin(spark.range(copies).select(F.col("id").alias("__copy"))).drop("__copy")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = _write_single(records, f"{tmp}/csv", lambda writer, path: writer.option("header", "true").csv(path))
+        record = F.concat(*[F.rpad(F.coalesce(F.col(field.port.name), F.lit("")), field.length, " ")
+                            for field in fields])
+        fixed_file = _write_single(records.select(record.alias("value")), f"{tmp}/fixed",
+                                   lambda writer, path: writer.text(path))
+
+        def spark_read(node, path):
+            read_source(spark, node, path).write.format("noop").mode("overwrite").save()
+
+        results = {
+            "spark csv": _time(lambda: spark_read(source, csv_file), repeat),
+            "spark fixed-width": _time(lambda: spark_read(fixed_source, fixed_file), repeat),
+            "pandas read_csv": _time(lambda: pd.read_csv(
+                csv_file, na_values="*", parse_dates=["Transaction_Date", "Last_Updated_Timestamp"]), repeat),
+            "pandas fixed-width mmap": _time(lambda: read_fixed_width_pandas(fixed_source, fixed_file), repeat),
+        }
+
+    total = copies * sample.count()
+    for name, seconds in results.items():
+        print(f"  {name:<24} {seconds:8.3f}s  {total / seconds:>12,.0f} rows/s")
+    return results
+
+
+def benchmark_staging(rows: int = 2_000_000, repeat: int = 3) -> Dict[str, float]:
+    """
+    Workflow runs and dashboard-style pandas reads on the uploaded CSV against
+    its Parquet staging copy: bank_transactions.csv repeated to rows rows
+    """
+    import hashlib
+    import tempfile
+    import pandas as pd
+    from pyspark.sql import functions as F
+    from pyspark.sql.types import StringType, StructField, StructType
+    from mapping_compiler import compile_mapping
+    from pyspark_workflow import InformaticaToPySparkWorkflow, shared_spark_session
+    from spark_lowering import write_staged
+    from staging import StagingCache, read_staged_pandas, staging_key
+
+    spark = shared_spark_session()
+    mapping = compile_mapping("wf_test_dev.XML")
+    source = mapping.graph.sources[0]
+
+    print("🚀 Parquet staging benchmark")
+    print(f"Rows: {rows:,}")
+    print("=" * 60)
+
+    sample = spark.read.option("header", "true") \
+        .schema(StructType([StructField(port.name, StringType()) for port in source.ports])) \
+        .csv("bank_transactions.csv")
+    copies = max(1, rows // sample.count())
+    records = sample.crossJoin(spark.range(copies).select(F.col("id").alias("__copy"))).drop("__copy")
+
+    def run(path):
+        InformaticaToPySparkWorkflow(spark_session=spark).execute_workflow(path) \
+            .write.format("noop").mode("overwrite").save()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = _write_single(records, f"{tmp}/csv", lambda writer, path: writer.option("header", "true").csv(path))
+        with open(csv_file, "rb") as handle:
+            digest = hashlib.sha256(handle.read()).hexdigest()
+
+        start = time.perf_counter()
+        staged = StagingCache(f"{tmp}/staging").stage(
+            staging_key(digest, mapping.content_hash, source.name, "spark"), csv_file, "spark",
+            lambda path: write_staged(spark, source, csv_file, path),
+            spark.conf.get("spark.sql.session.timeZone"))
+        staging = time.perf_counter() - start
+
+        dashboard_columns = ["Transaction_Type", "Amount"]
+        results = {
+            "stage once": staging,
+            "workflow on csv": _time(lambda: run(csv_file), repeat),
+            "workflow on parquet": _time(lambda: run(staged.path), repeat),
+            "pandas read_csv": _time(lambda: pd.read_csv(csv_file), repeat),
+            "pandas parquet, 2 columns": _time(lambda: read_staged_pandas(staged, dashboard_columns), repeat),
+            "pandas parquet, filtered": _time(lambda: read_staged_pandas(
+                staged, dashboard_columns, filters=[("Transaction_Type", "=", "DEPOSIT")]), repeat),
+        }
+
+    for name, seconds in results.items():
+        print(f"  {name:<28} {seconds:8.3f}s")
+    print(f"  CSV {staged.source_bytes / 1e6:,.1f} MB -> Parquet {staged.staged_bytes / 1e6:,.1f} MB")
+    return results
+
+
+def _tasks(spark, group: str) -> int:
+    """Tasks of the stages run by the jobs of a job group (skipped stages count theirs too)"""
+    tracker = spark.sparkContext.statusTracker()
+    total = 0
+    for job_id in tracker.getJobIdsForGroup(group):
+        job = tracker.getJobInfo(job_id)
+        for stage_id in (job.stageIds if job else []):
+            stage = tracker.getStageInfo(stage_id)
+            total += stage.numTasks if stage else 0
+    return total
+
+
+def benchmark_partitions(rows: List[int] = (28, 200_000, 2_000_000), repeat: int = 3) -> Dict[int, Dict[str, Dict]]:
+    """
+    Workflow runs on bank_transactions.csv repeated to each row count under
+    Spark's default partitioning, the session's (one partition, as
+    wf_test_dev.XML declares) and dynamic sizing from the input size
+    """
+    import tempfile
+    from pyspark.sql import functions as F
+    from pyspark.sql.types import StringType, StructField, StructType
+    from mapping_compiler import compile_mapping
+    from partition_planner import PARTITIONING_MODES
+    from pyspark_workflow import InformaticaToPySparkWorkflow, shared_spark_session
+
+    spark = shared_spark_session()
+    source = compile_mapping("wf_test_dev.XML").graph.sources[0]
+    cores = spark.sparkContext.defaultParallelism
+
+    print("🚀 Partitioning benchmark")
+    print(f"Rows: {', '.join(f'{count:,}' for count in rows)}, cores: {cores}")
+    print("=" * 60)
+
+    sample = spark.read.option("header", "true") \
+        .schema(StructType([StructField(port.name, StringType()) for port in source.ports])) \
+        .csv("bank_transactions.csv")
+    sample_rows = sample.count()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in rows:
+            copies = max(1, count // sample_rows)
+            records = sample.crossJoin(spark.range(copies).select(F.col("id").alias("__copy"))).drop("__copy")
+            csv_file = _write_single(records, f"{tmp}/csv_{count}",
+                                     lambda writer, path: writer.option("header", "true").csv(path))
+            results[count] = {}
+            for mode in PARTITIONING_MODES:
+                group = f"partitions_{count}_{mode}"
+                spark.sparkContext.setJobGroup(group, group)
+                workflow = InformaticaToPySparkWorkflow(spark_session=spark, partitioning=mode)
+                seconds = _time(lambda: workflow.execute_workflow(csv_file)
+                                .write.format("noop").mode("overwrite").save(), repeat)
+                plan = workflow.partition_plan
+                results[count][mode] = {"seconds": seconds, "tasks": _tasks(spark, group) // repeat,
+                                        "partitions": plan.partitions, "split_bytes": plan.max_partition_bytes}
+            spark.sparkContext.setJobGroup("", "")
+
+    for count, modes in results.items():
+        print(f"  {count:>10,} rows")
+        for mode, result in modes.items():
+            print(f"    {mode:<8} {result['seconds']:8.3f}s  {result['tasks']:5d} tasks  "
+                  f"partitions={result['partitions'] or 'default'}")
+    return results
+
+
+def _merge_table(keys, version: int):
+    """Synthetic target rows for the given Transaction_IDs"""
+    import numpy as np
+    import pyarrow as pa
+
+    return pa.table({
+        "Transaction_ID": pa.array(keys, pa.int32()),
+        "Amount": np.round(keys % 100000 / 100 + version, 2),
+        "Branch_Code": pa.array([f"BR{key % 50:03d}" for key in keys]),
+        "Transaction_Date": pa.array(np.datetime64("2023-01-01") + keys * 7919 % 730, pa.date32()),
+        "Last_Updated_Timestamp": pa.array(np.full(len(keys), 1700000000 + version, dtype="datetime64[us]")),
+        "Record_Operation": pa.array(["INSERT"] * len(keys)),
+    })
+
+
+def benchmark_merge(rows: int = 2_000_000, delta_rows: List[int] = (1_000, 10_000, 100_000),
+                    buckets: int = 64) -> Dict[int, Dict[str, float]]:
+    """
+    Bucketed MERGE (target_merge.py) of deltas of several sizes into a target
+    of rows keys, against rewriting the whole table: read it, drop the
+    delta's keys, append the delta and write it back. Half of every delta
+    updates existing keys, the other half inserts new ones.
+    """
+    import shutil
+    import tempfile
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from target_merge import MergeTarget
+
+    print("🚀 Target merge benchmark")
+    print(f"Target rows: {rows:,}, buckets: {buckets}")
+    print("=" * 60)
+
+    base = _merge_table(np.arange(rows), 0)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in delta_rows:
+            rng = np.random.default_rng(size)
+            keys = np.concatenate([rng.choice(rows, size // 2, replace=False), rows + np.arange(size - size // 2)])
+            delta = _merge_table(keys, 1)
+
+            target_path = f"{tmp}/target-{size}"
+            MergeTarget(target_path, "Transaction_ID", buckets, cluster_by=["Transaction_Date"]).merge(base)
+            start = time.perf_counter()
+            merged = MergeTarget(target_path, "Transaction_ID").merge(delta)
+            bucketed = time.perf_counter() - start
+
+            full_path = f"{tmp}/full-{size}.parquet"
+            pq.write_table(base, full_path)
+            start = time.perf_counter()
+            table = pq.read_table(full_path)
+            table = table.filter(pc.invert(pc.is_in(table["Transaction_ID"], value_set=delta["Transaction_ID"])))
+            pq.write_table(pa.concat_tables([table, delta]), full_path)
+            full = time.perf_counter() - start
+            shutil.rmtree(target_path)
+
+            results[size] = {"bucketed": bucketed, "full rewrite": full, "buckets rewritten": merged.buckets_rewritten,
+                             "rows rewritten": merged.rows_rewritten}
+            print(f"  delta {size:>9,}: bucketed {bucketed:7.3f}s ({merged.buckets_rewritten}/{buckets} buckets, "
+                  f"{merged.rows_rewritten:,} rows rewritten)   full rewrite {full:7.3f}s")
+    return results
+
+
+def benchmark_scan(rows: int = 2_000_000, buckets: int = 16, lookups: int = 100) -> Dict[str, Dict[str, float]]:
+    """
+    Index-pruned reads of a merge target (target_merge.MergeTarget.scan),
+    sorted on Transaction_Date or Z-ordered on Transaction_ID and
+    Transaction_Date: point lookups of single keys and Transaction_Date
+    ranges, against reading the whole table and filtering it. Reports the
+    share of rows the pruned reads touched.
+    """
+    import tempfile
+    import numpy as np
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from target_merge import MergeTarget
+
+    print("🚀 Target scan benchmark")
+    print(f"Target rows: {rows:,}, buckets: {buckets}")
+    print("=" * 60)
+
+    base = _merge_table(np.arange(rows), 0)
+    date_type = base["Transaction_Date"].type
+    keys = np.random.default_rng(0).choice(rows, lookups, replace=False).tolist()
+    ranges = {"1 day": ("2023-06-01", "2023-06-01"), "1 week": ("2023-06-01", "2023-06-07"),
+              "1 month": ("2023-06-01", "2023-06-30")}
+    layouts = {"sorted on Transaction_Date": ["Transaction_Date"],
+               "Z-ordered on Transaction_ID, Transaction_Date": ["Transaction_ID", "Transaction_Date"]}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        pq.write_table(base, f"{tmp}/full.parquet")
+
+        def full_read(mask):
+            """Seconds to read the whole table and filter it"""
+            start = time.perf_counter()
+            table = pq.read_table(f"{tmp}/full.parquet")
+            table.filter(mask(table))
+            return time.perf_counter() - start
+
+        # Every lookup without an index reads the whole table; one is timed
+        full = {f"{lookups} point lookups": full_read(lambda table: pc.equal(table["Transaction_ID"], keys[0])) * lookups}
+        for name, (low, high) in ranges.items():
+            full[f"{name} of Transaction_Date"] = full_read(lambda table: pc.and_(
+                pc.greater_equal(table["Transaction_Date"], pc.cast(low, date_type)),
+                pc.less_equal(table["Transaction_Date"], pc.cast(high, date_type))))
+
+        for layout, cluster_by in layouts.items():
+            print(f"Target {layout}:")
+            target = MergeTarget(f"{tmp}/{'-'.join(cluster_by)}", "Transaction_ID", buckets, cluster_by=cluster_by)
+            target.merge(base)
+            reads = {f"{lookups} point lookups": lambda: [target.scan(keys=[key]) for key in keys]}
+            for name, bounds in ranges.items():
+                reads[f"{name} of Transaction_Date"] = lambda bounds=bounds: [
+                    target.scan(ranges={"Transaction_Date": bounds})]
+
+            for name, read in reads.items():
+                start = time.perf_counter()
+                scans = read()
+                pruned = time.perf_counter() - start
+                share = sum(stats.rows_read for _, stats in scans) / (len(scans) * rows)
+                results[f"{layout}: {name}"] = {"pruned": pruned, "full read": full[name], "rows read": share}
+                print(f"  {name:>26}: pruned {pruned:7.3f}s ({share:6.1%} of rows read per scan)"
+                      f"   full read {full[name]:7.3f}s")
+    return results
+
+
+# Serves app.py on a given port, optionally pre-warming the SparkSession first
+_STARTUP_SERVER = """
+import sys
+import app
+if sys.argv[2] == "1":
+    app.start_prewarm()
+app.app.run(host="127.0.0.1", port=int(sys.argv[1]), threaded=True)
+"""
+
+
+def _startup_run(port: int, prewarm: bool, sample: str) -> Dict[str, float]:
+    """
+    Boot the app in a fresh process and time, from process start, the first
+    byte of / and the completion of a first workflow run on sample. With
+    prewarm the run is submitted once /api/health reports the warm-up done.
+    """
+    import http.cookiejar
+    import json
+    import os
+    import subprocess
+    import sys
+    import urllib.request
+    import uuid
+
+    base = f"http://127.0.0.1:{port}"
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def call(path, data=None, headers=None):
+        request = urllib.request.Request(base + path, data=data, headers=headers or {},
+                                         method="POST" if data is not None else "GET")
+        try:
+            with opener.open(request) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            return e.read()
+
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-c", _STARTUP_SERVER, str(port), "1" if prewarm else "0"],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        while True:
+            try:
+                call("/")
+                break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.02)
+        first_byte = time.perf_counter() - start
+        timings = {"first byte": first_byte}
+        if prewarm:
+            while not json.loads(call("/api/health"))["warmed_up"]:
+                time.sleep(0.05)
+            timings["warmed up"] = time.perf_counter() - start
+
+        boundary = uuid.uuid4().hex
+        with open(sample, "rb") as handle:
+            body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; "
+                    f"filename=\"{os.path.basename(sample)}\"\r\nContent-Type: text/csv\r\n\r\n").encode() \
+                + handle.read() + f"\r\n--{boundary}--\r\n".encode()
+        call("/api/upload", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+        submitted = time.perf_counter()
+        job_id = json.loads(call("/api/execute", b""))["job_id"]
+        while True:
+            job = json.loads(call(f"/api/jobs/{job_id}"))["job"]
+            if job["status"] in ("succeeded", "failed", "cancelled"):
+                break
+            time.sleep(0.05)
+        if job["status"] != "succeeded":
+            raise RuntimeError(f"First run {job['status']}: {job['error']}")
+        done = time.perf_counter()
+        timings["first job (since boot)"] = done - start
+        timings["first job (since submit)"] = done - submitted
+        return timings
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def benchmark_startup(repeat: int = 3, port: int = 5055, sample: str = "bank_transactions.csv") -> Dict[str, Dict[str, float]]:
+    """
+    Cold-start cost of the web app: time to import app.py, time to first byte
+    and time to the first completed workflow run, without and with pre-warming
+    """
+    import os
+    import subprocess
+    import sys
+
+    print("🚀 Startup benchmark")
+    print(f"Sample: {sample}, best of {repeat}")
+    print("=" * 60)
+
+    import_timer = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+    imports = [float(subprocess.run([sys.executable, "-c", import_timer], capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()[-1])
+               for _ in range(repeat)]
+    print(f"  {'import app':<36} {min(imports):8.3f}s")
+
+    results = {"import": {"import app": min(imports)}}
+    for prewarm in (False, True):
+        mode = "pre-warmed" if prewarm else "cold"
+        runs = [_startup_run(port, prewarm, sample) for _ in range(repeat)]
+        results[mode] = {metric: min(run[metric] for run in runs) for metric in runs[0]}
+        for metric, seconds in results[mode].items():
+            print(f"  {mode + ' ' + metric:<36} {seconds:8.3f}s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    dedup = subparsers.add_parser("dedup", help="Compare dedup strategies per duplicate ratio")
+    dedup.add_argument("--rows", type=int, default=2_000_000)
+    dedup.add_argument("--duplicate-ratios", default=",".join(str(r) for r in DEFAULT_DUPLICATE_RATIOS))
+    dedup.add_argument("--repeat", type=int, default=3)
+    dedup.add_argument("--strategies", default=None, help="Comma-separated subset of strategies")
+
+    plan = subparsers.add_parser("plan", help="Plan construction time for wide schemas")
+    plan.add_argument("--columns", default="50,100,300")
+    plan.add_argument("--repeat", type=int, default=3)
+
+    fixed_width = subparsers.add_parser("fixed-width", help="Fixed-width readers against the CSV reader")
+    fixed_width.add_argument("--rows", type=int, default=1_000_000)
+    fixed_width.add_argument("--repeat", type=int, default=3)
+
+    staging = subparsers.add_parser("staging", help="Workflow and pandas reads on CSV against Parquet staging")
+    staging.add_argument("--rows", type=int, default=2_000_000)
+    staging.add_argument("--repeat", type=int, default=3)
+
+    startup = subparsers.add_parser("startup", help="Import, first-byte and first-run times of the web app")
+    startup.add_argument("--repeat", type=int, default=3)
+    startup.add_argument("--port", type=int, default=5055)
+    startup.add_argument("--sample", default="bank_transactions.csv")
+
+    merge = subparsers.add_parser("merge", help="Bucketed target MERGE against a full table rewrite")
+    merge.add_argument("--rows", type=int, default=2_000_000)
+    merge.add_argument("--delta-rows", default="1000,10000,100000")
+    merge.add_argument("--buckets", type=int, default=64)
+
+    scan = subparsers.add_parser("scan", help="Index-pruned target lookups and range reads against full reads")
+    scan.add_argument("--rows", type=int, default=2_000_000)
+    scan.add_argument("--buckets", type=int, default=16)
+    scan.add_argument("--lookups", type=int, default=100)
+
+    partitions = subparsers.add_parser("partitions", help="Session and dynamic partitioning against Spark's defaults")
+    partitions.add_argument("--rows", default="28,200000,2000000")
+    partitions.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.benchmark == "partitions":
+        benchmark_partitions(rows=[int(r) for r in args.rows.split(",")], repeat=args.repeat)
+    elif args.benchmark == "scan":
+        benchmark_scan(rows=args.rows, buckets=args.buckets, lookups=args.lookups)
+    elif args.benchmark == "merge":
+        benchmark_merge(rows=args.rows, delta_rows=[int(r) for r in args.delta_rows.split(",")], buckets=args.buckets)
+    elif args.benchmark == "staging":
+        benchmark_staging(rows=args.rows, repeat=args.repeat)
+    elif args.benchmark == "startup":
+        benchmark_startup(repeat=args.repeat, port=args.port, sample=args.sample)
+    elif args.benchmark == "fixed-width":
+        benchmark_fixed_width(rows=args.rows, repeat=args.repeat)
+    elif args.benchmark == "plan":
+        benchmark_plan(columns=[int(c) for c in args.columns.split(",")], repeat=args.repeat)
+    elif args.benchmark == "dedup":
+        benchmark_dedup(
+            rows=args.rows,
+            duplicate_ratios=[float(r) for r in args.duplicate_ratios.split(",")],
+            repeat=args.repeat,
+            strategies=args.strategies.split(",") if args.strategies else None,
+        )
+
+
+if __name__ == "__main__":
+    main()
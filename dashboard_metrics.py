@@ -0,0 +1,923 @@
+"""
+Dashboard metrics of the uploaded data and of a run's full output
+
+Every number on the dashboard comes from one aggregation pass over each
+dataset. The pass produces a profile: the global statistics (row count,
+distinct ids, exact amount median and spread) and a compact cube of row
+counts, amount sums, extremes and squared deviations keyed by transaction
+type x status x channel x branch x day x amount bin. On Spark the pass is a
+single job; small datasets use vectorized pandas over only the columns the
+dashboard needs. Row and null counts (completeness) and the amount range
+that fixes the histogram bins are read from the Parquet footers, so they
+cost no pass at all.
+
+Distributions, daily volumes, the histogram and the amount totals are
+roll-ups of the cube, so a filtered dashboard is a masked sum over the cube
+cells: milliseconds, whatever the row count. Runs profile both datasets
+when they finish and store the profiles as an .npz artifact keyed by run id
+(the cells as arrays); loaded profiles are kept in memory for the filter
+endpoint.
+Datasets of APPROXIMATE_MIN_ROWS rows or more are profiled in constant
+memory instead: record batches (or Spark partitions) feed mergeable
+sketches (sketches.py) for the distinct ids, the median and the heavy
+hitters of each distribution, and the cube keeps only those heavy hitters.
+The profile reports the error bounds of the estimates.
+"""
+
+import json
+import math
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sketches import HyperLogLog, KLLSketch, MisraGries
+from staging import arrow_to_pandas, column_stats, parquet_files, read_parquet_pandas
+
+ID_COLUMN = "Transaction_ID"
+DATE_COLUMN = "Transaction_Date"
+AMOUNT_COLUMN = "Amount"
+
+# Distribution name -> column
+CATEGORY_COLUMNS = {
+    "transaction_type": "Transaction_Type",
+    "status": "Status",
+    "channel": "Channel",
+    "branch": "Branch_Code",
+}
+
+# Keys of the cube cells
+DIMENSIONS = list(CATEGORY_COLUMNS) + ["day", "bin"]
+
+# Values of the cube cells
+MEASURES = ("records", "amounts", "amount_sum", "amount_m2", "amount_min", "amount_max")
+
+HISTOGRAM_BINS = 10
+
+# How the amount histogram is binned: equal widths, equal counts or widths
+# growing geometrically (for skewed amounts)
+BIN_STRATEGIES = ("equal-width", "quantile", "log")
+DEFAULT_BIN_STRATEGY = "equal-width"
+
+# Accuracy of the Spark quantiles behind quantile bins (rank error about 1 / accuracy)
+QUANTILE_ACCURACY = 10_000
+
+# Datasets with at least this many rows are aggregated on Spark (when available);
+# smaller ones are faster in pandas, reading only the dashboard columns
+SPARK_MIN_ROWS = 5_000_000
+
+# Datasets with at least this many rows get approximate profiles (see profile_dataset)
+APPROXIMATE_MIN_ROWS = 100_000_000
+
+# Approximate profiles show the TOP_VALUES heaviest values of each distribution
+# at most and count the others together as OTHER_VALUE
+TOP_VALUES = 100
+OTHER_VALUE = "(other)"
+
+# Rows per batch of an approximate profile read with pandas
+PROFILE_BATCH_ROWS = 1_000_000
+
+# Cube cells of the batches read so far are merged beyond this many
+MAX_PARTIAL_CELLS = 2_000_000
+
+# Loaded run profiles kept in memory
+MAX_CACHED_PROFILES = 16
+
+# Array types of the stored cube cells (the other measures are float64)
+_CELL_TYPES = {**{name: "int32" for name in DIMENSIONS}, "records": "int64", "amounts": "int64"}
+
+_NUMERIC_TYPES = ("int", "uint", "float", "double", "decimal")
+
+
+@dataclass
+class DashboardFilter:
+    """
+    A dashboard filter: the selected values of each distribution (none
+    selected means all), an inclusive day range and an amount range. The
+    amount range selects whole histogram bins, those overlapping it.
+    """
+    transaction_types: List[str] = field(default_factory=list)
+    statuses: List[str] = field(default_factory=list)
+    channels: List[str] = field(default_factory=list)
+    branches: List[str] = field(default_factory=list)
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DashboardFilter":
+        """Filter from request JSON; raises ValueError for unknown keys or malformed values"""
+        unknown = set(data) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+        flt = cls()
+        for name in ("transaction_types", "statuses", "channels", "branches"):
+            values = data.get(name) or []
+            if not isinstance(values, list):
+                raise ValueError(f"{name} must be a list")
+            setattr(flt, name, [str(value) for value in values])
+        for name in ("start_date", "end_date"):
+            if data.get(name):
+                setattr(flt, name, date.fromisoformat(data[name]).isoformat())
+        for name in ("min_amount", "max_amount"):
+            if data.get(name) not in (None, ""):
+                setattr(flt, name, float(data[name]))
+        return flt
+
+    @property
+    def selections(self) -> Dict[str, List[str]]:
+        """Selected values by distribution name"""
+        return {
+            "transaction_type": self.transaction_types,
+            "status": self.statuses,
+            "channel": self.channels,
+            "branch": self.branches,
+        }
+
+    @property
+    def empty(self) -> bool:
+        return not any(asdict(self).values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _number(value) -> Optional[float]:
+    """float of a statistic, None for missing or NaN values (not valid JSON)"""
+    if value is None:
+        return None
+    value = float(value)
+    return None if value != value else value
+
+
+def _footer_range(stats: Dict[str, Dict[str, Any]], column: str):
+    """(min, max) of a numeric column from the Parquet footers, None when unknown"""
+    entry = stats.get(column)
+    if not entry or not entry["type"].startswith(_NUMERIC_TYPES) or entry["min"] is None:
+        return None
+    return float(entry["min"]), float(entry["max"])
+
+
+def _completeness(rows: int, stats: Dict[str, Dict[str, Any]]) -> float:
+    cells = rows * len(stats)
+    nulls = sum(entry["null_count"] for entry in stats.values())
+    return round((cells - nulls) / cells * 100, 2) if cells > 0 else 0
+
+
+def histogram_edges(low: float, high: float, bins: int = HISTOGRAM_BINS) -> List[float]:
+    """
+    Equal-width bin edges from low to high, binned left-closed (see
+    _bin_codes). A single value is widened by 0.1% on both sides so the
+    edges are distinct.
+    """
+    import numpy as np
+
+    if low == high:
+        low -= 0.001 * abs(low) if low != 0 else 0.001
+        high += 0.001 * abs(high) if high != 0 else 0.001
+    return np.linspace(low, high, bins + 1).tolist()
+
+
+def bin_edges(strategy: str, low: float, high: float, quantiles: Optional[Callable] = None,
+              bins: int = HISTOGRAM_BINS) -> List[float]:
+    """
+    Histogram bin edges for amounts from low to high. quantiles(fractions)
+    gives the amounts at those fractions; the quantile strategy needs it and
+    merges bins of equal edges (repeated amounts).
+    """
+    import numpy as np
+
+    if strategy not in BIN_STRATEGIES:
+        raise ValueError(f"Unknown bin strategy: {strategy} (expected one of {', '.join(BIN_STRATEGIES)})")
+    if strategy == "equal-width" or low == high:
+        return histogram_edges(low, high, bins)
+    if strategy == "log":
+        if low > 0:
+            edges = np.geomspace(low, high, bins + 1)
+        else:
+            # Log-spaced distances from the minimum when amounts reach zero or below
+            edges = low + np.expm1(np.linspace(0, np.log1p(high - low), bins + 1))
+    else:
+        inner = np.asarray(quantiles(np.linspace(0, 1, bins + 1)[1:-1]), dtype="float64")
+        edges = np.unique(np.concatenate([[low], inner[(inner > low) & (inner < high)], [high]]))
+    edges[0], edges[-1] = low, high
+    return edges.tolist()
+
+
+def _bin_codes(amount, edges: List[float]):
+    """
+    Histogram bin of each amount, -1 for missing ones. Bins are
+    [edges[i], edges[i + 1]) except the last, which also holds the maximum.
+    """
+    import numpy as np
+
+    bins = len(edges) - 1
+    codes = np.searchsorted(edges, amount, side="right") - 1
+    codes[amount == edges[-1]] = bins - 1
+    codes[(codes < 0) | (codes >= bins) | np.isnan(amount)] = -1
+    return codes
+
+
+def _cell_frame(df, edges: Optional[List[float]], kept: Optional[Dict[str, List[str]]] = None):
+    """
+    Cube cells of a pandas DataFrame keyed by the dimension values. With
+    kept, distribution values not kept for their column count as OTHER_VALUE.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rows = len(df)
+    keys: Dict[str, Any] = {}
+    for name, column in CATEGORY_COLUMNS.items():
+        if column not in df.columns:
+            keys[name] = np.full(rows, None, dtype=object)
+        elif kept is not None:
+            values = df[column].astype(str).where(df[column].notna())
+            keys[name] = values.where(values.isin(kept[name]) | values.isna(), OTHER_VALUE)
+        else:
+            keys[name] = df[column]
+    keys["day"] = pd.to_datetime(df[DATE_COLUMN], errors="coerce").dt.normalize() \
+        if DATE_COLUMN in df.columns else pd.Series(pd.NaT, index=df.index)
+    amount = pd.to_numeric(df[AMOUNT_COLUMN], errors="coerce").to_numpy(dtype="float64") \
+        if AMOUNT_COLUMN in df.columns else np.full(rows, np.nan)
+    keys["bin"] = _bin_codes(amount, edges) if edges else np.full(rows, -1)
+
+    frame = pd.DataFrame({name: np.asarray(values) for name, values in keys.items()})
+    frame["amount"] = amount
+    cells = frame.groupby(DIMENSIONS, sort=False, dropna=False)["amount"] \
+        .agg(["size", "count", "sum", "min", "max", "var"]).reset_index()
+    cells["var"] = (cells["var"] * (cells["count"] - 1)).fillna(0.0)
+    return cells.rename(columns=dict(zip(["size", "count", "sum", "var", "min", "max"], MEASURES)))
+
+
+def _merge_cells(cells):
+    """Cells of the same key (from different batches) merged into one"""
+    groups = cells.groupby(DIMENSIONS, sort=False, dropna=False)
+    merged = groups.agg({"records": "sum", "amounts": "sum", "amount_sum": "sum", "amount_m2": "sum",
+                         "amount_min": "min", "amount_max": "max"})
+    # Chan et al.: squared deviations of the parts around the merged mean
+    mean = groups["amount_sum"].transform("sum") / groups["amounts"].transform("sum")
+    spread = (cells["amounts"] * (cells["amount_sum"] / cells["amounts"] - mean) ** 2).fillna(0.0)
+    merged["amount_m2"] += spread.groupby([cells[name] for name in DIMENSIONS], sort=False, dropna=False).sum()
+    return merged.reset_index()
+
+
+def _encode_cells(cells, columns) -> Tuple[Dict[str, Optional[List[str]]], Dict[str, Any]]:
+    """
+    The values of each dimension (None for columns not in columns) and the
+    cells with each key replaced by its index in them (-1 for missing keys)
+    """
+    import pandas as pd
+
+    values: Dict[str, Optional[List[str]]] = {}
+    encoded: Dict[str, Any] = {}
+    for name, column in CATEGORY_COLUMNS.items():
+        encoded[name], uniques = pd.factorize(cells[name])
+        values[name] = [str(value) for value in uniques] if column in columns else None
+    encoded["day"], uniques = pd.factorize(pd.to_datetime(cells["day"]))
+    values["day"] = [day.strftime("%Y-%m-%d") for day in uniques] if DATE_COLUMN in columns else None
+    encoded["bin"] = cells["bin"].to_numpy(dtype="int64")
+    encoded.update({name: cells[name].to_numpy() for name in MEASURES})
+    return values, encoded
+
+
+def _pandas_profile(df, edges: Optional[List[float]], bins: str = DEFAULT_BIN_STRATEGY) -> Dict[str, Any]:
+    """
+    Profile of a pandas DataFrame: a groupby over the cube keys plus
+    vectorized global reductions. Without edges the histogram is binned by
+    the bins strategy over the DataFrame's amounts.
+    """
+    import numpy as np
+    import pandas as pd
+
+    profile: Dict[str, Any] = {
+        "records": len(df),
+        "unique_ids": int(df[ID_COLUMN].nunique(dropna=False)) if ID_COLUMN in df.columns else None,
+        "amount": None,
+        "edges": None,
+    }
+    if AMOUNT_COLUMN in df.columns:
+        amount = pd.to_numeric(df[AMOUNT_COLUMN], errors="coerce").to_numpy(dtype="float64")
+        present = amount[~np.isnan(amount)]
+        profile["amount"] = {
+            "count": len(present),
+            "total": float(present.sum()),
+            "min": _number(present.min()) if len(present) else None,
+            "max": _number(present.max()) if len(present) else None,
+            "median": _number(np.median(present)) if len(present) else None,
+            "std": _number(present.std(ddof=1)) if len(present) > 1 else None,
+        }
+        if len(present):
+            profile["edges"] = edges or bin_edges(bins, present.min(), present.max(),
+                                                  lambda fractions: np.quantile(present, fractions,
+                                                                                method="inverted_cdf"))
+    profile["values"], profile["cells"] = _encode_cells(_cell_frame(df, profile["edges"]), set(df.columns))
+    return profile
+
+
+def _bucketize(df, edges: List[float]):
+    """
+    df with the histogram bin of its amount column as bin (see _bin_codes),
+    found by a binary search over the edges per row
+    """
+    from pyspark.ml.feature import Bucketizer
+    from pyspark.sql import functions as F
+
+    # The amounts all lie within the edges, so the outer splits can be open;
+    # NaN lands in the extra bucket len(edges) - 1 and nulls stay null
+    splits = [float("-inf")] + list(edges[1:-1]) + [float("inf")]
+    bucketizer = Bucketizer(splits=splits, inputCol="amount", outputCol="bucket", handleInvalid="keep")
+    bucket = F.col("bucket")
+    return bucketizer.transform(df).withColumn("bin", F.when(bucket < len(edges) - 1, bucket.cast("int"))) \
+        .drop("bucket")
+
+
+def _spark_quantiles(df, fractions) -> List[float]:
+    """Approximate amount quantiles of a Spark DataFrame, one job for all fractions"""
+    from pyspark.sql import functions as F
+
+    amount = F.col(AMOUNT_COLUMN).cast("double")
+    return df.select(F.percentile_approx(amount, [float(f) for f in fractions], QUANTILE_ACCURACY)).first()[0]
+
+
+def _spark_profile(spark, df, edges: Optional[List[float]],
+                   kept: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+    """
+    Profile of a Spark DataFrame from one aggregation job: the cube cells
+    (grouped by all dashboard dimensions) next to the global amount and id
+    aggregates. With kept (approximate profiles) distribution values not
+    kept count as OTHER_VALUE and the global aggregates are left out.
+    """
+    from pyspark.sql import functions as F
+
+    columns = set(df.columns)
+    absent = F.lit(None)
+    amount = F.col(AMOUNT_COLUMN).cast("double") if AMOUNT_COLUMN in columns else absent.cast("double")
+    dimensions = []
+    for name, column in CATEGORY_COLUMNS.items():
+        value = F.col(column).cast("string") if column in columns else absent.cast("string")
+        if kept is not None and column in columns:
+            value = F.when(value.isNull() | value.isin(kept[name]), value).otherwise(F.lit(OTHER_VALUE))
+        dimensions.append(value.alias(name))
+    prepared = df.select(
+        *dimensions,
+        (F.to_date(F.col(DATE_COLUMN)) if DATE_COLUMN in columns else absent.cast("date")).alias("day"),
+        amount.alias("amount"),
+        (F.col(ID_COLUMN) if ID_COLUMN in columns else absent).alias("id"),
+    )
+    if edges and AMOUNT_COLUMN in columns:
+        prepared = _bucketize(prepared, edges)
+    else:
+        prepared = prepared.withColumn("bin", absent.cast("int"))
+    query = f"""
+        SELECT false AS total, {', '.join(DIMENSIONS)}, count(*) AS records,
+               count(amount) AS amounts, sum(amount) AS amount_sum,
+               coalesce(var_pop(amount) * count(amount), 0D) AS amount_m2,
+               min(amount) AS amount_min, max(amount) AS amount_max,
+               NULL AS std, NULL AS median, NULL AS unique_ids
+        FROM {{source}}
+        GROUP BY {', '.join(DIMENSIONS)}
+    """
+    if kept is None:
+        # The costly exact median and distinct count are computed once, over
+        # all rows, instead of once per cell
+        query += f"""
+            UNION ALL
+            SELECT true, {', '.join('NULL' for _ in DIMENSIONS)}, count(*),
+                   count(amount), sum(amount), NULL, min(amount), max(amount), stddev_samp(amount),
+                   percentile(amount, 0.5), count(DISTINCT id) + max(CAST(id IS NULL AS INT))
+            FROM {{source}}
+        """
+    rows = spark.sql(query, source=prepared).collect()
+
+    cells = [row for row in rows if not row.total]
+    codes: Dict[str, Dict[Any, int]] = {name: {} for name in DIMENSIONS[:-1]}
+    profile_cells: Dict[str, List[Any]] = {name: [] for name in DIMENSIONS + list(MEASURES)}
+    for row in cells:
+        for name in DIMENSIONS[:-1]:
+            value = row[name]
+            profile_cells[name].append(-1 if value is None else codes[name].setdefault(value, len(codes[name])))
+        profile_cells["bin"].append(-1 if row.bin is None else row.bin)
+        for name in MEASURES:
+            value = row[name]
+            profile_cells[name].append(float("nan") if value is None else value)
+
+    values: Dict[str, Optional[List[str]]] = {
+        name: list(codes[name]) if column in columns else None for name, column in CATEGORY_COLUMNS.items()
+    }
+    values["day"] = [day.strftime("%Y-%m-%d") for day in codes["day"]] if DATE_COLUMN in columns else None
+    if kept is not None:
+        return {"records": sum(profile_cells["records"]), "edges": edges, "values": values, "cells": profile_cells}
+    totals = next(row for row in rows if row.total)
+    return {
+        "records": totals.records,
+        "unique_ids": totals.unique_ids if ID_COLUMN in columns else None,
+        "amount": {
+            "count": totals.amounts,
+            "total": float(totals.amount_sum or 0),
+            "min": _number(totals.amount_min),
+            "max": _number(totals.amount_max),
+            "median": _number(totals.median),
+            "std": _number(totals.std),
+        } if AMOUNT_COLUMN in columns else None,
+        "edges": edges if AMOUNT_COLUMN in columns and totals.amounts else None,
+        "values": values,
+        "cells": profile_cells,
+    }
+
+
+class DatasetSketches:
+    """
+    The sketches of an approximate profile: distinct ids, amount quantiles
+    and the heavy hitters of each distribution. Batches and partitions each
+    build their own; merge combines them.
+    """
+
+    def __init__(self):
+        self.ids = HyperLogLog()
+        self.amount = KLLSketch()
+        self.categories = {name: MisraGries(TOP_VALUES) for name in CATEGORY_COLUMNS}
+
+    def update(self, df):
+        import pandas as pd
+
+        if ID_COLUMN in df.columns:
+            self.ids.update(df[ID_COLUMN])
+        if AMOUNT_COLUMN in df.columns:
+            self.amount.update(pd.to_numeric(df[AMOUNT_COLUMN], errors="coerce"))
+        for name, column in CATEGORY_COLUMNS.items():
+            if column in df.columns:
+                self.categories[name].update(df[column])
+
+    def merge(self, other: "DatasetSketches") -> "DatasetSketches":
+        self.ids.merge(other.ids)
+        self.amount.merge(other.amount)
+        for name, sketch in self.categories.items():
+            sketch.merge(other.categories[name])
+        return self
+
+    def kept(self) -> Dict[str, List[str]]:
+        """The distribution values counted on their own, the others count as OTHER_VALUE"""
+        return {name: list(sketch.counters.index) for name, sketch in self.categories.items()}
+
+    def bounds(self) -> Dict[str, Any]:
+        """Error bounds of the approximate statistics"""
+        return {
+            "unique_ids": {"relative_error": round(self.ids.relative_error, 6)},
+            "median": {"rank_error": round(self.amount.rank_error, 6)},
+            # Every value occurring more than min_count times is shown on its own
+            "distributions": {name: {"shown": len(sketch.counters), "min_count": sketch.error}
+                              for name, sketch in self.categories.items()},
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ids": self.ids.to_dict(),
+            "amount": self.amount.to_dict(),
+            "categories": {name: sketch.to_dict() for name, sketch in self.categories.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DatasetSketches":
+        sketches = cls()
+        sketches.ids = HyperLogLog.from_dict(data["ids"])
+        sketches.amount = KLLSketch.from_dict(data["amount"])
+        sketches.categories = {name: MisraGries.from_dict(sketch) for name, sketch in data["categories"].items()}
+        return sketches
+
+
+def _spark_sketches(df) -> DatasetSketches:
+    """Sketches of a Spark DataFrame, one per partition merged on the driver"""
+    import pandas as pd
+    from pyspark.sql import functions as F
+
+    columns = [F.col(ID_COLUMN)] if ID_COLUMN in df.columns else []
+    if AMOUNT_COLUMN in df.columns:
+        columns.append(F.col(AMOUNT_COLUMN).cast("double").alias(AMOUNT_COLUMN))
+    columns += [F.col(column).cast("string").alias(column) for column in CATEGORY_COLUMNS.values()
+                if column in df.columns]
+
+    def partition_sketches(batches):
+        sketches = DatasetSketches()
+        for batch in batches:
+            sketches.update(batch)
+        yield pd.DataFrame({"sketch": [json.dumps(sketches.to_dict())]})
+
+    merged = DatasetSketches()
+    for row in df.select(*columns).mapInPandas(partition_sketches, schema="sketch string").collect():
+        merged.merge(DatasetSketches.from_dict(json.loads(row.sketch)))
+    return merged
+
+
+def _parquet_batches(path: str, columns: List[str], timezone: Optional[str]):
+    """A Parquet file or directory as pandas DataFrames of up to PROFILE_BATCH_ROWS rows"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for file_path in parquet_files(path):
+        for batch in pq.ParquetFile(file_path).iter_batches(PROFILE_BATCH_ROWS, columns=columns):
+            yield arrow_to_pandas(pa.Table.from_batches([batch]), timezone)
+
+
+def _streamed_cells(path: str, columns: List[str], timezone: Optional[str], edges: Optional[List[float]],
+                    kept: Dict[str, List[str]]):
+    """The cube cells of a Parquet dataset, built batch by batch"""
+    import pandas as pd
+
+    partials, pending = [], 0
+    for df in _parquet_batches(path, columns, timezone):
+        partials.append(_cell_frame(df, edges, kept))
+        pending += len(partials[-1])
+        if pending > MAX_PARTIAL_CELLS:
+            partials = [_merge_cells(pd.concat(partials, ignore_index=True))]
+            pending = len(partials[0])
+    if not partials:
+        return _cell_frame(pd.DataFrame(columns=columns), edges, kept)
+    return _merge_cells(pd.concat(partials, ignore_index=True))
+
+
+def _amount_totals(cells, matching) -> Dict[str, Any]:
+    """Amount count, total, extremes and standard deviation of the cells at the matching indices"""
+    import numpy as np
+
+    matching = matching[np.asarray(cells["amounts"])[matching] > 0]
+    count = np.asarray(cells["amounts"])[matching]
+    total = np.asarray(cells["amount_sum"], dtype="float64")[matching]
+    n, amount_total = int(count.sum()), float(total.sum())
+    # Chan et al.: merged squared deviations of the cells around the overall mean
+    m2 = np.asarray(cells["amount_m2"])[matching].sum() + (count * (total / count - amount_total / n) ** 2).sum() \
+        if n else 0.0
+    return {
+        "count": n,
+        "total": amount_total,
+        "min": _number(np.asarray(cells["amount_min"])[matching].min()) if n else None,
+        "max": _number(np.asarray(cells["amount_max"])[matching].max()) if n else None,
+        "median": None,
+        "std": _number(math.sqrt(max(m2, 0.0) / (n - 1))) if n > 1 else None,
+    }
+
+
+def _approximate_profile(path: str, spark, timezone: Optional[str], rows: int, stats: Dict[str, Dict[str, Any]],
+                         edges_for: Callable, on_spark: bool) -> Dict[str, Any]:
+    """
+    Profile of a Parquet dataset in constant memory: a first pass builds the
+    sketches, a second the cube with each distribution limited to its heavy
+    hitters (and quantile bins from the sketched amounts). Totals, extremes
+    and the standard deviation stay exact (they are rolled up from the cube).
+    """
+    import numpy as np
+
+    def sketched_quantiles(fractions):
+        return [sketches.amount.quantile(fraction) for fraction in fractions]
+
+    if on_spark:
+        df = spark.read.parquet(path)
+        sketches = _spark_sketches(df)
+        edges = edges_for(sketched_quantiles)
+        profile = _spark_profile(spark, df, edges, sketches.kept())
+    else:
+        wanted = [ID_COLUMN, AMOUNT_COLUMN] + list(CATEGORY_COLUMNS.values())
+        sketches = DatasetSketches()
+        for df in _parquet_batches(path, [column for column in wanted if column in stats], timezone):
+            sketches.update(df)
+        edges = edges_for(sketched_quantiles)
+        wanted = [DATE_COLUMN, AMOUNT_COLUMN] + list(CATEGORY_COLUMNS.values())
+        cells = _streamed_cells(path, [column for column in wanted if column in stats], timezone, edges,
+                                sketches.kept())
+        values, encoded = _encode_cells(cells, set(stats))
+        profile = {"records": rows, "edges": edges, "values": values, "cells": encoded}
+
+    amount = None
+    if AMOUNT_COLUMN in stats:
+        amount = _amount_totals(profile["cells"], np.arange(len(profile["cells"]["records"])))
+        amount["median"] = sketches.amount.quantile(0.5)
+    profile.update({
+        "unique_ids": sketches.ids.estimate() if ID_COLUMN in stats else None,
+        "amount": amount,
+        "edges": edges if amount and amount["count"] else None,
+        "approximate": sketches.bounds(),
+        "sketches": sketches.to_dict(),
+    })
+    return profile
+
+
+def profile_dataset(path: str, spark=None, timezone: Optional[str] = None,
+                    spark_min_rows: int = SPARK_MIN_ROWS, approximate: Optional[bool] = None,
+                    bins: str = DEFAULT_BIN_STRATEGY) -> Dict[str, Any]:
+    """
+    Profile of a dataset (a Parquet file or directory, or a CSV file) that
+    the dashboard is built from. Parquet datasets of at least spark_min_rows
+    rows are aggregated on spark when a session is given. approximate
+    profiles (by default those of datasets of APPROXIMATE_MIN_ROWS rows or
+    more) estimate the distinct ids and the median with sketches and show
+    only the heavy hitters of each distribution; see DatasetSketches.bounds
+    for their error bounds. bins is the histogram's bin strategy (one of
+    BIN_STRATEGIES).
+    """
+    import pandas as pd
+
+    if bins not in BIN_STRATEGIES:
+        raise ValueError(f"Unknown bin strategy: {bins} (expected one of {', '.join(BIN_STRATEGIES)})")
+    if path.endswith(".csv"):
+        df = pd.read_csv(path)
+        profile = _pandas_profile(df, None, bins)
+        cells = df.size
+        profile["completeness"] = round(df.count().sum() / cells * 100, 2) if cells > 0 else 0
+        profile.update({"approximate": None, "bins": bins})
+        return profile
+
+    rows, stats = column_stats(path)
+    amount_range = _footer_range(stats, AMOUNT_COLUMN)
+
+    def edges_for(quantiles=None):
+        """Bin edges over the footer's amount range; quantile bins need quantiles"""
+        if amount_range is None or (bins == "quantile" and quantiles is None):
+            return None
+        return bin_edges(bins, *amount_range, quantiles)
+
+    on_spark = spark is not None and rows >= spark_min_rows
+    if approximate is None:
+        approximate = rows >= APPROXIMATE_MIN_ROWS
+    if approximate:
+        profile = _approximate_profile(path, spark, timezone, rows, stats, edges_for, on_spark)
+    elif on_spark:
+        df = spark.read.parquet(path)
+        profile = _spark_profile(spark, df, edges_for(lambda fractions: _spark_quantiles(df, fractions)))
+    else:
+        # Without an amount range (or for quantile bins) the edges come from the data
+        wanted = [ID_COLUMN, DATE_COLUMN, AMOUNT_COLUMN] + list(CATEGORY_COLUMNS.values())
+        profile = _pandas_profile(read_parquet_pandas(path, [column for column in wanted if column in stats],
+                                                      timezone=timezone), edges_for(), bins)
+    profile.setdefault("approximate", None)
+    profile["bins"] = bins
+    profile["completeness"] = _completeness(rows, stats)
+    return profile
+
+
+def _selected(codes, allowed):
+    """Cells whose code is one of the allowed ones (code -1, a missing value, never is)"""
+    import numpy as np
+    return np.append(allowed, False)[codes]
+
+
+def _cells_mask(profile: Dict[str, Any], cells: Dict[str, Any], flt: DashboardFilter):
+    import numpy as np
+
+    values = profile["values"]
+    mask = np.ones(len(cells["records"]), dtype=bool)
+    for name, selected in flt.selections.items():
+        if selected:
+            if values[name] is None:
+                return np.zeros_like(mask)
+            mask &= _selected(cells[name], np.isin(np.array(values[name], dtype=object), selected))
+    if flt.start_date or flt.end_date:
+        if values["day"] is None:
+            return np.zeros_like(mask)
+        days = np.array(values["day"], dtype=object)
+        allowed = np.ones(len(days), dtype=bool)
+        if flt.start_date:
+            allowed &= days >= flt.start_date
+        if flt.end_date:
+            allowed &= days <= flt.end_date
+        mask &= _selected(cells["day"], allowed)
+    if flt.min_amount is not None or flt.max_amount is not None:
+        if not profile["edges"]:
+            return np.zeros_like(mask)
+        edges = np.array(profile["edges"])
+        allowed = np.ones(len(edges) - 1, dtype=bool)
+        if flt.min_amount is not None:
+            allowed &= edges[1:] >= flt.min_amount
+        if flt.max_amount is not None:
+            allowed &= edges[:-1] <= flt.max_amount
+        mask &= _selected(cells["bin"], allowed)
+    return mask
+
+
+def _totals(codes, weights, size: int):
+    """Sum of weights per code 0..size-1 (code -1 is skipped)"""
+    import numpy as np
+    return np.bincount(codes + 1, weights=weights, minlength=size + 1)[1:]
+
+
+def _counts(codes, weights, values: List[str]) -> List:
+    return [(values[i], int(count)) for i, count in enumerate(_totals(codes, weights, len(values))) if count]
+
+
+def rollup(profile: Dict[str, Any], flt: Optional[DashboardFilter] = None) -> Dict[str, Any]:
+    """
+    The dashboard view of a profile, or of the rows matching flt: a sum over
+    the matching cube cells. Without a filter the exact global statistics are
+    used; with one the distinct id count, median and completeness, which do
+    not roll up, are None.
+    """
+    import numpy as np
+
+    cells = {name: np.asarray(column) for name, column in profile["cells"].items()}
+    values = profile["values"]
+    filtered = flt is not None and not flt.empty
+    mask = _cells_mask(profile, cells, flt) if filtered else None
+    # Row count of each cell that matches the filter, 0 for the others
+    records = np.where(mask, cells["records"], 0.0) if filtered else cells["records"].astype("float64")
+    view: Dict[str, Any] = {
+        "records": int(records.sum()),
+        "unique_ids": None if filtered else profile["unique_ids"] or 0,
+        "completeness": None if filtered else profile["completeness"],
+        "amount": None if filtered else profile["amount"],
+        "edges": profile["edges"],
+        "bins": profile.get("bins", DEFAULT_BIN_STRATEGY),
+        "histogram": None,
+        "categories": {},
+        "days": None,
+        "approximate": profile.get("approximate"),
+    }
+    for name in CATEGORY_COLUMNS:
+        if values[name] is not None:
+            view["categories"][name] = sorted(_counts(cells[name], records, values[name]),
+                                              key=lambda entry: (-entry[1], entry[0]))
+    if values["day"] is not None:
+        view["days"] = sorted(_counts(cells["day"], records, values["day"]))
+    if profile["edges"]:
+        view["histogram"] = _totals(cells["bin"], records, len(profile["edges"]) - 1).astype(int).tolist()
+
+    if filtered and profile["amount"] is not None:
+        view["amount"] = _amount_totals(cells, np.flatnonzero(mask))
+    return view
+
+
+def _histogram(view: Dict[str, Any]) -> List[Dict[str, Any]]:
+    edges = view["edges"]
+    if not view["histogram"]:
+        return []
+    return [
+        {
+            "range": f"${edges[i]:.0f}-${edges[i + 1]:.0f}",
+            "count": count,
+            "min_value": float(edges[i]),
+            "max_value": float(edges[i + 1]),
+        }
+        for i, count in enumerate(view["histogram"])
+    ]
+
+
+def _summary(view: Dict[str, Any]) -> Dict[str, Any]:
+    amount = view["amount"]
+    days = view["days"] or []
+    return {
+        "total_records": view["records"],
+        "total_amount": amount["total"] if amount else 0,
+        "avg_amount": amount["total"] / amount["count"] if amount and amount["count"] else 0,
+        "unique_transactions": view["unique_ids"],
+        "date_range": {
+            "start": days[0][0] if days else None,
+            "end": days[-1][0] if days else None,
+        },
+    }
+
+
+def _amount_stats(view: Dict[str, Any]) -> Dict[str, Any]:
+    amount = view["amount"]
+    if not amount:
+        return {"min": 0, "max": 0, "median": 0, "std": 0}
+    return {key: amount[key] for key in ("min", "max", "median", "std")}
+
+
+def dashboard_metrics(before: Dict[str, Any], after: Dict[str, Any],
+                      options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    The dashboard payload comparing views (see rollup) of the uploaded data
+    and of the output; the filter options come from options (default before)
+    """
+    options = options or before
+    original, final = before["records"], after["records"]
+    return {
+        "summary": {"before": _summary(before), "after": _summary(after)},
+        "distributions": {
+            name: {
+                "before": dict(before["categories"].get(name, [])),
+                "after": dict(after["categories"].get(name, [])),
+            }
+            for name in CATEGORY_COLUMNS
+        },
+        "amount_analysis": {
+            "before": {"histogram": _histogram(before), "stats": _amount_stats(before)},
+            "after": {"histogram": _histogram(after), "stats": _amount_stats(after)},
+        },
+        "time_series": {
+            "before": [{"date": day, "count": count} for day, count in before["days"] or []],
+            "after": [{"date": day, "count": count} for day, count in after["days"] or []],
+        },
+        "impact_metrics": {
+            "duplicate_reduction": {
+                "original_count": original,
+                "final_count": final,
+                "duplicates_removed": original - final,
+                "reduction_percentage": round((original - final) / original * 100, 2) if original > 0 else 0,
+            },
+            "data_quality": {
+                "completeness_before": before["completeness"],
+                "completeness_after": after["completeness"],
+                "accuracy_improvement": "Enhanced through deduplication",
+            },
+        },
+        "histogram_bins": before["bins"],
+        # Error bounds of approximate profiles (None for exact ones)
+        "approximation": {"before": before["approximate"], "after": after["approximate"]},
+        "filter_options": {
+            "transaction_types": [value for value, _ in options["categories"].get("transaction_type", [])],
+            "statuses": [value for value, _ in options["categories"].get("status", [])],
+            "channels": [value for value, _ in options["categories"].get("channel", [])],
+            "branches": [value for value, _ in options["categories"].get("branch", [])],
+            "amount_range": {
+                "min": _amount_stats(options)["min"],
+                "max": _amount_stats(options)["max"],
+            },
+        },
+    }
+
+
+def dashboard_payload(profiles: Dict[str, Dict[str, Any]], flt: Optional[DashboardFilter] = None) -> Dict[str, Any]:
+    """Dashboard payload of a run's before/after profiles, optionally filtered"""
+    before, after = rollup(profiles["before"], flt), rollup(profiles["after"], flt)
+    options = rollup(profiles["before"]) if flt is not None and not flt.empty else before
+    return dashboard_metrics(before, after, options)
+
+
+def _save_profiles(path: str, profiles: Dict[str, Dict[str, Any]]):
+    """Write profiles as one .npz file: the cube cells as arrays, everything else as JSON"""
+    import numpy as np
+
+    meta, arrays = {}, {}
+    for side, profile in profiles.items():
+        meta[side] = {key: value for key, value in profile.items() if key != "cells"}
+        for name, column in profile["cells"].items():
+            arrays[f"{side}.{name}"] = np.asarray(column, dtype=_CELL_TYPES.get(name, "float64"))
+    temp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+    with open(temp_path, "wb") as handle:
+        np.savez(handle, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(temp_path, path)
+
+
+def _load_profiles(path: str) -> Dict[str, Dict[str, Any]]:
+    import numpy as np
+
+    with np.load(path) as data:
+        profiles = json.loads(str(data["meta"]))
+        for side, profile in profiles.items():
+            # bincount takes intp codes
+            profile["cells"] = {name: data[f"{side}.{name}"].astype(np.intp) for name in DIMENSIONS}
+            profile["cells"].update({name: data[f"{side}.{name}"] for name in MEASURES})
+    return profiles
+
+
+# Per-artifact locks and how many requests hold or wait for each; a lock is
+# dropped once it is unused and its artifact is not loaded, so the map stays
+# bounded by MAX_CACHED_PROFILES plus the requests in flight
+_locks: Dict[str, threading.Lock] = {}
+_lock_users: Dict[str, int] = {}
+_locks_lock = threading.Lock()
+_loaded: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
+
+
+def _drop_unused_lock(artifact_path: str):
+    # Called with _locks_lock held
+    if not _lock_users.get(artifact_path) and artifact_path not in _loaded:
+        _locks.pop(artifact_path, None)
+
+
+def cached_profiles(artifact_path: str, compute: Callable[[], Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    The before/after profiles stored at artifact_path (.npz), computed (once,
+    even under concurrent requests) and written there when the file does not
+    exist yet. The most recently used ones stay loaded in memory.
+    """
+    with _locks_lock:
+        lock = _locks.setdefault(artifact_path, threading.Lock())
+        _lock_users[artifact_path] = _lock_users.get(artifact_path, 0) + 1
+    try:
+        with lock:
+            with _locks_lock:
+                if artifact_path in _loaded:
+                    if os.path.exists(artifact_path):
+                        _loaded.move_to_end(artifact_path)
+                        return _loaded[artifact_path]
+                    # The artifact was removed (e.g. with its workspace)
+                    del _loaded[artifact_path]
+            if not os.path.exists(artifact_path):
+                _save_profiles(artifact_path, compute())
+            profiles = _load_profiles(artifact_path)
+            with _locks_lock:
+                _loaded[artifact_path] = profiles
+                while len(_loaded) > MAX_CACHED_PROFILES:
+                    evicted, _ = _loaded.popitem(last=False)
+                    _drop_unused_lock(evicted)
+            return profiles
+    finally:
+        with _locks_lock:
+            _lock_users[artifact_path] -= 1
+            if not _lock_users[artifact_path]:
+                del _lock_users[artifact_path]
+            _drop_unused_lock(artifact_path)
@@ -0,0 +1,953 @@
+"""
+Informatica expression language -> native Spark Column expressions
+
+Port expressions (IIF, DECODE, LTRIM, TO_DATE, SUBSTR, ...) are parsed into a
+small AST, variable ports are inlined in evaluation order, constants are folded
+and subexpressions shared between ports are computed once. Everything is
+translated to Catalyst expressions; there is no row-at-a-time Python fallback,
+so an unsupported function is a compile error rather than a slow UDF.
+
+Row-level ERROR() calls and ERROR default values on input ports skip the row,
+as PowerCenter does, through a single filter predicate.
+"""
+
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pyspark.sql import Column, DataFrame
+from pyspark.sql import functions as F
+from pyspark.sql.types import DecimalType, DoubleType, IntegerType, LongType, StringType
+
+from mapping_compiler import Node, to_spark_datetime_format
+
+DEFAULT_DATE_FORMAT = "MM/DD/YYYY HH24:MI:SS"
+
+# Built-in variables that read like port names
+_BUILTIN_VARIABLES = {"SYSDATE", "SESSSTARTTIME"}
+
+_KEYWORDS = {"AND", "OR", "NOT", "TRUE", "FALSE", "NULL"}
+
+
+# ---------------------------------------------------------------------------
+# AST
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Literal:
+    value: Any
+    kind: str  # number, string, boolean, null
+
+
+@dataclass(frozen=True)
+class PortRef:
+    name: str
+
+
+@dataclass(frozen=True)
+class Call:
+    name: str
+    args: Tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class UnaryOp:
+    op: str
+    operand: Any
+
+
+@dataclass(frozen=True)
+class BinaryOp:
+    op: str
+    left: Any
+    right: Any
+
+
+NULL = Literal(None, "null")
+TRUE = Literal(True, "boolean")
+FALSE = Literal(False, "boolean")
+
+
+def children(node) -> Tuple:
+    if isinstance(node, Call):
+        return node.args
+    if isinstance(node, UnaryOp):
+        return (node.operand,)
+    if isinstance(node, BinaryOp):
+        return (node.left, node.right)
+    return ()
+
+
+def _rebuild(node, new_children: Tuple):
+    if isinstance(node, Call):
+        return Call(node.name, tuple(new_children))
+    if isinstance(node, UnaryOp):
+        return UnaryOp(node.op, new_children[0])
+    if isinstance(node, BinaryOp):
+        return BinaryOp(node.op, new_children[0], new_children[1])
+    return node
+
+
+def transform(node, rewrite: Callable):
+    """Bottom-up rewrite: rewrite(node) is applied after the children are rewritten"""
+    kids = children(node)
+    if kids:
+        node = _rebuild(node, tuple(transform(kid, rewrite) for kid in kids))
+    return rewrite(node)
+
+
+def walk(node):
+    yield node
+    for kid in children(node):
+        yield from walk(kid)
+
+
+def size(node) -> int:
+    return 1 + sum(size(kid) for kid in children(node))
+
+
+def refs(node) -> List[str]:
+    return [item.name for item in walk(node) if isinstance(item, PortRef)]
+
+
+# ---------------------------------------------------------------------------
+# Parser
+# ---------------------------------------------------------------------------
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+|--[^\n]*|//[^\n]*)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<name>[A-Za-z_$][A-Za-z0-9_$#@]*)
+  | (?P<op>\|\||<>|!=|\^=|<=|>=|[-+*/%=<>(),])
+""", re.VERBOSE)
+
+_COMPARISONS = {"=", "<>", "!=", "^=", "<", "<=", ">", ">="}
+
+
+def tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match:
+            raise ValueError(f"Unexpected character {text[position]!r} at {position} in expression: {text}")
+        position = match.end()
+        kind = match.lastgroup
+        if kind != "space":
+            tokens.append((kind, match.group()))
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent over Informatica operator precedence:
+    unary +/-, * / %, + -, ||, comparisons, NOT, AND, OR
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self) -> Tuple[str, str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else ("end", "")
+
+    def keyword(self) -> str:
+        kind, value = self.peek()
+        return value.upper() if kind == "name" else value
+
+    def take(self) -> Tuple[str, str]:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expect(self, value: str):
+        kind, token = self.take()
+        if token != value:
+            raise ValueError(f"Expected '{value}' but found '{token or 'end of expression'}' in: {self.text}")
+
+    def parse(self):
+        node = self.or_expression()
+        if self.peek()[0] != "end":
+            raise ValueError(f"Unexpected '{self.peek()[1]}' in expression: {self.text}")
+        return node
+
+    def or_expression(self):
+        node = self.and_expression()
+        while self.keyword() == "OR":
+            self.take()
+            node = BinaryOp("OR", node, self.and_expression())
+        return node
+
+    def and_expression(self):
+        node = self.not_expression()
+        while self.keyword() == "AND":
+            self.take()
+            node = BinaryOp("AND", node, self.not_expression())
+        return node
+
+    def not_expression(self):
+        if self.keyword() == "NOT":
+            self.take()
+            return UnaryOp("NOT", self.not_expression())
+        return self.comparison()
+
+    def comparison(self):
+        node = self.concatenation()
+        while self.peek()[0] == "op" and self.peek()[1] in _COMPARISONS:
+            op = self.take()[1]
+            node = BinaryOp("<>" if op in ("!=", "^=") else op, node, self.concatenation())
+        return node
+
+    def concatenation(self):
+        node = self.additive()
+        while self.peek() == ("op", "||"):
+            self.take()
+            node = BinaryOp("||", node, self.additive())
+        return node
+
+    def additive(self):
+        node = self.term()
+        while self.peek()[0] == "op" and self.peek()[1] in ("+", "-"):
+            node = BinaryOp(self.take()[1], node, self.term())
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.peek()[0] == "op" and self.peek()[1] in ("*", "/", "%"):
+            node = BinaryOp(self.take()[1], node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek()[0] == "op" and self.peek()[1] in ("+", "-"):
+            op = self.take()[1]
+            return UnaryOp(op, self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == "number":
+            if re.fullmatch(r"\d+", value):
+                return Literal(int(value), "number")
+            return Literal(Decimal(value), "number")
+        if kind == "string":
+            return Literal(value[1:-1].replace("''", "'"), "string")
+        if kind == "op" and value == "(":
+            node = self.or_expression()
+            self.expect(")")
+            return node
+        if kind == "name":
+            upper = value.upper()
+            if upper == "TRUE":
+                return TRUE
+            if upper == "FALSE":
+                return FALSE
+            if upper == "NULL":
+                return NULL
+            if upper in _KEYWORDS:
+                raise ValueError(f"Unexpected '{value}' in expression: {self.text}")
+            if self.peek() == ("op", "("):
+                self.take()
+                args = []
+                if self.peek() != ("op", ")"):
+                    args.append(self.or_expression())
+                    while self.peek() == ("op", ","):
+                        self.take()
+                        args.append(self.or_expression())
+                self.expect(")")
+                return Call(upper, tuple(args))
+            return PortRef(value)
+        raise ValueError(f"Unexpected '{value or 'end of expression'}' in expression: {self.text}")
+
+
+_PARAMETER = re.compile(r"\$\$[A-Za-z0-9_]+")
+
+
+def parse_expression(text: str, parameters: Optional[Dict[str, str]] = None):
+    """
+    Parse an Informatica expression into an AST. Mapping parameters and
+    variables ($$Name) are substituted textually first, as PowerCenter does.
+    """
+    parameters = parameters or {}
+
+    def substitute(match):
+        name = match.group()
+        for key in (name, name[2:]):
+            if key in parameters:
+                return str(parameters[key])
+        raise ValueError(f"No value given for mapping parameter {name}")
+
+    return _Parser(_PARAMETER.sub(substitute, text)).parse()
+
+
+# ---------------------------------------------------------------------------
+# Constant folding
+# ---------------------------------------------------------------------------
+
+def _number(value):
+    return Decimal(value) if not isinstance(value, (int, Decimal)) else value
+
+
+def _truncated_mod(a, b):
+    # Spark's % and MOD take the sign of the dividend (-7 % 3 = -1); Python's int % floors
+    result = Decimal(a) % Decimal(b)
+    return int(result) if isinstance(a, int) and isinstance(b, int) else result
+
+
+_ARITHMETIC = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: Decimal(a) / Decimal(b),
+    "%": _truncated_mod,
+}
+
+_COMPARE = {
+    "=": lambda a, b: a == b,
+    "<>": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+_STRING_FOLDS = {
+    "UPPER": str.upper,
+    "LOWER": str.lower,
+    "LTRIM": lambda text: text.lstrip(" "),
+    "RTRIM": lambda text: text.rstrip(" "),
+}
+
+
+def _fold_node(node):
+    if isinstance(node, UnaryOp) and isinstance(node.operand, Literal):
+        operand = node.operand
+        if operand.kind == "null":
+            return NULL
+        if node.op == "-" and operand.kind == "number":
+            return Literal(-operand.value, "number")
+        if node.op == "+" and operand.kind == "number":
+            return operand
+        if node.op == "NOT" and operand.kind == "boolean":
+            return Literal(not operand.value, "boolean")
+        return node
+
+    if isinstance(node, BinaryOp):
+        left, right = node.left, node.right
+        if node.op == "AND":
+            for this, other in ((left, right), (right, left)):
+                if this == FALSE:
+                    return FALSE
+                if this == TRUE:
+                    return other
+            return node
+        if node.op == "OR":
+            for this, other in ((left, right), (right, left)):
+                if this == TRUE:
+                    return TRUE
+                if this == FALSE:
+                    return other
+            return node
+        if not (isinstance(left, Literal) and isinstance(right, Literal)):
+            return node
+        if node.op == "||":
+            if left.kind == "null" and right.kind == "null":
+                return NULL
+            return Literal(_text(left) + _text(right), "string")
+        if left.kind == "null" or right.kind == "null":
+            return NULL
+        if node.op in _ARITHMETIC and left.kind == right.kind == "number":
+            if node.op in ("/", "%") and right.value == 0:
+                return node  # Leave the runtime semantics to Spark
+            try:
+                return Literal(_ARITHMETIC[node.op](left.value, right.value), "number")
+            except (ArithmeticError, InvalidOperation):
+                return node
+        if node.op in _COMPARE and left.kind == right.kind:
+            return Literal(_COMPARE[node.op](left.value, right.value), "boolean")
+        return node
+
+    if isinstance(node, Call):
+        args = node.args
+        if node.name == "IIF" and args and isinstance(args[0], Literal):
+            if args[0].value and args[0].kind != "null":
+                return args[1]
+            return args[2] if len(args) > 2 else NULL
+        if node.name == "DECODE" and args and all(isinstance(arg, Literal) for arg in args[:1] + args[1:-1:2]):
+            value = args[0]
+            pairs = args[1:]
+            for index in range(0, len(pairs) - 1, 2):
+                if pairs[index] == value or (pairs[index].kind == value.kind == "null"):
+                    return pairs[index + 1]
+            return pairs[-1] if len(pairs) % 2 == 1 else NULL
+        if node.name in ("ISNULL",) and len(args) == 1 and isinstance(args[0], Literal):
+            return Literal(args[0].kind == "null", "boolean")
+        if node.name in _STRING_FOLDS and len(args) == 1 and isinstance(args[0], Literal):
+            if args[0].kind == "null":
+                return NULL
+            if args[0].kind == "string":
+                return Literal(_STRING_FOLDS[node.name](args[0].value), "string")
+        if node.name == "LENGTH" and len(args) == 1 and isinstance(args[0], Literal) and args[0].kind == "string":
+            return Literal(len(args[0].value), "number")
+        if node.name == "CONCAT" and len(args) == 2 and all(isinstance(arg, Literal) for arg in args):
+            return _fold_node(BinaryOp("||", args[0], args[1]))
+    return node
+
+
+def _text(literal: Literal) -> str:
+    if literal.kind == "null":
+        return ""
+    if literal.kind == "boolean":
+        return "1" if literal.value else "0"
+    return str(literal.value)
+
+
+def fold_constants(node):
+    """Evaluate operators and pure functions whose operands are all literals"""
+    return transform(node, _fold_node)
+
+
+# ---------------------------------------------------------------------------
+# Row errors
+# ---------------------------------------------------------------------------
+
+def error_condition(node):
+    """
+    Boolean AST that is TRUE for rows on which evaluating node reaches an
+    ERROR() call, or None when it never can. Conditional branches only count
+    when taken.
+    """
+    if isinstance(node, Call) and node.name == "ERROR":
+        return TRUE
+    if isinstance(node, Call) and node.name == "IIF":
+        condition = error_condition(node.args[0])
+        then_error = error_condition(node.args[1])
+        else_error = error_condition(node.args[2]) if len(node.args) > 2 else None
+        branch = None
+        if then_error is not None or else_error is not None:
+            branch = Call("IIF", (node.args[0], then_error or FALSE, else_error or FALSE))
+        return _any_of([condition, branch])
+    if isinstance(node, Call) and node.name == "DECODE":
+        value, pairs = node.args[0], node.args[1:]
+        results = [pairs[index] for index in range(1, len(pairs), 2)]
+        default = pairs[-1] if len(pairs) % 2 == 1 else None
+        result_errors = [error_condition(result) for result in results]
+        default_error = error_condition(default) if default is not None else None
+        branch = None
+        if any(result_errors) or default_error is not None:
+            branch_args = [value]
+            for index in range(0, len(pairs) - 1, 2):
+                branch_args += [pairs[index], result_errors[index // 2] or FALSE]
+            branch_args.append(default_error or FALSE)
+            branch = Call("DECODE", tuple(branch_args))
+        search_errors = [error_condition(pairs[index]) for index in range(0, len(pairs) - 1, 2)]
+        return _any_of([error_condition(value), branch] + search_errors)
+    return _any_of([error_condition(kid) for kid in children(node)])
+
+
+def _any_of(conditions):
+    conditions = [condition for condition in conditions if condition is not None]
+    if not conditions:
+        return None
+    result = conditions[0]
+    for condition in conditions[1:]:
+        result = BinaryOp("OR", result, condition)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Expression programs: all ports of one transformation
+# ---------------------------------------------------------------------------
+
+@dataclass
+class ExpressionProgram:
+    """
+    Compiled expressions of one Expression transformation.
+
+    common holds subexpressions shared between ports as (hidden column, AST),
+    in dependency order; outputs and error reference them by name.
+    """
+    outputs: Dict[str, Any]
+    common: List[Tuple[str, Any]] = field(default_factory=list)
+    error: Any = None
+    common_levels: Dict[str, int] = field(default_factory=dict)
+    input_defaults: Dict[str, Any] = field(default_factory=dict)
+    abort_on_null: Dict[str, str] = field(default_factory=dict)
+
+
+def _is_variable(porttype: str) -> bool:
+    return "VARIABLE" in porttype.upper()
+
+
+def _default_action(default_value: str, parameters) -> Tuple[str, Any]:
+    """('error' | 'abort' | 'value', payload) for a non-empty DEFAULTVALUE"""
+    node = parse_expression(default_value, parameters)
+    if isinstance(node, Call) and node.name == "ERROR":
+        return "error", None
+    if isinstance(node, Call) and node.name == "ABORT":
+        message = node.args[0].value if node.args and isinstance(node.args[0], Literal) else "ABORT"
+        return "abort", message
+    return "value", fold_constants(node)
+
+
+def compile_expressions(node: Node, parameters: Optional[Dict[str, str]] = None,
+                        eliminate_common: bool = True) -> ExpressionProgram:
+    """
+    Parse and optimize every output port of an Expression transformation.
+
+    Ports are evaluated as PowerCenter does: input ports, then variable ports
+    in display order, then output ports. A variable can read input ports and
+    the variables above it; a reference to itself or a later variable would
+    read the previous row's value, which has no row-independent translation
+    and is rejected.
+    """
+    canonical = {}
+    inputs = set()
+    for port in node.ports:
+        if port.is_input:
+            canonical[port.name.upper()] = port.name
+            inputs.add(port.name)
+
+    input_defaults = {}
+    abort_on_null = {}
+    null_errors = []
+    for port in node.ports:
+        if not port.is_input or not port.default_value:
+            continue
+        action, payload = _default_action(port.default_value, parameters)
+        if action == "error":
+            null_errors.append(Call("ISNULL", (PortRef(port.name),)))
+        elif action == "abort":
+            abort_on_null[port.name] = payload
+        elif payload != NULL:
+            input_defaults[port.name] = payload
+
+    def resolve(expression: str, owner: str, variables: Dict[str, Any], pending: set):
+        def rewrite(item):
+            if not isinstance(item, PortRef):
+                return item
+            key = item.name.upper()
+            if key in variables:
+                return variables[key]
+            if key in pending:
+                raise ValueError(
+                    f"Port {node.name}.{owner} reads variable '{item.name}' before it is evaluated "
+                    "(previous-row values are not supported)"
+                )
+            if key in canonical:
+                return PortRef(canonical[key])
+            if key in _BUILTIN_VARIABLES:
+                return PortRef(key)
+            raise ValueError(f"Expression of port {node.name}.{owner} references unknown port '{item.name}'")
+        return fold_constants(transform(parse_expression(expression, parameters), rewrite))
+
+    variable_ports = [port for port in node.ports if _is_variable(port.porttype)]
+    pending = {port.name.upper() for port in variable_ports}
+    variables: Dict[str, Any] = {}
+    for port in variable_ports:
+        pending.discard(port.name.upper())
+        variables[port.name.upper()] = resolve(port.expression or "NULL", port.name, variables, pending | {port.name.upper()})
+
+    outputs = {}
+    for port in node.output_ports:
+        if port.is_input:
+            outputs[port.name] = PortRef(port.name)
+            continue
+        if not port.expression:
+            raise ValueError(f"Output port {node.name}.{port.name} has no expression")
+        outputs[port.name] = resolve(port.expression, port.name, variables, set())
+
+    error = _any_of(null_errors + [error_condition(ast) for ast in outputs.values()])
+    if error is not None:
+        error = fold_constants(error)
+    outputs = {name: transform(ast, _strip_errors) for name, ast in outputs.items()}
+
+    program = ExpressionProgram(outputs=outputs, error=error,
+                                input_defaults=input_defaults, abort_on_null=abort_on_null)
+    if eliminate_common:
+        eliminate_common_subexpressions(program)
+    return program
+
+
+def _strip_errors(node):
+    # ERROR() rows are filtered out, so the value computed for them is irrelevant
+    if isinstance(node, Call) and node.name == "ERROR":
+        return NULL
+    return node
+
+
+# ---------------------------------------------------------------------------
+# Common subexpression elimination
+# ---------------------------------------------------------------------------
+
+_VOLATILE = {"ERROR", "ABORT"}
+
+
+def _extractable(node) -> bool:
+    if isinstance(node, (Literal, PortRef)) or size(node) < 3:
+        return False
+    return not any(isinstance(item, Call) and item.name in _VOLATILE for item in walk(node))
+
+
+def eliminate_common_subexpressions(program: ExpressionProgram, prefix: str = "__cse") -> ExpressionProgram:
+    """
+    Hoist subexpressions that occur more than once across all ports (and the
+    error predicate) into hidden columns, largest first, so each is evaluated
+    once per row.
+    """
+    bodies: Dict[str, Any] = {}
+
+    def roots():
+        yield from program.outputs.values()
+        if program.error is not None:
+            yield program.error
+        yield from bodies.values()
+
+    while True:
+        counts = Counter()
+        for root in roots():
+            for item in walk(root):
+                if not isinstance(item, (Literal, PortRef)):
+                    counts[item] += 1
+        candidates = [item for item, count in counts.items() if count > 1 and _extractable(item)]
+        if not candidates:
+            break
+        chosen = max(candidates, key=size)
+        name = f"{prefix}{len(bodies)}"
+        reference = PortRef(name)
+
+        def replace(item, chosen=chosen, reference=reference):
+            return reference if item == chosen else item
+
+        program.outputs = {port: transform(ast, replace) for port, ast in program.outputs.items()}
+        if program.error is not None:
+            program.error = transform(program.error, replace)
+        bodies = {hidden: transform(body, replace) for hidden, body in bodies.items()}
+        bodies[name] = chosen
+
+    # Order hidden columns so each one only reads columns computed before it
+    levels: Dict[str, int] = {}
+
+    def level(hidden: str) -> int:
+        if hidden not in levels:
+            levels[hidden] = 1 + max([level(ref) for ref in refs(bodies[hidden]) if ref in bodies], default=-1)
+        return levels[hidden]
+
+    program.common = sorted(bodies.items(), key=lambda item: (level(item[0]), item[0]))
+    program.common_levels = {hidden: level(hidden) for hidden in bodies}
+    return program
+
+
+# ---------------------------------------------------------------------------
+# Translation to Spark
+# ---------------------------------------------------------------------------
+
+def _literal_arg(node, function: str, position: int):
+    if not isinstance(node, Literal):
+        raise ValueError(f"Argument {position} of {function} must be a constant")
+    return node.value
+
+
+def _datetime_pattern(node, function: str, position: int) -> str:
+    return to_spark_datetime_format(_literal_arg(node, function, position))
+
+
+def _char_class(characters: str) -> str:
+    return "[" + "".join("\\" + char if char in "\\[]^-&" else char for char in characters) + "]"
+
+
+def _concat(left: Column, right: Column) -> Column:
+    # NULL operands are treated as empty strings unless both are NULL
+    return F.when(left.isNull() & right.isNull(), F.lit(None).cast(StringType())) \
+        .otherwise(F.concat_ws("", left, right))
+
+
+_DATE_UNITS_MICROS = {
+    "DD": 86_400_000_000, "DDD": 86_400_000_000, "DY": 86_400_000_000, "DAY": 86_400_000_000,
+    "HH": 3_600_000_000, "HH12": 3_600_000_000, "HH24": 3_600_000_000,
+    "MI": 60_000_000, "SS": 1_000_000, "MS": 1_000, "US": 1,
+}
+_DATE_UNITS_MONTHS = {"MM": 1, "MON": 1, "MONTH": 1, "Y": 12, "YY": 12, "YYY": 12, "YYYY": 12}
+_DATE_PARTS = {
+    "YYYY": F.year, "YYY": F.year, "YY": F.year, "Y": F.year,
+    "MM": F.month, "MON": F.month, "MONTH": F.month,
+    # D, DD, DDD, DY and DAY all mean the day of the month
+    "D": F.dayofmonth, "DD": F.dayofmonth, "DDD": F.dayofmonth, "DY": F.dayofmonth, "DAY": F.dayofmonth,
+    "HH": F.hour, "HH12": F.hour, "HH24": F.hour, "MI": F.minute, "SS": F.second,
+}
+_TRUNC_UNITS = {
+    "YYYY": "year", "YYY": "year", "YY": "year", "Y": "year", "MM": "month", "MON": "month", "MONTH": "month",
+    "DD": "day", "DDD": "day", "DY": "day", "DAY": "day", "HH": "hour", "HH12": "hour", "HH24": "hour",
+    "MI": "minute", "SS": "second",
+}
+
+
+def _date_unit(node, function: str) -> str:
+    unit = str(_literal_arg(node, function, 2)).upper()
+    if unit not in _DATE_UNITS_MICROS and unit not in _DATE_UNITS_MONTHS:
+        raise ValueError(f"Unsupported date format '{unit}' in {function}")
+    return unit
+
+
+def _add_to_date(date: Column, unit: str, amount: Column) -> Column:
+    if unit in _DATE_UNITS_MICROS:
+        return F.timestamp_micros(F.unix_micros(date) + amount.cast(LongType()) * F.lit(_DATE_UNITS_MICROS[unit]))
+    # Month arithmetic keeps the time of day
+    months = (amount * F.lit(_DATE_UNITS_MONTHS[unit])).cast(IntegerType())
+    time_of_day = F.unix_micros(date) - F.unix_micros(F.to_date(date).cast("timestamp"))
+    return F.timestamp_micros(F.unix_micros(F.add_months(date, months).cast("timestamp")) + time_of_day)
+
+
+def _date_diff(first: Column, second: Column, unit: str) -> Column:
+    if unit in _DATE_UNITS_MICROS:
+        return (F.unix_micros(first) - F.unix_micros(second)) / F.lit(_DATE_UNITS_MICROS[unit])
+    return F.months_between(first, second, roundOff=False) / F.lit(_DATE_UNITS_MONTHS[unit])
+
+
+def _decode(args, translate) -> Column:
+    value = translate(args[0])
+    pairs = args[1:]
+    result = None
+    for index in range(0, len(pairs) - 1, 2):
+        condition = value.eqNullSafe(translate(pairs[index]))
+        branch = translate(pairs[index + 1])
+        result = F.when(condition, branch) if result is None else result.when(condition, branch)
+    default = translate(pairs[-1]) if len(pairs) % 2 == 1 else F.lit(None)
+    return default if result is None else result.otherwise(default)
+
+
+def _replace_chr(args, translate) -> Column:
+    case_sensitive = _literal_arg(args[0], "REPLACECHR", 1) not in (0, False, None)
+    old = _literal_arg(args[2], "REPLACECHR", 3) or ""
+    new = (_literal_arg(args[3], "REPLACECHR", 4) or "")[:1]
+    if not case_sensitive:
+        old = "".join(dict.fromkeys(old.lower() + old.upper()))
+    return F.translate(translate(args[1]), old, new * len(old))
+
+
+def _replace_str(args, translate) -> Column:
+    case_sensitive = _literal_arg(args[0], "REPLACESTR", 1) not in (0, False, None)
+    olds = [_literal_arg(arg, "REPLACESTR", index + 3) for index, arg in enumerate(args[2:-1])]
+    new = _literal_arg(args[-1], "REPLACESTR", len(args)) or ""
+    pattern = "|".join(re.escape(old) for old in olds if old)
+    if not pattern:
+        return translate(args[1])
+    pattern = f"(?:{pattern})" if case_sensitive else f"(?i)(?:{pattern})"
+    return F.regexp_replace(translate(args[1]), pattern, new.replace("\\", "\\\\").replace("$", "\\$"))
+
+
+def _trim(args, translate, side: str) -> Column:
+    value = translate(args[0])
+    if len(args) == 1:
+        return F.ltrim(value) if side == "left" else F.rtrim(value)
+    characters = _literal_arg(args[1], f"{side[0].upper()}TRIM", 2)
+    if not characters:
+        return value
+    pattern = f"^{_char_class(characters)}+" if side == "left" else f"{_char_class(characters)}+$"
+    return F.regexp_replace(value, pattern, "")
+
+
+def _truncate(args, translate) -> Column:
+    value = translate(args[0])
+    if len(args) > 1 and isinstance(args[1], Literal) and args[1].kind == "string":
+        unit = args[1].value.upper()
+        if unit not in _TRUNC_UNITS:
+            raise ValueError(f"Unsupported date format '{unit}' in TRUNC")
+        return F.date_trunc(_TRUNC_UNITS[unit], value)
+    digits = _literal_arg(args[1], "TRUNC", 2) if len(args) > 1 else 0
+    scale = F.lit(10 ** int(digits))
+    return F.signum(value) * F.floor(F.abs(value) * scale) / scale
+
+
+def _to_integer(args, translate, datatype) -> Column:
+    value = translate(args[0])
+    # Rounds unless the flag is TRUE or nonzero
+    truncate = len(args) > 1 and _literal_arg(args[1], "TO_INTEGER", 2) not in (0, False)
+    return (value if truncate else F.round(value.cast(DoubleType()))).cast(datatype)
+
+
+def _instr(args, translate) -> Column:
+    search = _literal_arg(args[1], "INSTR", 2)
+    start = int(_literal_arg(args[2], "INSTR", 3)) if len(args) > 2 else 1
+    if len(args) > 3 and _literal_arg(args[3], "INSTR", 4) != 1:
+        raise ValueError("INSTR only supports the first occurrence")
+    if start < 1:
+        raise ValueError("INSTR only supports positive start positions")
+    return F.locate(search, translate(args[0]), start)
+
+
+_NUMBER_PATTERN = r"^\s*[+-]?(\d+\.?\d*|\.\d+)([eEdD][+-]?\d+)?\s*$"
+
+# name -> (minimum args, maximum args, translate(args, translate) -> Column)
+_FUNCTIONS: Dict[str, Tuple[int, Optional[int], Callable]] = {
+    "IIF": (2, 3, lambda a, t: F.when(t(a[0]), t(a[1])).otherwise(t(a[2]) if len(a) > 2 else F.lit(None))),
+    "DECODE": (3, None, _decode),
+    "IN": (2, None, lambda a, t: t(a[0]).isin(*[t(arg) for arg in a[1:]])),
+    "CHOOSE": (2, None, lambda a, t: _decode((a[0],) + tuple(
+        item for index, arg in enumerate(a[1:], start=1) for item in (Literal(index, "number"), arg)), t)),
+    "GREATEST": (1, None, lambda a, t: F.greatest(*[t(arg) for arg in a]) if len(a) > 1 else t(a[0])),
+    "LEAST": (1, None, lambda a, t: F.least(*[t(arg) for arg in a]) if len(a) > 1 else t(a[0])),
+    "ISNULL": (1, 1, lambda a, t: t(a[0]).isNull()),
+    "IS_SPACES": (1, 1, lambda a, t: t(a[0]).rlike(r"^\s+$")),
+    "IS_NUMBER": (1, 1, lambda a, t: t(a[0]).rlike(_NUMBER_PATTERN)),
+    "IS_DATE": (1, 2, lambda a, t: F.when(t(a[0]).isNull(), F.lit(None)).otherwise(F.to_timestamp(
+        t(a[0]), _datetime_pattern(a[1], "IS_DATE", 2) if len(a) > 1 else to_spark_datetime_format(DEFAULT_DATE_FORMAT)
+    ).isNotNull())),
+    "ERROR": (0, 1, lambda a, t: F.lit(None)),
+    "ABORT": (1, 1, lambda a, t: F.raise_error(F.lit(_literal_arg(a[0], "ABORT", 1)))),
+    # Strings
+    "LTRIM": (1, 2, lambda a, t: _trim(a, t, "left")),
+    "RTRIM": (1, 2, lambda a, t: _trim(a, t, "right")),
+    "UPPER": (1, 1, lambda a, t: F.upper(t(a[0]))),
+    "LOWER": (1, 1, lambda a, t: F.lower(t(a[0]))),
+    "INITCAP": (1, 1, lambda a, t: F.initcap(t(a[0]))),
+    "LENGTH": (1, 1, lambda a, t: F.length(t(a[0]))),
+    "REVERSE": (1, 1, lambda a, t: F.reverse(t(a[0]))),
+    "CONCAT": (2, 2, lambda a, t: _concat(t(a[0]), t(a[1]))),
+    "SUBSTR": (2, 3, lambda a, t: t(a[0]).substr(
+        t(a[1]).cast(IntegerType()),
+        (t(a[2]) if len(a) > 2 else F.length(t(a[0]))).cast(IntegerType()))),
+    "INSTR": (2, 4, _instr),
+    "LPAD": (2, 3, lambda a, t: F.lpad(t(a[0]), int(_literal_arg(a[1], "LPAD", 2)),
+                                        _literal_arg(a[2], "LPAD", 3) if len(a) > 2 else " ")),
+    "RPAD": (2, 3, lambda a, t: F.rpad(t(a[0]), int(_literal_arg(a[1], "RPAD", 2)),
+                                        _literal_arg(a[2], "RPAD", 3) if len(a) > 2 else " ")),
+    "REPLACECHR": (4, 4, _replace_chr),
+    "REPLACESTR": (4, None, _replace_str),
+    "REG_MATCH": (2, 2, lambda a, t: t(a[0]).rlike(f"^(?:{_literal_arg(a[1], 'REG_MATCH', 2)})$")),
+    "REG_REPLACE": (3, 3, lambda a, t: F.regexp_replace(t(a[0]), _literal_arg(a[1], "REG_REPLACE", 2),
+                                                         _literal_arg(a[2], "REG_REPLACE", 3))),
+    "REG_EXTRACT": (2, 3, lambda a, t: F.when(
+        t(a[0]).rlike(_literal_arg(a[1], "REG_EXTRACT", 2)),
+        F.regexp_extract(t(a[0]), _literal_arg(a[1], "REG_EXTRACT", 2),
+                         int(_literal_arg(a[2], "REG_EXTRACT", 3)) if len(a) > 2 else 1))),
+    # Conversion
+    "TO_DATE": (1, 2, lambda a, t: F.to_timestamp(
+        t(a[0]), _datetime_pattern(a[1], "TO_DATE", 2) if len(a) > 1 else to_spark_datetime_format(DEFAULT_DATE_FORMAT))),
+    "TO_CHAR": (1, 2, lambda a, t: F.date_format(t(a[0]), _datetime_pattern(a[1], "TO_CHAR", 2))
+                if len(a) > 1 else t(a[0]).cast(StringType())),
+    "TO_INTEGER": (1, 2, lambda a, t: _to_integer(a, t, IntegerType())),
+    "TO_BIGINT": (1, 2, lambda a, t: _to_integer(a, t, LongType())),
+    "TO_DECIMAL": (1, 2, lambda a, t: t(a[0]).cast(
+        DecimalType(38, int(_literal_arg(a[1], "TO_DECIMAL", 2)) if len(a) > 1 else 18))),
+    "TO_FLOAT": (1, 1, lambda a, t: t(a[0]).cast(DoubleType())),
+    # Numbers
+    "ABS": (1, 1, lambda a, t: F.abs(t(a[0]))),
+    "CEIL": (1, 1, lambda a, t: F.ceil(t(a[0]))),
+    "FLOOR": (1, 1, lambda a, t: F.floor(t(a[0]))),
+    "ROUND": (1, 2, lambda a, t: F.round(t(a[0]), int(_literal_arg(a[1], "ROUND", 2)) if len(a) > 1 else 0)),
+    "TRUNC": (1, 2, _truncate),
+    "MOD": (2, 2, lambda a, t: t(a[0]) % t(a[1])),
+    "POWER": (2, 2, lambda a, t: F.pow(t(a[0]), t(a[1]))),
+    "SQRT": (1, 1, lambda a, t: F.sqrt(t(a[0]))),
+    "EXP": (1, 1, lambda a, t: F.exp(t(a[0]))),
+    "LN": (1, 1, lambda a, t: F.log(t(a[0]))),
+    "SIGN": (1, 1, lambda a, t: F.signum(t(a[0]))),
+    # Dates
+    "SYSTIMESTAMP": (0, 1, lambda a, t: F.current_timestamp()),
+    "ADD_TO_DATE": (3, 3, lambda a, t: _add_to_date(t(a[0]), _date_unit(a[1], "ADD_TO_DATE"), t(a[2]))),
+    "DATE_DIFF": (3, 3, lambda a, t: _date_diff(t(a[0]), t(a[1]), _date_unit(a[2], "DATE_DIFF"))),
+    "GET_DATE_PART": (2, 2, lambda a, t: _date_part(t(a[0]), a[1])),
+    "LAST_DAY": (1, 1, lambda a, t: F.last_day(t(a[0])).cast("timestamp")),
+}
+
+
+def _date_part(value: Column, unit_node) -> Column:
+    unit = str(_literal_arg(unit_node, "GET_DATE_PART", 2)).upper()
+    if unit not in _DATE_PARTS:
+        raise ValueError(f"Unsupported date format '{unit}' in GET_DATE_PART")
+    return _DATE_PARTS[unit](value)
+
+
+_BINARY = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a / b,
+    "%": lambda a, b: a % b,
+    "||": _concat,
+    "=": lambda a, b: a == b,
+    "<>": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "AND": lambda a, b: a & b,
+    "OR": lambda a, b: a | b,
+}
+
+
+def check_functions(node):
+    """Raise for functions without a native translation or with a wrong arity"""
+    for item in walk(node):
+        if not isinstance(item, Call):
+            continue
+        if item.name not in _FUNCTIONS:
+            raise ValueError(f"Function {item.name}() has no native Spark translation")
+        minimum, maximum, _ = _FUNCTIONS[item.name]
+        if len(item.args) < minimum or (maximum is not None and len(item.args) > maximum):
+            raise ValueError(f"Wrong number of arguments for {item.name}(): {len(item.args)}")
+
+
+def to_column(node) -> Column:
+    """Translate an AST into a Catalyst Column expression"""
+    if isinstance(node, Literal):
+        return F.lit(node.value)
+    if isinstance(node, PortRef):
+        if node.name in _BUILTIN_VARIABLES:
+            return F.current_timestamp()
+        return F.col(node.name)
+    if isinstance(node, UnaryOp):
+        operand = to_column(node.operand)
+        if node.op == "NOT":
+            return ~operand
+        return -operand if node.op == "-" else operand
+    if isinstance(node, BinaryOp):
+        return _BINARY[node.op](to_column(node.left), to_column(node.right))
+    if isinstance(node, Call):
+        if node.name not in _FUNCTIONS:
+            raise ValueError(f"Function {node.name}() has no native Spark translation")
+        return _FUNCTIONS[node.name][2](node.args, to_column)
+    raise ValueError(f"Cannot translate {node!r}")
+
+
+def translate_expression(text: str, parameters: Optional[Dict[str, str]] = None) -> Column:
+    """Translate a single standalone expression (no variable ports)"""
+    node = fold_constants(parse_expression(text, parameters))
+    check_functions(node)
+    return to_column(node)
+
+
+def apply_program(df: DataFrame, program: ExpressionProgram) -> Tuple[DataFrame, Dict[str, Column]]:
+    """
+    Apply input defaults, hidden common-subexpression columns and the row-error
+    filter; returns the prepared DataFrame and one Column per output port.
+    The caller selects the output Columns (one projection for all ports).
+    """
+    for ast in list(program.outputs.values()) + [body for _, body in program.common] + [program.error]:
+        if ast is not None:
+            check_functions(ast)
+
+    if program.input_defaults or program.abort_on_null:
+        projection = []
+        for name in df.columns:
+            column = F.col(name)
+            if name in program.input_defaults:
+                column = F.coalesce(column, to_column(program.input_defaults[name]))
+            elif name in program.abort_on_null:
+                column = F.when(column.isNull(), F.raise_error(F.lit(program.abort_on_null[name]))).otherwise(column)
+            projection.append(column.alias(name))
+        df = df.select(*projection)
+
+    levels = program.common_levels
+    for level in sorted(set(levels.values())):
+        hidden = [to_column(body).alias(name) for name, body in program.common if levels[name] == level]
+        df = df.select("*", *hidden)
+
+    if program.error is not None:
+        df = df.filter(~F.coalesce(to_column(program.error), F.lit(False)))
+
+    return df, {name: to_column(ast) for name, ast in program.outputs.items()}
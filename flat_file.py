@@ -0,0 +1,393 @@
+"""
+Flat-file source definitions without a Spark dependency
+
+The FLATFILE attribute helpers and fixed-width field layout shared by the
+Spark lowering (spark_lowering.py) and the pandas engine, plus the pandas
+fixed-width reader: the file is memory-mapped and viewed as a 2-D byte array
+of records, so every field is one column slice instead of a per-line parse.
+"""
+
+import codecs
+import mmap
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from mapping_compiler import Node, Port, to_spark_datetime_format
+
+# Informatica code page names -> Java charsets
+CODEPAGES = {
+    "MS1252": "windows-1252",
+    "UTF-8": "UTF-8",
+    "UTF8": "UTF-8",
+    "LATIN1": "ISO-8859-1",
+    "ISO-8859-1": "ISO-8859-1",
+    "ISO-8859-15": "ISO-8859-15",
+    "US-ASCII": "US-ASCII",
+    "7-BIT ASCII": "US-ASCII",
+    "MS932": "windows-31j",
+    "MS936": "GBK",
+    "UTF-16BE": "UTF-16BE",
+    "UTF-16LE": "UTF-16LE",
+}
+
+# Python codecs of single-byte code pages (one byte, one character)
+_SINGLE_BYTE_CODECS = {"cp1252", "iso8859-1", "iso8859-15", "ascii"}
+
+# Java charset names Python's codec registry does not know
+_PYTHON_CODECS = {"windows-31j": "cp932"}
+
+_STRING_TYPES = {"string", "nstring", "varchar", "varchar2", "nvarchar", "char", "nchar", "text", "ntext", "clob"}
+_DATETIME_TYPES = {"date/time", "datetime", "timestamp", "date"}
+
+_STRFTIME_TOKENS = [
+    ("yyyy", "%Y"), ("yy", "%y"), ("MMMM", "%B"), ("MMM", "%b"), ("MM", "%m"), ("DDD", "%j"),
+    ("dd", "%d"), ("EEE", "%a"), ("HH", "%H"), ("hh", "%I"), ("mm", "%M"), ("ss", "%S"),
+    ("SSSSSSSSS", "%f"), ("SSSSSS", "%f"), ("SSS", "%f"), ("a", "%p"),
+]
+
+
+def int_attribute(attributes: Dict[str, str], name: str) -> int:
+    try:
+        return int(attributes.get(name, "0"))
+    except ValueError:
+        return 0
+
+
+def separator(value: Optional[str]) -> str:
+    return "" if value in (None, "", "None", "NONE") else value
+
+
+def null_character(flatfile: Dict[str, str]) -> str:
+    value = flatfile.get("NULL_CHARACTER", "")
+    if flatfile.get("NULLCHARTYPE", "ASCII") == "BINARY" and value.isdigit():
+        return chr(int(value))
+    return value
+
+
+def charset(node: Node) -> str:
+    """Java charset of a flat-file source's CODEPAGE"""
+    codepage = node.flatfile.get("CODEPAGE", "UTF-8")
+    return CODEPAGES.get(codepage.upper(), codepage)
+
+
+def python_codec(java_charset: str) -> str:
+    return _PYTHON_CODECS.get(java_charset, java_charset)
+
+
+def is_fixed_width(node: Node) -> bool:
+    return bool(node.flatfile) and node.flatfile.get("DELIMITED", "YES") != "YES"
+
+
+def to_strftime_format(spark_pattern: str) -> str:
+    """Spark datetime pattern -> strftime format for pandas.to_datetime"""
+    result = []
+    i = 0
+    while i < len(spark_pattern):
+        if spark_pattern[i] == "'":
+            end = spark_pattern.index("'", i + 1)
+            result.append(spark_pattern[i + 1:end])
+            i = end + 1
+            continue
+        for token, replacement in _STRFTIME_TOKENS:
+            if spark_pattern.startswith(token, i):
+                result.append(replacement)
+                i += len(token)
+                break
+        else:
+            result.append(spark_pattern[i])
+            i += 1
+    return "".join(result)
+
+
+# ---------------------------------------------------------------------------
+# Fixed-width layout
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class FixedWidthField:
+    """Byte range of a source field within a fixed-width record"""
+    port: Port
+    offset: int
+    length: int
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.length
+
+
+def fixed_width_fields(node: Node) -> List[FixedWidthField]:
+    """
+    Record layout of a fixed-width source from SOURCEFIELD PHYSICALOFFSET /
+    PHYSICALLENGTH (bytes in the file), falling back to OFFSET and PRECISION
+    """
+    fields = [FixedWidthField(port, port.physical_offset or port.offset, port.physical_length or port.precision)
+              for port in node.ports]
+    for field in fields:
+        if field.length <= 0:
+            raise ValueError(f"Fixed-width source '{node.name}' has no length for field '{field.port.name}'")
+    return fields
+
+
+def record_width(fields: List[FixedWidthField]) -> int:
+    return max(field.end for field in fields)
+
+
+def datetime_format(node: Node, port: Port) -> str:
+    """Spark pattern for a datetime source field (PICTURETEXT, then the source's Datetime Format)"""
+    return to_spark_datetime_format(port.picture_text or node.attributes.get("Datetime Format", ""))
+
+
+# ---------------------------------------------------------------------------
+# pandas engine
+# ---------------------------------------------------------------------------
+
+def _record_bounds(mapped: mmap.mmap, data: np.ndarray, row_delimiter: int, skip_rows: int):
+    """
+    Start and end byte offsets of every record, without the row delimiter or a
+    trailing CR. When every record has the length of the first one, the
+    offsets follow from that stride and only the delimiter positions are
+    checked; otherwise the whole file is scanned for delimiters.
+    """
+    delimiter = bytes([row_delimiter])
+    body = 0
+    for _ in range(skip_rows):
+        found = mapped.find(delimiter, body)
+        body = len(data) if found < 0 else found + 1
+
+    first = mapped.find(delimiter, body)
+    size = len(data) - body
+    stride = first + 1 - body
+    if first >= 0 and size % stride in (0, stride - 1) and \
+            (data[body + stride - 1::stride] == row_delimiter).all():
+        starts = body + stride * np.arange(-(-size // stride), dtype=np.int64)
+        ends = np.minimum(starts + stride - 1, len(data))
+    else:
+        ends = body + np.flatnonzero(data[body:] == row_delimiter)
+        starts = np.concatenate(([body], ends + 1))
+        if starts[-1] < len(data):
+            ends = np.append(ends, len(data))  # Last record without a delimiter
+        else:
+            starts = starts[:-1]
+    if len(ends):
+        ends = ends - (data[np.maximum(ends - 1, 0)] == 13)
+    return starts, ends
+
+
+def _record_matrix(data: np.ndarray, starts: np.ndarray, ends: np.ndarray, width: int) -> np.ndarray:
+    """
+    (records x width) byte matrix. Equally long, evenly spaced records are a
+    zero-copy strided view of the mapping; ragged ones are gathered and padded
+    with blanks.
+    """
+    lengths = ends - starts
+    if len(starts) and (lengths >= width).all():
+        strides = np.diff(starts)
+        if len(strides) == 0 or (strides == strides[0]).all():
+            stride = int(strides[0]) if len(strides) else width
+            return np.lib.stride_tricks.as_strided(
+                data[starts[0]:], shape=(len(starts), width), strides=(stride, 1), writeable=False
+            )
+    columns = np.arange(width)
+    present = columns[None, :] < lengths[:, None]
+    positions = np.minimum(starts[:, None] + columns[None, :], max(len(data) - 1, 0))
+    records = np.full((len(starts), width), ord(" "), dtype=np.uint8)
+    records[present] = data[positions[present]]
+    return records
+
+
+def _field_bytes(records: np.ndarray, field: FixedWidthField) -> np.ndarray:
+    """The field's (records x length) byte block, copied out of the mapping"""
+    return np.array(records[:, field.offset:field.end], dtype=np.uint8, order="C", copy=True)
+
+
+def _decode(values: np.ndarray, codec: str) -> np.ndarray:
+    """
+    Decode a fixed-size bytes array. Single-byte code pages decode the whole
+    buffer at once and reinterpret it as fixed-size unicode; others go per value.
+    """
+    if codecs.lookup(codec).name in _SINGLE_BYTE_CODECS:
+        text = values.tobytes().decode(codec, errors="replace").encode("utf-32-le")
+        return np.frombuffer(text, dtype=f"<U{values.dtype.itemsize}")
+    return np.array([value.decode(codec, errors="replace") for value in values], dtype=object)
+
+
+def _parse_numbers(block: np.ndarray, decimal: int, thousands: Optional[int]):
+    """
+    Parse a block of blank-padded decimal numbers one byte column at a time.
+    Returns the integer mantissas, their number of fraction digits and a mask
+    of the rows parsed; rows with other characters (or more digits than an
+    int64 holds) are left to the caller.
+    """
+    rows = len(block)
+    mantissa = np.zeros(rows, dtype=np.int64)
+    digits = np.zeros(rows, dtype=np.int32)
+    fraction_digits = np.zeros(rows, dtype=np.int32)
+    points = np.zeros(rows, dtype=np.int32)
+    signs = np.zeros(rows, dtype=np.int32)
+    negative = np.zeros(rows, dtype=bool)
+    invalid = np.zeros(rows, dtype=bool)
+    for position in range(block.shape[1]):
+        byte = block[:, position]
+        digit = (byte >= ord("0")) & (byte <= ord("9"))
+        mantissa = np.where(digit, mantissa * 10 + (byte.astype(np.int64) - ord("0")), mantissa)
+        digits += digit
+        fraction_digits += digit & (points > 0)
+        point = byte == decimal
+        points += point
+        sign = (byte == ord("-")) | (byte == ord("+"))
+        signs += sign
+        negative |= byte == ord("-")
+        other = ~(digit | point | sign | (byte == ord(" ")) | (byte == 0))
+        if thousands is not None:
+            other &= byte != thousands
+        invalid |= other
+    parsed = ~invalid & (digits > 0) & (digits <= 18) & (points <= 1) & (signs <= 1)
+    return np.where(negative, -mantissa, mantissa), fraction_digits, parsed
+
+
+_DATETIME_FIELDS = {"yyyy": "year", "MM": "month", "dd": "day", "HH": "hour", "mm": "minute", "ss": "second"}
+_TIME_UNITS = {"hour": "h", "minute": "m", "second": "s"}
+
+
+def _parse_datetimes(block: np.ndarray, pattern: str):
+    """
+    Parse a block of left-aligned datetimes whose pattern is fixed-width
+    numeric fields and separators by byte position, into datetime64 with
+    numpy calendar arithmetic. Returns the values and a mask of the rows
+    parsed, or None for other patterns.
+    """
+    tokens = re.findall(r"yyyy|MM|dd|HH|mm|ss|'[^']*'|[^A-Za-z']", pattern)
+    if not tokens or "".join(tokens) != pattern:
+        return None
+    parsed = np.ones(len(block), dtype=bool)
+    components = {}
+    position = 0
+    for token in tokens:
+        if token in _DATETIME_FIELDS:
+            if position + len(token) > block.shape[1]:
+                return None
+            value = np.zeros(len(block), dtype=np.int64)
+            for byte in block[:, position:position + len(token)].T:
+                parsed &= (byte >= ord("0")) & (byte <= ord("9"))
+                value = value * 10 + (byte.astype(np.int64) - ord("0"))
+            components[_DATETIME_FIELDS[token]] = value
+            position += len(token)
+            continue
+        for char in token.strip("'").encode("ascii", errors="replace"):
+            if position >= block.shape[1]:
+                return None
+            parsed &= block[:, position] == char
+            position += 1
+    if not {"year", "month", "day"} <= components.keys():
+        return None
+    rest = block[:, position:]
+    parsed &= ((rest == ord(" ")) | (rest == 0)).all(axis=1)
+
+    months = np.where(parsed, (components["year"] - 1970) * 12 + components["month"] - 1, 0)
+    month_start = months.astype("datetime64[M]")
+    dates = month_start.astype("datetime64[D]") + np.where(parsed, components["day"] - 1, 0)
+    parsed &= (components["month"] >= 1) & (components["month"] <= 12) & (components["day"] >= 1) \
+        & (dates.astype("datetime64[M]") == month_start)
+    values = dates.astype("datetime64[ns]")
+    limits = {"hour": 24, "minute": 60, "second": 60}
+    for name, unit in _TIME_UNITS.items():
+        if name in components:
+            parsed &= components[name] < limits[name]
+            values = values + np.where(parsed, components[name], 0).astype(f"timedelta64[{unit}]")
+    return pd.Series(np.where(parsed, values, np.datetime64("NaT"))), parsed
+
+
+def _null_rows(node: Node, block: np.ndarray, values: np.ndarray, codec: str) -> np.ndarray:
+    """Rows whose field is filled with the null character (blanks aside)"""
+    null_char = null_character(node.flatfile).encode(codec)
+    if not null_char:
+        return np.zeros(len(block), dtype=bool)
+    if len(null_char) == 1:
+        is_null_char = block == null_char[0]
+        return (is_null_char | (block == ord(" "))).all(axis=1) & is_null_char.any(axis=1)
+    stripped = np.char.strip(values)
+    return (stripped != b"") & (np.char.replace(stripped, null_char, b"") == b"")
+
+
+def _convert(node: Node, port: Port, block: np.ndarray, codec: str) -> pd.Series:
+    """Trim, null-check and type a fixed-width field"""
+    values = block.view(f"S{block.shape[1]}").ravel()
+    is_null = _null_rows(node, block, values, codec)
+    # Rows the byte-level parsers leave to pandas
+    unparsed = ~is_null & ~((block == ord(" ")) | (block == 0)).all(axis=1)
+    datatype = (port.datatype or "string").lower()
+
+    if datatype in _STRING_TYPES:
+        text = _decode(values, codec)
+        if node.flatfile.get("STRIPTRAILINGBLANKS", "NO") == "YES":
+            text = np.char.rstrip(text.astype(str))
+        series = pd.Series(text, dtype=object)
+    elif datatype in _DATETIME_TYPES:
+        pattern = datetime_format(node, port)
+        result = _parse_datetimes(block, pattern) if pattern else None
+        if result is None:
+            result = pd.Series(pd.NaT, index=range(len(values))), np.zeros(len(values), dtype=bool)
+        series, parsed = result
+        rest = unparsed & ~parsed
+        if rest.any():
+            # Leading blanks, names of months, ...
+            series[rest] = pd.to_datetime(_decode(np.char.strip(values[rest]), codec), errors="coerce",
+                                          format=to_strftime_format(pattern) or None)
+    else:
+        thousands = separator(node.attributes.get("Thousand Separator")).encode(codec)
+        decimal = (separator(node.attributes.get("Decimal Separator")) or ".").encode(codec)
+        mantissa, fraction_digits, parsed = _parse_numbers(
+            block, decimal[0], thousands[0] if len(thousands) == 1 else None
+        )
+        integral = port.scale == 0 and datatype not in ("double", "float", "real", "decimal")
+        integers = integral and not fraction_digits[parsed].any()
+        if integers:
+            series = pd.Series(pd.arrays.IntegerArray(mantissa, ~parsed))
+        else:
+            series = pd.Series(np.where(parsed, mantissa / np.power(10.0, fraction_digits), np.nan))
+        rest = unparsed & ~parsed
+        if rest.any():
+            # Exponents, very long numbers, ...
+            numbers = np.char.strip(values[rest])
+            if thousands:
+                numbers = np.char.replace(numbers, thousands, b"")
+            if decimal != b".":
+                numbers = np.char.replace(numbers, decimal, b".")
+            numbers = pd.to_numeric(pd.Series(numbers), errors="coerce")
+            series[rest] = (numbers.round().astype("Int64") if integers else numbers).to_numpy()
+        if integral and not integers:
+            series = series.round().astype("Int64")
+
+    return series.mask(is_null) if is_null.any() else series
+
+
+def read_fixed_width_pandas(node: Node, path: str) -> pd.DataFrame:
+    """
+    Read a fixed-width source into pandas through a read-only memory map.
+
+    Record boundaries come from one vectorized scan for the row delimiter; each
+    field is then a column slice of the record matrix, trimmed, null-checked
+    and typed as a whole.
+    """
+    flatfile = node.flatfile
+    fields = fixed_width_fields(node)
+    codec = python_codec(charset(node))
+    row_delimiter = int_attribute(flatfile, "ROWDELIMITER") or 10
+    skip_rows = int_attribute(flatfile, "SKIPROWS")
+
+    with open(path, "rb") as handle:
+        if not handle.seek(0, 2):
+            return pd.DataFrame({field.port.name: pd.Series(dtype=object) for field in fields})
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = np.frombuffer(mapped, dtype=np.uint8)
+            starts, ends = _record_bounds(mapped, data, row_delimiter, skip_rows)
+            records = _record_matrix(data, starts, ends, record_width(fields))
+            blocks = {field.port.name: _field_bytes(records, field) for field in fields}
+            del data, records  # Release every view before the map closes
+
+    return pd.DataFrame({field.port.name: _convert(node, field.port, blocks[field.port.name], codec)
+                         for field in fields})
@@ -0,0 +1,213 @@
+"""
+Streaming ingestion of uploaded CSV files
+
+An upload is written to disk chunk by chunk while the same pass computes its
+SHA-256 content hash and line count and keeps the first bytes for sniffing
+the delimiter, header, sample rows and column types. Memory use is constant
+in the file size, and the profile is ready as soon as the last byte lands;
+nothing re-reads or parses the whole file.
+
+IngestFile is both the target of a raw request body (ingest_stream) and the
+file stream werkzeug's multipart parser writes into (UploadRequest), so
+multipart uploads are not spooled to a temporary file and copied again.
+"""
+
+import csv
+import hashlib
+import io
+import os
+import re
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from flask import Request
+
+CHUNK_SIZE = 1024 * 1024
+
+# Bytes kept from the start of the file for sniffing the header and sample
+HEAD_BYTES = 64 * 1024
+
+SAMPLE_ROWS = 5
+
+# Rows of the head used to infer column types
+TYPE_INFERENCE_ROWS = 100
+
+SNIFF_DELIMITERS = ",;|\t"
+
+_TYPE_PATTERNS = [
+    ("integer", re.compile(r"[+-]?\d+")),
+    ("decimal", re.compile(r"[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?")),
+    ("date", re.compile(r"\d{4}-\d{2}-\d{2}")),
+    ("timestamp", re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?")),
+]
+
+
+@dataclass
+class UploadProfile:
+    """What the upload endpoint reports about a file, computed while it streamed in"""
+    filename: str
+    file_path: str
+    file_size: int
+    sha256: str
+    line_count: int
+    total_rows: int
+    delimiter: str
+    columns: List[str]
+    schema: List[Dict[str, str]]
+    sample_data: List[Dict[str, Any]]
+    ingest_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class IngestFile(io.RawIOBase):
+    """
+    Writable file that hashes, counts lines and keeps the head of everything
+    written to it. The file is deleted on close unless keep() moved it to its
+    final path, so aborted uploads leave nothing behind.
+    """
+
+    def __init__(self, directory: str):
+        super().__init__()
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix=".incoming-", suffix=".part")
+        self._file = os.fdopen(fd, "w+b")
+        self._hash = hashlib.sha256()
+        self._head = bytearray()
+        self._last_byte = b""
+        self.size = 0
+        self.newlines = 0
+        self.started_at = time.time()
+        self._kept = False
+
+    def writable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        if not data:
+            return 0
+        self._file.write(data)
+        self._hash.update(data)
+        self.newlines += data.count(b"\n")
+        if len(self._head) < HEAD_BYTES:
+            self._head += data[:HEAD_BYTES - len(self._head)]
+        self._last_byte = data[-1:]
+        self.size += len(data)
+        return len(data)
+
+    # werkzeug's multipart parser rewinds and may read the stream back
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def readinto(self, buffer) -> int:
+        return self._file.readinto(buffer)
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+            if not self._kept and os.path.exists(self.path):
+                os.remove(self.path)
+        super().close()
+
+    def keep(self, path: str):
+        """Move the written file to path (a rename, not a copy)"""
+        self._file.flush()
+        os.replace(self.path, path)
+        self.path = path
+        self._kept = True
+
+    def profile(self, filename: str) -> UploadProfile:
+        """Profile of everything written so far"""
+        self._file.flush()
+        line_count = self.newlines + (1 if self._last_byte not in (b"", b"\n") else 0)
+        text = self._head.decode("utf-8", errors="replace")
+        if self.size > len(self._head):
+            # The last line of the head may be cut off
+            text = text[:text.rfind("\n") + 1] or text
+        delimiter = sniff_delimiter(text)
+        rows = list(csv.reader(io.StringIO(text), delimiter=delimiter))
+        rows = [row for row in rows if row]
+        if not rows:
+            raise ValueError("The uploaded file is empty")
+        columns = rows[0]
+        body = rows[1:]
+        return UploadProfile(
+            filename=filename,
+            file_path=self.path,
+            file_size=self.size,
+            sha256=self._hash.hexdigest(),
+            line_count=line_count,
+            # Line based: quoted fields spanning lines are counted once per line
+            total_rows=max(0, line_count - 1),
+            delimiter=delimiter,
+            columns=columns,
+            schema=infer_schema(columns, body[:TYPE_INFERENCE_ROWS]),
+            sample_data=[dict(zip(columns, row)) for row in body[:SAMPLE_ROWS]],
+            ingest_seconds=round(time.time() - self.started_at, 3),
+        )
+
+
+def sniff_delimiter(text: str) -> str:
+    """Field delimiter of CSV text, ',' when it cannot be sniffed"""
+    try:
+        return csv.Sniffer().sniff(text[:HEAD_BYTES], delimiters=SNIFF_DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def infer_type(values: List[str]) -> str:
+    """Narrowest type matching every non-empty value, else "string" """
+    values = [value.strip() for value in values if value.strip()]
+    if not values:
+        return "string"
+    for name, pattern in _TYPE_PATTERNS:
+        if all(pattern.fullmatch(value) for value in values):
+            return name
+    return "string"
+
+
+def infer_schema(columns: List[str], rows: List[List[str]]) -> List[Dict[str, str]]:
+    return [
+        {"name": column, "type": infer_type([row[i] for row in rows if i < len(row)])}
+        for i, column in enumerate(columns)
+    ]
+
+
+def ingest_stream(stream: BinaryIO, directory: str, chunk_size: int = CHUNK_SIZE) -> IngestFile:
+    """Copy a readable stream (e.g. a raw request body) into an IngestFile in directory"""
+    target = IngestFile(directory)
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            target.write(chunk)
+    except Exception:
+        target.close()
+        raise
+    return target
+
+
+class UploadRequest(Request):
+    """
+    Flask request whose multipart file parts stream straight into IngestFiles
+    under the app's UPLOAD_FOLDER instead of werkzeug's spooled temporary files
+    """
+
+    def _get_file_stream(self, total_content_length: Optional[int], content_type: Optional[str],
+                         filename: Optional[str] = None, content_length: Optional[int] = None):
+        from flask import current_app
+        return IngestFile(current_app.config["UPLOAD_FOLDER"])
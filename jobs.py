@@ -0,0 +1,215 @@
+"""
+Background execution of workflow runs
+
+/api/execute submits a run to the JobManager and returns its id at once; a
+bounded thread pool executes the runs. Spark runs share one SparkSession and
+are tagged with a Spark job group named after the job id. The group gives
+per-run task progress from the status tracker and cancellation through
+cancelJobGroup, which interrupts the run's tasks. Runs submitted from a
+workspace (see workspaces.py) are scheduled in that workspace's FAIR pool.
+"""
+
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+DEFAULT_MAX_WORKERS = 2
+
+# Finished jobs kept for status and result requests
+DEFAULT_MAX_FINISHED_JOBS = 100
+
+
+class JobCancelled(Exception):
+    """Raised inside a run when its cancellation has been requested"""
+
+
+@dataclass
+class Job:
+    """A submitted workflow run"""
+    id: str
+    description: str
+    status: str = QUEUED
+    phase: str = QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    traceback: Optional[str] = None
+    cancel_requested: bool = False
+    workspace: Optional[str] = None
+    pool: Optional[str] = None
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def set_phase(self, phase: str):
+        """Record the step a run is in; raises JobCancelled once cancellation was requested"""
+        if self.cancel_requested:
+            raise JobCancelled(self.id)
+        self.phase = phase
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.time()
+        end = self.finished_at or now
+        return {
+            "job_id": self.id,
+            "description": self.description,
+            "status": self.status,
+            "phase": self.phase,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queued_seconds": round((self.started_at or end) - self.submitted_at, 3),
+            "run_seconds": round(end - self.started_at, 3) if self.started_at else 0.0,
+            "error": self.error,
+            "pool": self.pool,
+        }
+
+
+class JobManager:
+    """Bounded pool of workflow runs with status, progress, cancellation and results"""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS,
+                 spark_context: Optional[Callable[[], Any]] = None,
+                 max_finished_jobs: int = DEFAULT_MAX_FINISHED_JOBS):
+        """
+        spark_context returns the SparkContext runs execute on, or None when
+        Spark is not in use; it is called lazily so the session can be created
+        (or recreated after a reset) after the manager.
+        """
+        self.max_workers = max_workers
+        self._spark_context = spark_context or (lambda: None)
+        self._max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="workflow-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, run: Callable[[Job], Any], description: str = "workflow run",
+               workspace: Optional[str] = None, pool: Optional[str] = None) -> Job:
+        """
+        Queue run(job); its return value becomes the job's result. Spark jobs
+        of the run are scheduled in the given FAIR scheduler pool.
+        """
+        job = Job(id=uuid.uuid4().hex, description=description, workspace=workspace, pool=pool)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict_finished()
+        job.future = self._executor.submit(self._run, job, run)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, workspace: Optional[str] = None) -> List[Job]:
+        """All jobs, or those submitted from one workspace"""
+        with self._lock:
+            return [job for job in self._jobs.values() if workspace is None or job.workspace == workspace]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job. A queued job never starts; a running
+        one has its Spark job group cancelled and stops at its next phase.
+        Returns False for unknown or finished jobs.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_requested = True
+        if job.future is not None and job.future.cancel():
+            self._finish(job, CANCELLED)
+            return True
+        sc = self._spark_context()
+        if sc is not None:
+            sc.cancelJobGroup(job.id)
+        return True
+
+    def cancel_all(self, workspace: Optional[str] = None):
+        for job in self.jobs(workspace):
+            self.cancel(job.id)
+
+    def progress(self, job: Job) -> Dict[str, Any]:
+        """Status plus task-level progress of the job's Spark jobs so far"""
+        report = job.to_dict()
+        sc = self._spark_context()
+        if sc is None:
+            return report
+
+        tracker = sc.statusTracker()
+        spark_jobs = []
+        total_tasks = completed_tasks = 0
+        for spark_job_id in sorted(tracker.getJobIdsForGroup(job.id)):
+            info = tracker.getJobInfo(spark_job_id)
+            if info is None:
+                continue
+            stages = [stage for stage in (tracker.getStageInfo(stage_id) for stage_id in info.stageIds) if stage]
+            tasks = sum(stage.numTasks for stage in stages)
+            # Stages skipped by AQE or reused shuffles never complete their tasks
+            done = tasks if info.status == "SUCCEEDED" else sum(stage.numCompletedTasks for stage in stages)
+            total_tasks += tasks
+            completed_tasks += done
+            spark_jobs.append({
+                "spark_job_id": spark_job_id,
+                "status": info.status,
+                "tasks": tasks,
+                "completed_tasks": done,
+                "active_tasks": sum(stage.numActiveTasks for stage in stages),
+                "failed_tasks": sum(stage.numFailedTasks for stage in stages),
+            })
+        report["spark_jobs"] = spark_jobs
+        report["tasks"] = {"total": total_tasks, "completed": completed_tasks}
+        return report
+
+    def shutdown(self, wait: bool = False):
+        self.cancel_all()
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: Job, run: Callable[[Job], Any]):
+        sc = self._spark_context()
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.set_phase("starting")
+            if sc is not None:
+                # Job groups are thread-local; pool threads are reused, so set it per run
+                sc.setJobGroup(job.id, job.description, interruptOnCancel=True)
+                sc.setLocalProperty("spark.scheduler.pool", job.pool)
+            job.result = run(job)
+            self._finish(job, SUCCEEDED)
+        except Exception as e:
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+            else:
+                job.error = str(e)
+                job.traceback = traceback.format_exc()
+                self._finish(job, FAILED)
+        finally:
+            if sc is not None:
+                sc.setLocalProperty("spark.jobGroup.id", None)
+                sc.setLocalProperty("spark.job.description", None)
+                sc.setLocalProperty("spark.scheduler.pool", None)
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.phase = status
+        job.finished_at = time.time()
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self._max_finished_jobs)]:
+            del self._jobs[job_id]
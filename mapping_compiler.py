@@ -0,0 +1,627 @@
+"""
+Mapping compiler for Informatica POWERMART XML exports
+
+Parses the SOURCE / TARGET / TRANSFORMATION / INSTANCE / CONNECTOR elements of a
+MAPPING into an intermediate DAG (MappingGraph), together with the partitioning
+of the SESSION that runs it, runs optimization passes over it and caches the
+result by the XML content hash (as JSON, so a cache entry is data only). The DAG is engine-neutral;
+spark_lowering.py turns it into a single Spark logical plan.
+"""
+
+import hashlib
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+# Bump whenever parsing or optimization passes change so stale cache entries are ignored
+COMPILER_VERSION = "5"
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mapping_cache")
+
+SOURCE_DEFINITION = "Source Definition"
+TARGET_DEFINITION = "Target Definition"
+SOURCE_QUALIFIER = "Source Qualifier"
+EXPRESSION = "Expression"
+SORTER = "Sorter"
+AGGREGATOR = "Aggregator"
+
+PASS_THROUGH = "PASS THROUGH"
+DYNAMIC_PARTITIONING_DISABLED = "Disabled"
+
+
+@dataclass
+class Port:
+    """A field of a source, target or transformation instance"""
+    name: str
+    datatype: str
+    precision: int = 0
+    scale: int = 0
+    porttype: str = "INPUT/OUTPUT"
+    expression: str = ""
+    expression_type: str = ""
+    default_value: str = ""
+    is_sort_key: bool = False
+    sort_direction: str = "ASCENDING"
+    key_type: str = ""
+    nullable: bool = True
+    picture_text: str = ""
+    offset: int = 0
+    physical_offset: int = 0
+    physical_length: int = 0
+
+    @property
+    def is_input(self) -> bool:
+        return "INPUT" in self.porttype
+
+    @property
+    def is_output(self) -> bool:
+        return "OUTPUT" in self.porttype
+
+
+@dataclass
+class Node:
+    """An INSTANCE in the mapping together with its resolved definition"""
+    name: str
+    kind: str
+    definition: str
+    ports: List[Port]
+    attributes: Dict[str, str] = field(default_factory=dict)
+    flatfile: Dict[str, str] = field(default_factory=dict)
+    database_type: str = ""
+    # Set by fuse_sorted_aggregation: the Aggregator that applies this Sorter's order
+    fused_into: str = ""
+
+    def port(self, name: str) -> Optional[Port]:
+        for port in self.ports:
+            if port.name == name:
+                return port
+        return None
+
+    @property
+    def output_ports(self) -> List[Port]:
+        return [port for port in self.ports if port.is_output]
+
+
+@dataclass
+class Edge:
+    """A CONNECTOR between two instance ports"""
+    from_instance: str
+    from_field: str
+    to_instance: str
+    to_field: str
+
+
+@dataclass
+class PartitionPoint:
+    """A session's partitioning of one instance (SESSTRANSFORMATIONINST)"""
+    instance: str
+    partition_type: str = PASS_THROUGH
+    partitions: int = 1
+    is_repartition_point: bool = False
+
+
+@dataclass
+class SessionPartitioning:
+    """Partitioning options of the session that runs a mapping, with its config object's defaults"""
+    session: str
+    number_of_partitions: int = 1
+    dynamic_partitioning: str = DYNAMIC_PARTITIONING_DISABLED
+    multiplication_factor: str = "Auto"
+    points: Dict[str, PartitionPoint] = field(default_factory=dict)
+
+    @property
+    def dynamic(self) -> bool:
+        return self.dynamic_partitioning not in ("", DYNAMIC_PARTITIONING_DISABLED)
+
+
+@dataclass
+class MappingGraph:
+    """Intermediate DAG of a single MAPPING"""
+    name: str
+    nodes: Dict[str, Node]
+    edges: List[Edge]
+    target_load_order: List[str] = field(default_factory=list)
+    applied_passes: List[str] = field(default_factory=list)
+    # Set by parse_mapping when the export holds a session of the mapping
+    partitioning: Optional[SessionPartitioning] = None
+
+    def inputs_of(self, instance: str) -> List[Edge]:
+        return [edge for edge in self.edges if edge.to_instance == instance]
+
+    def outputs_of(self, instance: str) -> List[Edge]:
+        return [edge for edge in self.edges if edge.from_instance == instance]
+
+    def upstream(self, instance: str) -> List[str]:
+        return sorted({edge.from_instance for edge in self.inputs_of(instance)})
+
+    def downstream(self, instance: str) -> List[str]:
+        return sorted({edge.to_instance for edge in self.outputs_of(instance)})
+
+    def nodes_of_kind(self, kind: str) -> List[Node]:
+        return [node for node in self.nodes.values() if node.kind == kind]
+
+    @property
+    def sources(self) -> List[Node]:
+        return self.nodes_of_kind(SOURCE_DEFINITION)
+
+    @property
+    def targets(self) -> List[Node]:
+        ordered = [self.nodes[name] for name in self.target_load_order if name in self.nodes]
+        remaining = [node for node in self.nodes_of_kind(TARGET_DEFINITION) if node not in ordered]
+        return ordered + remaining
+
+    @property
+    def primary_target(self) -> Node:
+        """First relational target in load order, falling back to the first target"""
+        targets = self.targets
+        if not targets:
+            raise ValueError(f"Mapping '{self.name}' has no target instances")
+        for target in targets:
+            if target.database_type != "Flat File":
+                return target
+        return targets[0]
+
+    def topological_order(self) -> List[str]:
+        """Instance names ordered so that every node follows its upstream nodes"""
+        pending = {name: set(self.upstream(name)) for name in self.nodes}
+        order = []
+        while pending:
+            ready = sorted(name for name, deps in pending.items() if not deps)
+            if not ready:
+                raise ValueError(f"Mapping '{self.name}' contains a cycle between: {sorted(pending)}")
+            for name in ready:
+                order.append(name)
+                del pending[name]
+            for deps in pending.values():
+                deps.difference_update(ready)
+        return order
+
+    def pipeline(self, target: Optional[str] = None) -> List[Node]:
+        """Nodes feeding the given target (default: primary target) in execution order"""
+        target_name = target or self.primary_target.name
+        needed = set()
+        frontier = [target_name]
+        while frontier:
+            name = frontier.pop()
+            if name in needed:
+                continue
+            needed.add(name)
+            frontier.extend(self.upstream(name))
+        return [self.nodes[name] for name in self.topological_order() if name in needed]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MappingGraph":
+        """Rebuild a graph from to_dict() output (the on-disk cache format)"""
+        partitioning = data.get("partitioning")
+        if partitioning is not None:
+            points = {name: PartitionPoint(**point) for name, point in partitioning["points"].items()}
+            partitioning = SessionPartitioning(**{**partitioning, "points": points})
+        nodes = {
+            name: Node(**{**node, "ports": [Port(**port) for port in node["ports"]]})
+            for name, node in data["nodes"].items()
+        }
+        return cls(**{**data, "nodes": nodes, "edges": [Edge(**edge) for edge in data["edges"]],
+                      "partitioning": partitioning})
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+def _int(value: Optional[str]) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _clean_expression(text: Optional[str]) -> str:
+    return (text or "").strip()
+
+
+# Source fields only produce values, target fields only consume them
+_DEFAULT_PORTTYPES = {"SOURCEFIELD": "OUTPUT", "TARGETFIELD": "INPUT"}
+
+
+def _parse_port(elem: ET.Element) -> Port:
+    return Port(
+        name=elem.get("NAME"),
+        datatype=(elem.get("DATATYPE") or "string").lower(),
+        precision=_int(elem.get("PRECISION")),
+        scale=_int(elem.get("SCALE")),
+        porttype=elem.get("PORTTYPE") or _DEFAULT_PORTTYPES.get(elem.tag, "INPUT/OUTPUT"),
+        expression=_clean_expression(elem.get("EXPRESSION")),
+        expression_type=elem.get("EXPRESSIONTYPE") or "",
+        default_value=_clean_expression(elem.get("DEFAULTVALUE")),
+        is_sort_key=elem.get("ISSORTKEY") == "YES",
+        sort_direction=elem.get("SORTDIRECTION") or "ASCENDING",
+        key_type=elem.get("KEYTYPE") or "",
+        nullable=elem.get("NULLABLE", "NULL") != "NOTNULL",
+        picture_text=elem.get("PICTURETEXT") or "",
+        offset=_int(elem.get("OFFSET")),
+        physical_offset=_int(elem.get("PHYSICALOFFSET")),
+        physical_length=_int(elem.get("PHYSICALLENGTH")),
+    )
+
+
+def _table_attributes(elem: ET.Element) -> Dict[str, str]:
+    return {attr.get("NAME"): attr.get("VALUE", "") for attr in elem.findall("TABLEATTRIBUTE")}
+
+
+def _definition_node(instance: ET.Element, definition: ET.Element, field_tag: str) -> Node:
+    flatfile = definition.find("FLATFILE")
+    return Node(
+        name=instance.get("NAME"),
+        kind=instance.get("TRANSFORMATION_TYPE"),
+        definition=definition.get("NAME"),
+        ports=[_parse_port(elem) for elem in definition.findall(field_tag)],
+        attributes=_table_attributes(definition),
+        flatfile=dict(flatfile.attrib) if flatfile is not None else {},
+        database_type=definition.get("DATABASETYPE") or "",
+    )
+
+
+def build_mapping_graph(mapping: ET.Element,
+                        sources: Dict[str, ET.Element],
+                        targets: Dict[str, ET.Element],
+                        transformations: Optional[Dict[str, ET.Element]] = None) -> MappingGraph:
+    """
+    Build the DAG for a MAPPING element.
+
+    sources/targets/transformations hold the folder-level definitions the
+    mapping's INSTANCEs refer to, keyed by NAME.
+    """
+    local_transformations = {elem.get("NAME"): elem for elem in mapping.findall("TRANSFORMATION")}
+    shared_transformations = transformations or {}
+    nodes = {}
+
+    for instance in mapping.findall("INSTANCE"):
+        name = instance.get("NAME")
+        definition_name = instance.get("TRANSFORMATION_NAME")
+        instance_type = instance.get("TYPE")
+
+        if instance_type == "SOURCE":
+            if definition_name not in sources:
+                raise ValueError(f"Instance '{name}' refers to unknown source '{definition_name}'")
+            nodes[name] = _definition_node(instance, sources[definition_name], "SOURCEFIELD")
+        elif instance_type == "TARGET":
+            if definition_name not in targets:
+                raise ValueError(f"Instance '{name}' refers to unknown target '{definition_name}'")
+            nodes[name] = _definition_node(instance, targets[definition_name], "TARGETFIELD")
+        else:
+            definition = local_transformations.get(definition_name) or shared_transformations.get(definition_name)
+            if definition is None:
+                raise ValueError(f"Instance '{name}' refers to unknown transformation '{definition_name}'")
+            nodes[name] = Node(
+                name=name,
+                kind=definition.get("TYPE"),
+                definition=definition_name,
+                ports=[_parse_port(elem) for elem in definition.findall("TRANSFORMFIELD")],
+                attributes=_table_attributes(definition),
+            )
+
+    edges = [
+        Edge(
+            from_instance=conn.get("FROMINSTANCE"),
+            from_field=conn.get("FROMFIELD"),
+            to_instance=conn.get("TOINSTANCE"),
+            to_field=conn.get("TOFIELD"),
+        )
+        for conn in mapping.findall("CONNECTOR")
+    ]
+    for edge in edges:
+        for instance in (edge.from_instance, edge.to_instance):
+            if instance not in nodes:
+                raise ValueError(f"Connector refers to unknown instance '{instance}'")
+
+    return MappingGraph(
+        name=mapping.get("NAME"),
+        nodes=nodes,
+        edges=edges,
+        target_load_order=[elem.get("TARGETINSTANCE") for elem in mapping.findall("TARGETLOADORDER")],
+    )
+
+
+_PARTITIONING_ATTRIBUTES = ("Number of Partitions", "Dynamic Partitioning", "Multiplication Factor")
+
+
+def _partitioning_attributes(elem: Optional[ET.Element]) -> Dict[str, str]:
+    if elem is None:
+        return {}
+    return {attr.get("NAME"): attr.get("VALUE", "") for attr in elem.findall("ATTRIBUTE")
+            if attr.get("NAME") in _PARTITIONING_ATTRIBUTES}
+
+
+def parse_session_partitioning(folder: ET.Element, mapping_name: str) -> Optional[SessionPartitioning]:
+    """
+    Partitioning of the first SESSION (reusable or in a WORKFLOW) that runs
+    the mapping: the options of its config object, overridden by the
+    session's own, and the partition points of its SESSTRANSFORMATIONINSTs.
+    An instance without PARTITION elements runs the session's number of
+    partitions.
+    """
+    session = next((elem for elem in folder.iter("SESSION") if elem.get("MAPPINGNAME") == mapping_name), None)
+    if session is None:
+        return None
+
+    configs = {elem.get("NAME"): elem for elem in folder.findall("CONFIG")}
+    reference = session.find("CONFIGREFERENCE")
+    config = configs.get(reference.get("REFOBJECTNAME")) if reference is not None else None
+    if config is None:
+        config = next((elem for elem in configs.values() if elem.get("ISDEFAULT") == "YES"), None)
+    options = {**_partitioning_attributes(config), **_partitioning_attributes(reference),
+               **_partitioning_attributes(session)}
+
+    # Number of Partitions may be a parameter such as $DynamicPartitionCount
+    number_of_partitions = max(_int(options.get("Number of Partitions")), 1)
+    points = {}
+    for elem in session.findall("SESSTRANSFORMATIONINST"):
+        partitions = len(elem.findall("PARTITION"))
+        points[elem.get("SINSTANCENAME")] = PartitionPoint(
+            instance=elem.get("SINSTANCENAME"),
+            partition_type=elem.get("PARTITIONTYPE") or PASS_THROUGH,
+            partitions=partitions or number_of_partitions,
+            is_repartition_point=elem.get("ISREPARTITIONPOINT") == "YES",
+        )
+    return SessionPartitioning(
+        session=session.get("NAME"),
+        number_of_partitions=number_of_partitions,
+        dynamic_partitioning=options.get("Dynamic Partitioning") or DYNAMIC_PARTITIONING_DISABLED,
+        multiplication_factor=options.get("Multiplication Factor") or "Auto",
+        points=points,
+    )
+
+
+def parse_mapping(root: ET.Element, mapping_name: Optional[str] = None) -> MappingGraph:
+    """Parse a mapping (default: the first one) and its session's partitioning from a POWERMART document root"""
+    for folder in root.iter("FOLDER"):
+        for mapping in folder.findall("MAPPING"):
+            if mapping_name is None or mapping.get("NAME") == mapping_name:
+                graph = build_mapping_graph(
+                    mapping,
+                    sources={elem.get("NAME"): elem for elem in folder.findall("SOURCE")},
+                    targets={elem.get("NAME"): elem for elem in folder.findall("TARGET")},
+                    transformations={elem.get("NAME"): elem for elem in folder.findall("TRANSFORMATION")},
+                )
+                graph.partitioning = parse_session_partitioning(folder, graph.name)
+                return graph
+    raise ValueError(f"Mapping '{mapping_name}' not found" if mapping_name else "No MAPPING element found")
+
+
+# ---------------------------------------------------------------------------
+# Optimization passes
+# ---------------------------------------------------------------------------
+
+_IDENTIFIER = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*")
+
+
+def referenced_ports(expression: str, candidates) -> List[str]:
+    """Port names from candidates that appear as identifiers in an expression (case-insensitive)"""
+    names = {name.upper(): name for name in candidates}
+    # Drop quoted string literals before scanning for identifiers
+    stripped = re.sub(r"'[^']*'|\"[^\"]*\"", "", expression or "")
+    return [names[token.upper()] for token in _IDENTIFIER.findall(stripped) if token.upper() in names]
+
+
+def prune_dead_ports(graph: MappingGraph) -> MappingGraph:
+    """
+    Drop ports whose values never reach a target.
+
+    A port is live when it is connected to a downstream instance, is a group-by
+    or sort key, or is referenced by the expression of another live port.
+    Target ports are always live.
+    """
+    for name in reversed(graph.topological_order()):
+        node = graph.nodes[name]
+        if node.kind == TARGET_DEFINITION:
+            continue
+
+        port_names = [port.name for port in node.ports]
+        live = {edge.from_field for edge in graph.outputs_of(name)}
+        live.update(port.name for port in node.ports
+                    if port.is_sort_key or port.expression_type == "GROUPBY")
+
+        changed = True
+        while changed:
+            changed = False
+            for port in node.ports:
+                if port.name in live and port.expression:
+                    for ref in referenced_ports(port.expression, port_names):
+                        if ref not in live:
+                            live.add(ref)
+                            changed = True
+
+        if node.kind == SOURCE_DEFINITION:
+            # The reader needs every physical field to parse the record layout
+            continue
+        node.ports = [port for port in node.ports if port.name in live]
+        graph.edges = [edge for edge in graph.edges
+                       if edge.to_instance != name or edge.to_field in live]
+    return graph
+
+
+def prune_unreachable_nodes(graph: MappingGraph) -> MappingGraph:
+    """Drop instances that do not feed any target"""
+    reachable = set()
+    for target in graph.targets:
+        reachable.update(node.name for node in graph.pipeline(target.name))
+    graph.nodes = {name: node for name, node in graph.nodes.items() if name in reachable}
+    graph.edges = [edge for edge in graph.edges
+                   if edge.from_instance in reachable and edge.to_instance in reachable]
+    return graph
+
+
+_FIRST_CALL = re.compile(r"^\s*FIRST\s*\(", re.IGNORECASE)
+
+
+def fuse_sorted_aggregation(graph: MappingGraph) -> MappingGraph:
+    """
+    Fold a Sorter into the sorted-input Aggregator it feeds.
+
+    An Aggregator that only picks FIRST() per group needs its input ordered
+    within each group, not globally: the group-by shuffle discards any global
+    order anyway. When a non-distinct Sorter feeds nothing but such an
+    Aggregator, the Sorter is marked fused and the Aggregator applies the sort
+    keys inside its group partitions, leaving one hash shuffle instead of a
+    range-partition sort followed by a hash shuffle.
+    """
+    for sorter in graph.nodes_of_kind(SORTER):
+        if sorter.attributes.get("Distinct", "NO") == "YES":
+            continue
+        consumers = graph.downstream(sorter.name)
+        if len(consumers) != 1:
+            continue
+        aggregator = graph.nodes[consumers[0]]
+        if aggregator.kind != AGGREGATOR or aggregator.attributes.get("Sorted Input", "NO") != "YES":
+            continue
+        if len(graph.upstream(aggregator.name)) != 1:
+            continue
+        groups = [port for port in aggregator.ports if port.expression_type == "GROUPBY"]
+        calls = [port for port in aggregator.output_ports
+                 if port.expression_type != "GROUPBY" and not port.is_input]
+        if not groups or not calls or not all(_FIRST_CALL.match(port.expression) for port in calls):
+            continue
+        sorter.fused_into = aggregator.name
+    return graph
+
+
+OPTIMIZATION_PASSES: List[Callable[[MappingGraph], MappingGraph]] = [
+    prune_unreachable_nodes,
+    prune_dead_ports,
+    fuse_sorted_aggregation,
+]
+
+
+def optimize(graph: MappingGraph, passes: Optional[List[Callable]] = None) -> MappingGraph:
+    """Run optimization passes over the graph in order"""
+    for optimization_pass in (OPTIMIZATION_PASSES if passes is None else passes):
+        graph = optimization_pass(graph)
+        graph.applied_passes.append(optimization_pass.__name__)
+    return graph
+
+
+# ---------------------------------------------------------------------------
+# Compilation and caching
+# ---------------------------------------------------------------------------
+
+@dataclass
+class CompiledMapping:
+    """An optimized mapping DAG keyed by the content hash of its XML"""
+    content_hash: str
+    graph: MappingGraph
+
+    @property
+    def name(self) -> str:
+        return self.graph.name
+
+
+_compiled_cache: Dict[Tuple[str, Optional[str]], CompiledMapping] = {}
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _read_source(source: Union[str, bytes]) -> bytes:
+    if isinstance(source, bytes):
+        return source
+    with open(source, "rb") as handle:
+        return handle.read()
+
+
+def compile_cached(digest: str,
+                   mapping_name: Optional[str],
+                   parse: Callable[[], MappingGraph],
+                   cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> CompiledMapping:
+    """
+    Return the compiled mapping for a content digest, calling parse() and
+    optimizing only on a cache miss (memory first, then cache_dir on disk).
+    """
+    key = (digest, mapping_name)
+    if key in _compiled_cache:
+        return _compiled_cache[key]
+
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, f"{digest}_{mapping_name or 'default'}.json")
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path) as handle:
+                    compiled = CompiledMapping(content_hash=digest, graph=MappingGraph.from_dict(json.load(handle)))
+                _compiled_cache[key] = compiled
+                return compiled
+            except Exception:
+                pass  # Corrupt or incompatible cache entry, recompile below
+
+    compiled = CompiledMapping(content_hash=digest, graph=optimize(parse()))
+    _compiled_cache[key] = compiled
+
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as handle:
+                json.dump(compiled.graph.to_dict(), handle)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # Caching is best effort
+    return compiled
+
+
+def compile_mapping(source: Union[str, bytes],
+                    mapping_name: Optional[str] = None,
+                    cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> CompiledMapping:
+    """
+    Compile a mapping from an XML path or raw XML bytes.
+
+    Results are cached in memory and, when cache_dir is set, on disk, keyed by
+    the XML content hash so repeat runs skip parsing and optimization.
+    For multi-hundred-MB exports use RepositoryReader.compile() instead, which
+    only reads and hashes the bytes of the requested mapping.
+    """
+    data = _read_source(source)
+    digest = content_hash(data + COMPILER_VERSION.encode())
+    return compile_cached(digest, mapping_name,
+                          lambda: parse_mapping(ET.fromstring(data), mapping_name), cache_dir)
+
+
+# ---------------------------------------------------------------------------
+# Format helpers
+# ---------------------------------------------------------------------------
+
+_DATETIME_TOKENS = [
+    ("YYYY", "yyyy"), ("YY", "yy"), ("MONTH", "MMMM"), ("MON", "MMM"), ("MM", "MM"),
+    ("DDD", "DDD"), ("DD", "dd"), ("DY", "EEE"), ("HH24", "HH"), ("HH12", "hh"), ("HH", "hh"),
+    ("MI", "mm"), ("SS", "ss"), ("NS", "SSSSSSSSS"), ("US", "SSSSSS"), ("MS", "SSS"), ("AM", "a"), ("PM", "a"),
+]
+
+
+def to_spark_datetime_format(informatica_format: str) -> str:
+    """
+    Translate an Informatica date format string (e.g. 'mm/dd/yyyy hh24:mi:ss')
+    into a Spark datetime pattern ('MM/dd/yyyy HH:mm:ss').
+
+    Accepts the PICTURETEXT / Datetime Format forms that carry a leading
+    'A  19 ' / 'F  29 ' width prefix.
+    """
+    text = re.sub(r"^[AF]\s+\d+\s+", "", (informatica_format or "").strip())
+    result = []
+    i = 0
+    upper = text.upper()
+    while i < len(text):
+        for token, replacement in _DATETIME_TOKENS:
+            if upper.startswith(token, i):
+                result.append(replacement)
+                i += len(token)
+                break
+        else:
+            char = text[i]
+            result.append(f"'{char}'" if char.isalpha() else char)
+            i += 1
+    return "".join(result)
@@ -0,0 +1,209 @@
+"""
+Min/max and Bloom filter indexes of Parquet files, for data skipping
+
+A file index records the min, max and null count of chosen columns for
+every row group of a file and for the file as a whole, read from the
+Parquet footer, plus an optional Bloom filter of one column's values. It is
+a few hundred bytes of JSON, small enough to live in a table's manifest, so
+a reader decides which files and row groups can hold matching rows without
+opening any data file: a point lookup skips files whose Bloom filter or
+key range rules the keys out, a range scan skips row groups whose min/max
+do not overlap the range. Pruning is conservative; files and row groups
+without statistics are always read.
+"""
+
+import base64
+import bisect
+import math
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BLOOM_FPP = 0.01
+
+_FMIX_1 = 0xFF51AFD7ED558CCD
+_FMIX_2 = 0xC4CEB9FE1A85EC53
+
+
+def _mix(hashes):
+    """MurmurHash3's 64-bit finalizer, so Bloom positions do not correlate with hash-based bucketing"""
+    import numpy as np
+
+    hashes = np.asarray(hashes, dtype=np.uint64).copy()
+    with np.errstate(over="ignore"):
+        hashes ^= hashes >> np.uint64(33)
+        hashes *= np.uint64(_FMIX_1)
+        hashes ^= hashes >> np.uint64(33)
+        hashes *= np.uint64(_FMIX_2)
+        hashes ^= hashes >> np.uint64(33)
+    return hashes
+
+
+class BloomFilter:
+    """
+    Set membership with no false negatives and a false positive rate of
+    about fpp, over 64-bit value hashes (see sketches.hash_values); probe
+    positions come from double hashing of the two 32-bit halves
+    """
+
+    def __init__(self, bits: int, hashes: int):
+        import numpy as np
+
+        if bits < 8 or hashes < 1:
+            raise ValueError("A Bloom filter needs at least 8 bits and one hash")
+        self.bits = bits
+        self.hashes = hashes
+        self.bitmap = np.zeros(bits, dtype=bool)
+
+    @classmethod
+    def for_count(cls, count: int, fpp: float = DEFAULT_BLOOM_FPP) -> "BloomFilter":
+        """A filter sized for count distinct values at false positive rate fpp"""
+        bits = max(64, int(math.ceil(-max(count, 1) * math.log(fpp) / math.log(2) ** 2)))
+        return cls(bits, max(1, int(round(bits / max(count, 1) * math.log(2)))))
+
+    def _positions(self, hashes):
+        import numpy as np
+
+        mixed = _mix(hashes)
+        low = mixed & np.uint64(0xFFFFFFFF)
+        high = (mixed >> np.uint64(32)) | np.uint64(1)
+        probes = np.arange(self.hashes, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            return ((low[:, None] + probes[None, :] * high[:, None]) % np.uint64(self.bits)).astype(np.intp)
+
+    def add_hashes(self, hashes):
+        self.bitmap[self._positions(hashes).ravel()] = True
+
+    def might_contain_hashes(self, hashes):
+        """Per hash: False when the value is certainly absent"""
+        return self.bitmap[self._positions(hashes)].all(axis=1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        import numpy as np
+
+        return {
+            "bits": self.bits,
+            "hashes": self.hashes,
+            "bitmap": base64.b64encode(np.packbits(self.bitmap).tobytes()).decode(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BloomFilter":
+        import numpy as np
+
+        bloom = cls(data["bits"], data["hashes"])
+        packed = np.frombuffer(base64.b64decode(data["bitmap"]), dtype=np.uint8)
+        bloom.bitmap = np.unpackbits(packed)[:bloom.bits].astype(bool)
+        return bloom
+
+
+def index_value(value):
+    """A statistic or query value in the index's JSON form: numbers, or ISO strings for dates and times"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)) or hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _comparable(a, b) -> bool:
+    numbers = (int, float)
+    return (isinstance(a, numbers) and isinstance(b, numbers) and not isinstance(a, bool) and not isinstance(b, bool)) \
+        or (isinstance(a, str) and isinstance(b, str))
+
+
+def file_index(path: str, columns: Sequence[str], bloom_column: Optional[str] = None, bloom_hashes=None,
+               fpp: float = DEFAULT_BLOOM_FPP) -> Dict[str, Any]:
+    """
+    Index of one Parquet file: per row group and file-wide min, max and null
+    count of columns, and a Bloom filter of the given hashes of bloom_column
+    """
+    from staging import row_group_stats
+
+    row_groups = []
+    totals = {name: {"min": None, "max": None, "null_count": 0} for name in columns}
+    # Columns some row group of which holds values without statistics
+    unbounded = set()
+    for row_group in row_group_stats(path, list(columns)):
+        entries = {}
+        for name, stats in row_group["columns"].items():
+            entry = entries[name] = {"min": index_value(stats["min"]), "max": index_value(stats["max"]),
+                                     "null_count": stats["null_count"]}
+            total = totals[name]
+            if total["null_count"] is not None:
+                total["null_count"] = None if entry["null_count"] is None else total["null_count"] + entry["null_count"]
+            if entry["min"] is None:
+                if entry["null_count"] != row_group["rows"]:
+                    unbounded.add(name)
+                continue
+            if total["min"] is None:
+                total["min"], total["max"] = entry["min"], entry["max"]
+            elif _comparable(total["min"], entry["min"]):
+                total["min"], total["max"] = min(total["min"], entry["min"]), max(total["max"], entry["max"])
+            else:
+                unbounded.add(name)
+        row_groups.append({"rows": row_group["rows"], "columns": entries})
+    for name in unbounded:
+        totals[name]["min"] = totals[name]["max"] = None
+
+    index = {"rows": sum(group["rows"] for group in row_groups), "columns": totals, "row_groups": row_groups, "bloom": None}
+    if bloom_column is not None and bloom_hashes is not None:
+        import numpy as np
+
+        bloom = BloomFilter.for_count(len(np.unique(bloom_hashes)), fpp)
+        bloom.add_hashes(bloom_hashes)
+        index["bloom"] = {"column": bloom_column, **bloom.to_dict()}
+    return index
+
+
+def _may_overlap(stats: Optional[Dict[str, Any]], rows: int, low, high) -> bool:
+    """Whether a column with these statistics can hold a value in [low, high] (None: unbounded)"""
+    if stats is None:
+        return True
+    if stats["min"] is None:
+        # No statistics, unless every value is null
+        return stats["null_count"] != rows
+    for bound, keep in ((low, lambda: stats["max"] >= low), (high, lambda: stats["min"] <= high)):
+        if bound is not None and _comparable(stats["min"], bound) and not keep():
+            return False
+    return True
+
+
+def _may_hold_any(stats: Optional[Dict[str, Any]], rows: int, sorted_values: List) -> bool:
+    """Whether a column with these statistics can hold any of the (sorted, comparable) values"""
+    if stats is None or stats["min"] is None or not sorted_values or not _comparable(stats["min"], sorted_values[0]):
+        return _may_overlap(stats, rows, None, None)
+    position = bisect.bisect_left(sorted_values, stats["min"])
+    return position < len(sorted_values) and sorted_values[position] <= stats["max"]
+
+
+def matching_row_groups(index: Dict[str, Any], equals: Optional[Tuple[str, Sequence, Any]] = None,
+                        ranges: Optional[Dict[str, Tuple[Any, Any]]] = None) -> List[int]:
+    """
+    Row groups of an indexed file that may hold matching rows; an empty list
+    means the file can be skipped.
+
+    equals is (column, values, hashes) for lookups of a set of values (the
+    hashes are probed in the Bloom filter when it covers the column); ranges
+    maps columns to inclusive (low, high) bounds, either of which may be None.
+    """
+    ranges = {name: (index_value(low), index_value(high)) for name, (low, high) in (ranges or {}).items()}
+    values = None
+    if equals is not None:
+        column, raw_values, hashes = equals
+        values = sorted(value for value in {index_value(value) for value in raw_values} if value is not None)
+        bloom = index.get("bloom")
+        if bloom is not None and bloom["column"] == column and hashes is not None and len(hashes):
+            if not BloomFilter.from_dict(bloom).might_contain_hashes(hashes).any():
+                return []
+
+    def may_match(columns: Dict[str, Any], rows: int) -> bool:
+        if values is not None and not _may_hold_any(columns.get(column), rows, values):
+            return False
+        return all(_may_overlap(columns.get(name), rows, low, high) for name, (low, high) in ranges.items())
+
+    if not may_match(index["columns"], index["rows"]):
+        return []
+    return [number for number, group in enumerate(index["row_groups"]) if may_match(group["columns"], group["rows"])]
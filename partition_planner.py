@@ -0,0 +1,178 @@
+"""
+Spark partitioning of a run, planned from the session's partitioning options
+
+Informatica runs every pipeline stage of a session in a fixed number of
+partitions, redistributing rows at repartition points by the point's
+partition type; with dynamic partitioning the count is chosen per run. Spark
+has no per-stage partition count, so a plan translates the session instead:
+
+- the stage partition count becomes the run's shuffle partition count (the
+  Sorter's and Aggregator's shuffles);
+- a repartition point becomes a boundary on its instance's input:
+  coalesce() for PASS THROUGH and DATABASE PARTITIONING (no data moves),
+  repartition() for ROUND ROBIN, repartition() on the instance's keys for
+  HASH AUTO KEYS / HASH USER KEYS and repartitionByRange() for KEY RANGE;
+- with dynamic partitioning, the count and the input split size
+  (spark.sql.files.maxPartitionBytes) follow the size of the input and the
+  cores available, the way Spark sizes file splits: small inputs run in one
+  task instead of 200 mostly empty ones, large ones get about one split per
+  core, up to DEFAULT_MAX_PARTITION_BYTES per split.
+
+Mode "auto" sizes dynamically whatever the session says; mode "spark" keeps
+Spark's own settings (no session conf, no boundaries).
+"""
+
+import math
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from mapping_compiler import (
+    AGGREGATOR, PASS_THROUGH, SORTER, TARGET_DEFINITION, MappingGraph, Node,
+)
+
+PARTITIONING_MODES = ("session", "auto", "spark")
+DEFAULT_PARTITIONING_MODE = "session"
+
+# Spark's defaults for spark.sql.files.maxPartitionBytes and openCostInBytes:
+# splits never grow beyond the first nor shrink below the second
+DEFAULT_MAX_PARTITION_BYTES = 128 * 1024 * 1024
+MIN_PARTITION_BYTES = 4 * 1024 * 1024
+
+ROUND_ROBIN = "ROUND ROBIN"
+HASH_AUTO_KEYS = "HASH AUTO KEYS"
+HASH_USER_KEYS = "HASH USER KEYS"
+KEY_RANGE = "KEY RANGE"
+DATABASE_PARTITIONING = "DATABASE PARTITIONING"
+BASED_ON_NUMBER_OF_PARTITIONS = "Based on number of partitions"
+
+
+@dataclass
+class PartitionBoundary:
+    """How rows are redistributed on the input of one instance"""
+    instance: str
+    partition_type: str
+    partitions: int
+    # Input columns of hash and key range partitioning
+    keys: List[str] = field(default_factory=list)
+
+
+@dataclass
+class PartitionPlan:
+    """Partition count, input split size and repartition boundaries of one run"""
+    mode: str
+    input_bytes: int = 0
+    partitions: Optional[int] = None
+    max_partition_bytes: Optional[int] = None
+    boundaries: Dict[str, PartitionBoundary] = field(default_factory=dict)
+
+    def spark_conf(self) -> Dict[str, str]:
+        """Session settings of the run (none in mode "spark")"""
+        conf = {}
+        if self.partitions is not None:
+            conf["spark.sql.shuffle.partitions"] = str(self.partitions)
+        if self.max_partition_bytes is not None:
+            conf["spark.sql.files.maxPartitionBytes"] = str(self.max_partition_bytes)
+        return conf
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "boundaries": [asdict(boundary) for boundary in self.boundaries.values()]}
+
+
+def input_bytes(path: str) -> int:
+    """Bytes Spark splits when reading path: a file, or the data files of a directory"""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for directory, subdirectories, files in os.walk(path):
+        # Spark skips hidden and metadata files (_SUCCESS, .crc, ...)
+        subdirectories[:] = [name for name in subdirectories if not name.startswith(("_", "."))]
+        total += sum(os.path.getsize(os.path.join(directory, name))
+                     for name in files if not name.startswith(("_", ".")))
+    return total
+
+
+def multiplication_factor(value: str) -> int:
+    """The session's Multiplication Factor; Auto is one partition per core"""
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def dynamic_partitions(size: int, slots: int) -> Dict[str, int]:
+    """
+    Split size and partition count of an input of size bytes over slots
+    parallel tasks, like Spark's FilePartition.maxSplitBytes: an even share
+    per slot, clamped to [MIN_PARTITION_BYTES, DEFAULT_MAX_PARTITION_BYTES]
+    """
+    split = min(DEFAULT_MAX_PARTITION_BYTES, max(MIN_PARTITION_BYTES, math.ceil(size / max(slots, 1))))
+    return {"partitions": max(1, math.ceil(size / split)), "max_partition_bytes": split}
+
+
+def partition_keys(graph: MappingGraph, node: Node) -> List[str]:
+    """
+    Input columns hash and key range partitioning of an instance use: the
+    Aggregator's group-by ports, the Sorter's keys or the target's primary
+    key, named as its upstream instance produces them
+    """
+    if node.kind == AGGREGATOR:
+        ports = [port.name for port in node.ports if port.expression_type == "GROUPBY"]
+    elif node.kind == SORTER:
+        ports = [port.name for port in node.ports if port.is_sort_key]
+    elif node.kind == TARGET_DEFINITION:
+        ports = [port.name for port in node.ports if "PRIMARY KEY" in port.key_type]
+    else:
+        ports = []
+    upstream_names = {edge.to_field: edge.from_field for edge in graph.inputs_of(node.name)}
+    return [upstream_names[name] for name in ports if name in upstream_names]
+
+
+def plan_partitions(graph: MappingGraph, size: int, cores: int, mode: str = DEFAULT_PARTITIONING_MODE,
+                    target: Optional[str] = None) -> PartitionPlan:
+    """
+    Plan the partitioning of a run of the pipeline feeding target (default:
+    the primary target) over an input of size bytes with cores task slots
+    """
+    if mode not in PARTITIONING_MODES:
+        raise ValueError(f"Unknown partitioning mode '{mode}'; expected one of {', '.join(PARTITIONING_MODES)}")
+    session = graph.partitioning
+    if mode == "spark" or (session is None and mode == "session"):
+        return PartitionPlan(mode="spark", input_bytes=size)
+
+    pipeline = graph.pipeline(target)
+    points = [session.points[node.name] for node in pipeline if node.name in session.points] if session else []
+    factor = multiplication_factor(session.multiplication_factor) if session else 1
+    if mode == "auto" or session.dynamic:
+        if session is not None and session.dynamic_partitioning == BASED_ON_NUMBER_OF_PARTITIONS:
+            sizing = dynamic_partitions(size, session.number_of_partitions * factor)
+            sizing["partitions"] = session.number_of_partitions * factor
+        else:
+            sizing = dynamic_partitions(size, cores * factor)
+        plan = PartitionPlan(mode="dynamic", input_bytes=size, **sizing)
+    else:
+        # Every stage of an Informatica pipeline runs the same number of partitions
+        partitions = max([point.partitions for point in points] or [session.number_of_partitions])
+        plan = PartitionPlan(mode="static", input_bytes=size, partitions=partitions)
+
+    for point in points:
+        if point.is_repartition_point:
+            node = graph.nodes[point.instance]
+            keys = partition_keys(graph, node) if point.partition_type in (HASH_AUTO_KEYS, HASH_USER_KEYS, KEY_RANGE) else []
+            plan.boundaries[node.name] = PartitionBoundary(node.name, point.partition_type, plan.partitions, keys)
+    return plan
+
+
+def apply_boundary(df, boundary: Optional[PartitionBoundary]):
+    """Redistribute an instance's input DataFrame at its partition point"""
+    if boundary is None:
+        return df
+    if boundary.partition_type in (PASS_THROUGH, DATABASE_PARTITIONING):
+        # Rows stay where they are; only surplus input splits are merged
+        return df.coalesce(boundary.partitions)
+    if boundary.partition_type == KEY_RANGE and boundary.keys:
+        return df.repartitionByRange(boundary.partitions, *boundary.keys)
+    if boundary.partition_type in (HASH_AUTO_KEYS, HASH_USER_KEYS) and boundary.keys:
+        return df.repartition(boundary.partitions, *boundary.keys)
+    # ROUND ROBIN, and keyed types of instances without keys
+    return df.repartition(boundary.partitions)
@@ -0,0 +1,394 @@
+"""
+Streaming, memory-bounded reader for large Informatica repository exports
+
+iter_objects() walks the export with iterparse and yields one MAPPING /
+SESSION / WORKFLOW at a time, detaching and clearing each subtree once it has
+been handed out, so memory stays flat regardless of export size.
+
+For random access, build_index() records the byte range of every folder-level
+definition, config object, mapping, session and workflow in a single regex pass
+over the file, read in fixed-size chunks. The index is persisted next to the
+export, and get_mapping() then parses only the bytes of the requested mapping,
+the SOURCE/TARGET/TRANSFORMATION definitions it references, and the session
+(with the folder's CONFIG objects) that sets its partitioning.
+"""
+
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import unescape
+
+from mapping_compiler import (
+    COMPILER_VERSION, DEFAULT_CACHE_DIR, CompiledMapping, MappingGraph, SessionPartitioning,
+    build_mapping_graph, compile_cached, content_hash, parse_session_partitioning,
+)
+
+OBJECT_KINDS = ("MAPPING", "SESSION", "WORKFLOW")
+
+# Folder-level definitions a mapping can refer to
+DEFINITION_KINDS = ("SOURCE", "TARGET", "TRANSFORMATION")
+
+# Folder-level session config objects, for the partitioning options of sessions
+CONFIG_KIND = "CONFIG"
+
+# Index key of the first session of each mapping, by MAPPINGNAME
+SESSION_OF_MAPPING = "SESSION_OF_MAPPING"
+
+INDEX_VERSION = 2
+
+SCAN_CHUNK_SIZE = 8 * 1024 * 1024
+
+_INDEXED_TAGS = ("FOLDER", CONFIG_KIND) + DEFINITION_KINDS + OBJECT_KINDS
+_TAG_PATTERN = re.compile(
+    rb"<(/?)(" + b"|".join(tag.encode() for tag in _INDEXED_TAGS) + rb")(?=[\s/>])([^>]*?)(/?)>"
+)
+_NAME_PATTERN = re.compile(rb"(?<![A-Za-z_])NAME\s*=\s*\"([^\"]*)\"")
+_MAPPING_NAME_PATTERN = re.compile(rb"(?<![A-Za-z_])MAPPINGNAME\s*=\s*\"([^\"]*)\"")
+_ENCODING_PATTERN = re.compile(rb"<\?xml[^>]*encoding\s*=\s*[\"']([^\"']+)[\"']")
+_ENTITIES = {"&apos;": "'", "&quot;": '"'}
+
+
+@dataclass
+class RepositoryObject:
+    """
+    A MAPPING, SESSION or WORKFLOW element streamed out of an export.
+
+    The element is detached from the document and cleared as soon as the
+    iterator advances, so use it (or call graph()) before requesting the next one.
+    """
+    kind: str
+    name: str
+    folder: str
+    element: ET.Element
+    definitions: Dict[str, Dict[str, ET.Element]] = field(default_factory=dict)
+
+    def graph(self) -> MappingGraph:
+        """Build the mapping DAG for a MAPPING object"""
+        if self.kind != "MAPPING":
+            raise ValueError(f"{self.kind} '{self.name}' is not a mapping")
+        return build_mapping_graph(
+            self.element,
+            sources=self.definitions.get("SOURCE", {}),
+            targets=self.definitions.get("TARGET", {}),
+            transformations=self.definitions.get("TRANSFORMATION", {}),
+        )
+
+
+class RepositoryReader:
+    """Incremental reader with lazy, index-backed lookup of named objects"""
+
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        self.path = path
+        self.index_path = index_path or f"{path}.idx.json"
+        self._index = None
+
+    # ------------------------------------------------------------------
+    # Streaming
+    # ------------------------------------------------------------------
+
+    def iter_objects(self, kinds=OBJECT_KINDS) -> Iterator[RepositoryObject]:
+        """
+        Yield every object of the given kinds in document order.
+
+        Folder-level SOURCE/TARGET/TRANSFORMATION definitions of the current
+        folder are retained so mappings can be resolved; everything else is
+        released as soon as its end tag has been processed.
+        """
+        kinds = set(kinds)
+        stack: List[ET.Element] = []
+        folder_name = None
+        definitions = _empty_definitions()
+
+        for event, elem in ET.iterparse(self.path, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                if elem.tag == "FOLDER":
+                    folder_name = elem.get("NAME")
+                    definitions = _empty_definitions()
+                continue
+
+            stack.pop()
+            parent = stack[-1] if stack else None
+            in_folder = parent is not None and parent.tag == "FOLDER"
+
+            if in_folder and elem.tag in DEFINITION_KINDS:
+                definitions[elem.tag][elem.get("NAME")] = elem
+                parent.remove(elem)
+                continue
+
+            if elem.tag in kinds:
+                yield RepositoryObject(
+                    kind=elem.tag,
+                    name=elem.get("NAME"),
+                    folder=folder_name,
+                    element=elem,
+                    definitions=definitions,
+                )
+                if parent is not None:
+                    parent.remove(elem)
+                elem.clear()
+            elif elem.tag == "FOLDER":
+                if parent is not None:
+                    parent.remove(elem)
+                elem.clear()
+                folder_name = None
+                definitions = _empty_definitions()
+            elif in_folder:
+                # CONFIG, SHORTCUT, SCHEDULER, ... are not needed once closed
+                parent.remove(elem)
+                elem.clear()
+
+    def iter_mappings(self) -> Iterator[MappingGraph]:
+        """
+        Yield the DAG of every mapping in the export, one at a time.
+
+        A mapping's session may come after it in the export, so its
+        partitioning is resolved through the index rather than the stream.
+        The CONFIG objects of the current folder are parsed once for all its
+        mappings.
+        """
+        config_cache = {}
+        for obj in self.iter_objects(("MAPPING",)):
+            graph = obj.graph()
+            graph.partitioning, _ = self._session_parts(obj.name, obj.folder, config_cache)
+            yield graph
+
+    # ------------------------------------------------------------------
+    # Byte-offset index
+    # ------------------------------------------------------------------
+
+    def _file_signature(self) -> Dict[str, int]:
+        stat = os.stat(self.path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def build_index(self, chunk_size: int = SCAN_CHUNK_SIZE) -> Dict:
+        """
+        Scan the export once, chunk_size bytes at a time, and record
+        [start, end) byte offsets of every folder-level definition, config
+        object and object, grouped by folder, plus the first session of each
+        mapping.
+        """
+        folders: Dict[str, Dict[str, Dict[str, List[int]]]] = {}
+        with open(self.path, "rb") as handle:
+            match = _ENCODING_PATTERN.search(handle.read(512))
+            encoding = match.group(1).decode("ascii") if match else "utf-8"
+            handle.seek(0)
+
+            stack: List[Tuple[str, str, int, Optional[str]]] = []
+            folder = None
+            for offset, tag_match in _scan_tags(handle, chunk_size):
+                closing, tag, attributes, self_closing = tag_match.groups()
+                tag = tag.decode("ascii")
+
+                if closing:
+                    if not stack or stack[-1][0] != tag:
+                        continue
+                    _, name, start, mapping_name = stack.pop()
+                    end = offset + tag_match.end()
+                else:
+                    name_match = _NAME_PATTERN.search(attributes)
+                    name = _decode_name(name_match.group(1), encoding) if name_match else ""
+                    mapping_match = _MAPPING_NAME_PATTERN.search(attributes) if tag == "SESSION" else None
+                    mapping_name = _decode_name(mapping_match.group(1), encoding) if mapping_match else None
+                    start = offset + tag_match.start()
+                    if not self_closing:
+                        stack.append((tag, name, start, mapping_name))
+                        if tag == "FOLDER":
+                            folder = name
+                            folders.setdefault(folder, {})
+                        continue
+                    end = offset + tag_match.end()
+
+                if tag == "FOLDER":
+                    folder = None
+                    continue
+                if folder is None:
+                    continue
+
+                parent_tags = [entry[0] for entry in stack]
+                # Definitions only count at folder level (mappings contain their own TRANSFORMATIONs);
+                # sessions may be reusable (folder level) or nested in a workflow.
+                if tag in DEFINITION_KINDS or tag in (CONFIG_KIND, "MAPPING", "WORKFLOW"):
+                    if parent_tags[-1:] != ["FOLDER"]:
+                        continue
+                folders[folder].setdefault(tag, {})[name] = [start, end]
+                if tag == "SESSION" and mapping_name:
+                    # Sessions do not nest, so the first to close is the first in document order
+                    folders[folder].setdefault(SESSION_OF_MAPPING, {}).setdefault(mapping_name, [start, end])
+
+        index = {
+            "version": INDEX_VERSION,
+            "file": self._file_signature(),
+            "encoding": encoding,
+            "folders": folders,
+        }
+        try:
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as handle:
+                json.dump(index, handle)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass  # Read-only location; keep the index in memory only
+        self._index = index
+        return index
+
+    @property
+    def index(self) -> Dict:
+        """The byte-offset index, loaded from disk or built on first use"""
+        if self._index is None:
+            try:
+                with open(self.index_path) as handle:
+                    index = json.load(handle)
+                if index.get("version") == INDEX_VERSION and index.get("file") == self._file_signature():
+                    self._index = index
+            except (OSError, ValueError):
+                pass
+        if self._index is None:
+            self.build_index()
+        return self._index
+
+    def names(self, kind: str = "MAPPING") -> List[Tuple[str, str]]:
+        """(folder, name) pairs of every indexed object of a kind"""
+        return [(folder, name)
+                for folder, entries in self.index["folders"].items()
+                for name in entries.get(kind, {})]
+
+    def _locate(self, kind: str, name: str, folder: Optional[str] = None) -> Tuple[str, List[int]]:
+        for folder_name, entries in self.index["folders"].items():
+            if folder is not None and folder_name != folder:
+                continue
+            if name in entries.get(kind, {}):
+                return folder_name, entries[kind][name]
+        where = f" in folder '{folder}'" if folder else ""
+        raise KeyError(f"{kind} '{name}' not found{where}")
+
+    def read_bytes(self, span: List[int]) -> bytes:
+        start, end = span
+        with open(self.path, "rb") as handle:
+            handle.seek(start)
+            return handle.read(end - start)
+
+    def _parse_span(self, span: List[int]) -> ET.Element:
+        declaration = f'<?xml version="1.0" encoding="{self.index["encoding"]}"?>'.encode("ascii")
+        return ET.fromstring(declaration + self.read_bytes(span))
+
+    def get_element(self, kind: str, name: str, folder: Optional[str] = None) -> ET.Element:
+        """Parse a single indexed object without touching the rest of the export"""
+        _, span = self._locate(kind, name, folder)
+        return self._parse_span(span)
+
+    def _folder_configs(self, folder_name: str) -> Tuple[List[ET.Element], List[List[int]]]:
+        """The parsed CONFIG objects of a folder and their spans"""
+        spans = list(self.index["folders"].get(folder_name, {}).get(CONFIG_KIND, {}).values())
+        return [self._parse_span(span) for span in spans], spans
+
+    def _session_parts(self, mapping_name: str, folder_name: str,
+                       config_cache: Optional[Dict] = None) -> Tuple[Optional[SessionPartitioning], List[List[int]]]:
+        """
+        Partitioning of the mapping's first session, and the spans it was read
+        from. config_cache keeps the last folder's parsed CONFIG objects
+        between calls.
+        """
+        entries = self.index["folders"].get(folder_name, {})
+        session_span = entries.get(SESSION_OF_MAPPING, {}).get(mapping_name)
+        if session_span is None:
+            return None, []
+        configs = config_cache.get(folder_name) if config_cache is not None else None
+        if configs is None:
+            configs = self._folder_configs(folder_name)
+            if config_cache is not None:
+                config_cache.clear()
+                config_cache[folder_name] = configs
+        config_elements, config_spans = configs
+        # parse_session_partitioning resolves the session's config within its folder
+        scope = ET.Element("FOLDER")
+        scope.extend(config_elements)
+        scope.append(self._parse_span(session_span))
+        return parse_session_partitioning(scope, mapping_name), [session_span] + config_spans
+
+    def _mapping_parts(self, name: str, folder: Optional[str]):
+        folder_name, span = self._locate("MAPPING", name, folder)
+        mapping_bytes = self.read_bytes(span)
+        mapping = self._parse_span(span)
+        entries = self.index["folders"][folder_name]
+
+        referenced = {kind: {} for kind in DEFINITION_KINDS}
+        spans = []
+        local = {elem.get("NAME") for elem in mapping.findall("TRANSFORMATION")}
+        for instance in mapping.findall("INSTANCE"):
+            definition = instance.get("TRANSFORMATION_NAME")
+            kind = {"SOURCE": "SOURCE", "TARGET": "TARGET"}.get(instance.get("TYPE"), "TRANSFORMATION")
+            if kind == "TRANSFORMATION" and definition in local:
+                continue
+            definition_span = entries.get(kind, {}).get(definition)
+            if definition_span is not None and definition not in referenced[kind]:
+                referenced[kind][definition] = self._parse_span(definition_span)
+                spans.append(definition_span)
+        partitioning, session_spans = self._session_parts(name, folder_name)
+        return mapping, mapping_bytes, referenced, partitioning, spans + session_spans
+
+    def get_mapping(self, name: str, folder: Optional[str] = None) -> MappingGraph:
+        """Resolve a named mapping, and its session's partitioning, through the index"""
+        mapping, _, referenced, partitioning, _ = self._mapping_parts(name, folder)
+        return _build_graph(mapping, referenced, partitioning)
+
+    def compile(self, name: str, folder: Optional[str] = None,
+                cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> CompiledMapping:
+        """
+        Compile a named mapping, cached by the hash of the mapping bytes, the
+        definitions it references and its session and config objects rather
+        than the whole export.
+        """
+        mapping, mapping_bytes, referenced, partitioning, spans = self._mapping_parts(name, folder)
+        digest_input = mapping_bytes + b"".join(self.read_bytes(span) for span in sorted(spans))
+        digest = content_hash(digest_input + COMPILER_VERSION.encode())
+        return compile_cached(digest, name, lambda: _build_graph(mapping, referenced, partitioning), cache_dir)
+
+
+def _build_graph(mapping: ET.Element, referenced: Dict[str, Dict[str, ET.Element]],
+                 partitioning: Optional[SessionPartitioning]) -> MappingGraph:
+    graph = build_mapping_graph(
+        mapping,
+        sources=referenced["SOURCE"],
+        targets=referenced["TARGET"],
+        transformations=referenced["TRANSFORMATION"],
+    )
+    graph.partitioning = partitioning
+    return graph
+
+
+def _scan_tags(handle, chunk_size: int = SCAN_CHUNK_SIZE):
+    """
+    Yield (chunk offset, match) for every indexed tag, reading fixed-size
+    chunks so the scan never holds more than one chunk in memory. Each chunk
+    is cut at its last '<' so no tag straddles a boundary.
+    """
+    offset = 0
+    carry = b""
+    while True:
+        chunk = handle.read(chunk_size)
+        data = carry + chunk
+        if not chunk:
+            cut = len(data)
+        else:
+            cut = data.rfind(b"<")
+            if cut <= 0:
+                carry = data
+                continue
+        for tag_match in _TAG_PATTERN.finditer(data, 0, cut):
+            yield offset, tag_match
+        if not chunk:
+            return
+        offset += cut
+        carry = data[cut:]
+
+
+def _empty_definitions() -> Dict[str, Dict[str, ET.Element]]:
+    return {kind: {} for kind in DEFINITION_KINDS}
+
+
+def _decode_name(raw: bytes, encoding: str) -> str:
+    return unescape(raw.decode(encoding, errors="replace"), _ENTITIES)
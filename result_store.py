@@ -0,0 +1,349 @@
+"""
+Paginated access to workflow results
+
+A run writes its full output as Parquet into the workspace (Spark writes it
+in the same job that fills the run report), and the UI and API fetch it a
+page at a time. An unsorted page reads only the row groups that overlap the
+requested range. A sorted page is a top-(offset + limit) query, run on Spark
+when a session is given. Either way the driver holds at most one page (plus
+a row group) of the output, no matter how large the output is. Only the
+shipped rows are converted to Python values.
+
+Downloads stream the whole output as CSV, gzip CSV or Parquet, generated a
+record batch at a time. The generated bytes are deterministic, so a
+DownloadIndex recorded while a download is generated (its size and where each
+row group starts) lets later Range requests resume mid-file by regenerating
+from the row group that holds the first requested byte.
+"""
+
+import io
+import os
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, timezone as dt_timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from staging import parquet_files
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Download format -> (MIME type, file extension)
+DOWNLOAD_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "csv.gz": ("application/gzip", "csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Rows converted per step of a download
+DOWNLOAD_BATCH_ROWS = 64 * 1024
+
+# Bytes read per step when a stored Parquet file is sent as is
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def result_columns(path: str) -> List[str]:
+    import pyarrow.parquet as pq
+    return pq.read_schema(parquet_files(path)[0]).names
+
+
+def total_rows(path: str) -> int:
+    import pyarrow.parquet as pq
+    return sum(pq.ParquetFile(file_path).metadata.num_rows for file_path in parquet_files(path))
+
+
+def read_page(path: str, offset: int, limit: int, columns: Optional[List[str]] = None):
+    """Rows [offset, offset + limit) in file order, reading only the overlapping row groups"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tables = []
+    position = 0
+    end = offset + limit
+    for file_path in parquet_files(path):
+        parquet_file = pq.ParquetFile(file_path)
+        for group in range(parquet_file.metadata.num_row_groups):
+            rows = parquet_file.metadata.row_group(group).num_rows
+            if position + rows > offset and position < end:
+                table = parquet_file.read_row_group(group, columns=columns)
+                start = max(0, offset - position)
+                tables.append(table.slice(start, min(rows, end - position) - start))
+            position += rows
+            if position >= end:
+                break
+        if position >= end:
+            break
+    if not tables:
+        table = pq.read_schema(parquet_files(path)[0]).empty_table()
+        return table.select(columns) if columns else table
+    return pa.concat_tables(tables)
+
+
+def read_sorted_page(path: str, offset: int, limit: int, sort: str, descending: bool = False,
+                     columns: Optional[List[str]] = None, spark=None):
+    """
+    Rows [offset, offset + limit) ordered by sort. With a SparkSession this is
+    a TakeOrderedAndProject over the Parquet files, whose memory is bounded by
+    offset + limit; without one, pyarrow sorts the table.
+
+    Both engines put nulls last and break ties on the remaining columns in
+    ascending order, so a page holds the same rows whichever engine serves
+    it and consecutive pages neither repeat nor skip rows.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    tiebreakers = [name for name in result_columns(path) if name != sort]
+    if spark is not None:
+        from pyspark.sql import functions as F
+        order = [F.col(sort).desc_nulls_last() if descending else F.col(sort).asc_nulls_last()]
+        order += [F.col(name).asc_nulls_last() for name in tiebreakers]
+        df = spark.read.parquet(path).orderBy(*order)
+        if columns:
+            df = df.select(*columns)
+        # Arrow-based conversion of the shipped rows only
+        return pa.Table.from_pandas(df.offset(offset).limit(limit).toPandas(), preserve_index=False)
+
+    table = pq.read_table(path)
+    sort_keys = [(sort, "descending" if descending else "ascending")] + [(name, "ascending") for name in tiebreakers]
+    indices = pc.sort_indices(table, options=pc.SortOptions(sort_keys, null_placement="at_end"))
+    table = table.take(indices.slice(offset, limit))
+    return table.select(columns) if columns else table
+
+
+def _json_value(value, timezone: Optional[str]):
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(_zone(timezone)).replace(tzinfo=None)
+        return str(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _zone(timezone: Optional[str]):
+    if not timezone:
+        return dt_timezone.utc
+    from zoneinfo import ZoneInfo
+    return ZoneInfo(timezone)
+
+
+def to_records(table, timezone: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    JSON-ready rows of an Arrow table: timestamps as wall-clock strings in the
+    session time zone (Parquet stores them in UTC), dates in ISO format
+    """
+    return [{name: _json_value(value, timezone) for name, value in row.items()} for row in table.to_pylist()]
+
+
+def page(path: str, offset: int = 0, limit: int = DEFAULT_PAGE_SIZE, columns: Optional[List[str]] = None,
+         sort: Optional[str] = None, descending: bool = False, spark=None,
+         timezone: Optional[str] = None) -> Dict[str, Any]:
+    """One page of a stored result, with the offset of the next page (None on the last page)"""
+    available = result_columns(path)
+    unknown = [column for column in (columns or []) + ([sort] if sort else []) if column not in available]
+    if unknown:
+        raise ValueError(f"Unknown result column(s): {', '.join(unknown)}")
+    if offset < 0 or not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"offset must be >= 0 and limit between 1 and {MAX_PAGE_SIZE}")
+
+    if sort:
+        table = read_sorted_page(path, offset, limit, sort, descending, columns, spark)
+    else:
+        table = read_page(path, offset, limit, columns)
+    total = total_rows(path)
+    next_offset = offset + table.num_rows
+    return {
+        "total_records": total,
+        "offset": offset,
+        "limit": limit,
+        "columns": columns or available,
+        "sort": sort,
+        "order": "desc" if descending else "asc",
+        "next_offset": next_offset if next_offset < total else None,
+        "data": to_records(table, timezone),
+    }
+
+
+
+@dataclass
+class DownloadIndex:
+    """
+    Size of a generated download and the byte offset at which each of its
+    segments starts; a segment can be regenerated without the ones before it
+    """
+    size: int
+    offsets: List[int]
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write target of a ParquetWriter whose output is handed on as it is written"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        chunks, self._chunks = self._chunks, []
+        return b"".join(chunks)
+
+
+def _row_groups(path: str):
+    import pyarrow.parquet as pq
+    for file_path in parquet_files(path):
+        parquet_file = pq.ParquetFile(file_path)
+        for group in range(parquet_file.metadata.num_row_groups):
+            yield parquet_file, group
+
+
+def _local_batch(batch, timezone: Optional[str]):
+    """Batch with time zone-aware timestamps as naive wall-clock times in the session time zone"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = []
+    for column in batch.columns:
+        if pa.types.is_timestamp(column.type) and column.type.tz is not None:
+            column = pc.local_timestamp(column.cast(pa.timestamp(column.type.unit, tz=timezone or "UTC")))
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+
+def _csv_header(path: str) -> Iterator[bytes]:
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+    sink = io.BytesIO()
+    pa_csv.write_csv(pq.read_schema(parquet_files(path)[0]).empty_table(), sink)
+    yield sink.getvalue()
+
+
+def _csv_rows(parquet_file, group: int, timezone: Optional[str]) -> Iterator[bytes]:
+    import pyarrow.csv as pa_csv
+    options = pa_csv.WriteOptions(include_header=False)
+    for batch in parquet_file.iter_batches(batch_size=DOWNLOAD_BATCH_ROWS, row_groups=[group]):
+        sink = io.BytesIO()
+        pa_csv.write_csv(_local_batch(batch, timezone), sink, options)
+        yield sink.getvalue()
+
+
+def _gzip_member(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    One gzip member of the chunks. Concatenated members form a valid gzip file,
+    and the header carries no timestamp, so the output is deterministic.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _stored_file(path: str, fmt: str) -> Optional[str]:
+    """The stored file itself when it already is the download, which is then sent as is"""
+    if path.endswith(".csv"):
+        return path if fmt == "csv" else None
+    files = parquet_files(path) if fmt == "parquet" else []
+    return files[0] if len(files) == 1 else None
+
+
+def _file_chunks(file_path: str, skip: int) -> Iterator[bytes]:
+    with open(file_path, "rb") as handle:
+        handle.seek(skip)
+        while True:
+            chunk = handle.read(DOWNLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _parquet_chunks(path: str) -> Iterator[bytes]:
+    """Several Parquet files (Spark output) rewritten batch by batch as one file"""
+    import pyarrow.parquet as pq
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, pq.read_schema(parquet_files(path)[0]))
+    for parquet_file, group in _row_groups(path):
+        for batch in parquet_file.iter_batches(batch_size=DOWNLOAD_BATCH_ROWS, row_groups=[group]):
+            writer.write_batch(batch)
+            yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def _segments(path: str, fmt: str, timezone: Optional[str]) -> List[Callable[[], Iterator[bytes]]]:
+    """Generators of the consecutive, independently generated parts of a download"""
+    if path.endswith(".csv"):
+        # Output stored as CSV when pyarrow is not installed
+        if fmt != "csv.gz":
+            raise ValueError("Parquet downloads need pyarrow")
+        return [lambda: _gzip_member(_file_chunks(path, 0))]
+    if fmt == "parquet":
+        return [lambda: _parquet_chunks(path)]
+    segments = [lambda: _csv_header(path)] + [
+        lambda parquet_file=parquet_file, group=group: _csv_rows(parquet_file, group, timezone)
+        for parquet_file, group in _row_groups(path)
+    ]
+    if fmt == "csv.gz":
+        return [lambda segment=segment: _gzip_member(segment()) for segment in segments]
+    return segments
+
+
+def known_index(path: str, fmt: str) -> Optional[DownloadIndex]:
+    """The index of a download known without generating it (the stored file is the download)"""
+    stored = _stored_file(path, fmt)
+    return DownloadIndex(size=os.path.getsize(stored), offsets=[0]) if stored else None
+
+
+def stream_download(path: str, fmt: str, timezone: Optional[str] = None, start: int = 0,
+                    end: Optional[int] = None, index: Optional[DownloadIndex] = None,
+                    on_complete: Optional[Callable[[DownloadIndex], None]] = None) -> Iterator[bytes]:
+    """
+    Bytes [start, end) of the download of a stored result in fmt (a key of
+    DOWNLOAD_FORMATS), generated a batch at a time. start > 0 needs the index
+    of an earlier complete download. A download generated from the first
+    byte to the last reports its index to on_complete.
+    """
+    if fmt not in DOWNLOAD_FORMATS:
+        raise ValueError(f"Unknown download format {fmt!r}; expected one of {', '.join(DOWNLOAD_FORMATS)}")
+    index = index or known_index(path, fmt)
+    if start and index is None:
+        raise ValueError("Resuming a download needs the index of a complete download")
+
+    stored = _stored_file(path, fmt)
+    if stored:
+        segments = [lambda: _file_chunks(stored, start)]
+        first, position = 0, start
+    else:
+        segments = _segments(path, fmt, timezone)
+        first = 0
+        if index is not None:
+            first = max(i for i, offset in enumerate(index.offsets) if offset <= start)
+        position = index.offsets[first] if index is not None else 0
+
+    offsets = []
+    for segment in segments[first:]:
+        offsets.append(position)
+        for chunk in segment():
+            chunk_start, position = position, position + len(chunk)
+            if position <= start:
+                continue
+            if end is not None and chunk_start >= end:
+                return
+            yield chunk[max(0, start - chunk_start):None if end is None else end - chunk_start]
+        if end is not None and position >= end:
+            return
+    if first == 0 and start == 0 and not stored and on_complete is not None:
+        on_complete(DownloadIndex(size=position, offsets=offsets))
@@ -87,7 +87,12 @@ def main():
     
     try:
         # Import and run the Flask app
-        from app import app
+        from app import app, start_prewarm
+        
+        # Build and warm the SparkSession in the serving process while Flask starts;
+        # opt out with SPARK_PREWARM=0
+        if os.environ.get('SPARK_PREWARM', '1') == '1' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_prewarm()
         print("🌐 Application will be available at: http://localhost:5000")
         print("📱 Access from network: http://<your-ip>:5000")
         print("⏹️  Press Ctrl+C to stop the application")
@@ -0,0 +1,153 @@
+"""
+Persisted state of incremental workflow runs
+
+An incremental run only processes the source records newer than the
+workflow's high-water mark, the latest change timestamp (the mapping's
+Last_Updated_Timestamp) a committed run has loaded, and does not read input
+files whose content fingerprint was already ingested. The high-water mark,
+the ingested fingerprints and the run variables of every committed run
+(start and end time, source and target row counts, the mark it reached) are
+kept per workflow in a SQLite database. A run's state is committed in one
+transaction after its output is stored, so a failed or cancelled run leaves
+the previous state in place and the next run simply covers its data again.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+DEFAULT_RUN_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".run_state.db")
+
+RUN_MODES = ("full", "incremental")
+DEFAULT_RUN_MODE = "full"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watermarks (
+    workflow TEXT PRIMARY KEY,
+    watermark TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ingested_files (
+    workflow TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    filename TEXT,
+    run_id TEXT NOT NULL,
+    ingested_at REAL NOT NULL,
+    PRIMARY KEY (workflow, fingerprint)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    workflow TEXT NOT NULL,
+    fingerprint TEXT,
+    since TEXT,
+    watermark TEXT,
+    source_rows INTEGER,
+    output_rows INTEGER,
+    started_at REAL,
+    finished_at REAL NOT NULL
+);
+"""
+
+
+def format_watermark(value) -> Optional[str]:
+    """A change timestamp (datetime or pandas Timestamp) as stored: ISO 8601 wall-clock time"""
+    if value is None or value != value:  # None or NaT
+        return None
+    if hasattr(value, "to_pydatetime"):
+        value = value.to_pydatetime()
+    return value.isoformat(sep=" ")
+
+
+def parse_watermark(text: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(text) if text else None
+
+
+@dataclass
+class RunState:
+    """High-water mark, ingested files and last committed run of one workflow"""
+    workflow: str
+    watermark: Optional[datetime] = None
+    fingerprints: Set[str] = field(default_factory=set)
+    last_run: Optional[Dict[str, Any]] = None
+
+    def is_ingested(self, fingerprint: str) -> bool:
+        return fingerprint in self.fingerprints
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "workflow": self.workflow,
+            "watermark": format_watermark(self.watermark),
+            "ingested_files": len(self.fingerprints),
+            "last_run": self.last_run,
+        }
+
+
+class RunStateStore:
+    """Run state of every workflow in a SQLite file, safe to share between threads"""
+
+    def __init__(self, path: str = DEFAULT_RUN_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def get(self, workflow: str) -> RunState:
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT watermark FROM watermarks WHERE workflow = ?", (workflow,)).fetchone()
+            fingerprints = {entry["fingerprint"] for entry in connection.execute(
+                "SELECT fingerprint FROM ingested_files WHERE workflow = ?", (workflow,))}
+            last_run = connection.execute(
+                "SELECT * FROM runs WHERE workflow = ? ORDER BY finished_at DESC LIMIT 1", (workflow,)).fetchone()
+        return RunState(
+            workflow=workflow,
+            watermark=parse_watermark(row["watermark"]) if row else None,
+            fingerprints=fingerprints,
+            last_run=dict(last_run) if last_run else None,
+        )
+
+    def commit(self, workflow: str, run_id: str, watermark: Optional[datetime],
+               fingerprint: Optional[str] = None, filename: Optional[str] = None,
+               since: Optional[datetime] = None, source_rows: int = 0, output_rows: int = 0,
+               started_at: Optional[float] = None) -> RunState:
+        """
+        Record a finished run: its input file as ingested and its latest change
+        timestamp as the high-water mark, unless a concurrent run already moved
+        the mark further. Returns the new state.
+        """
+        now = time.time()
+        with self._lock, closing(self._connect()) as connection, connection:
+            row = connection.execute("SELECT watermark FROM watermarks WHERE workflow = ?", (workflow,)).fetchone()
+            current = parse_watermark(row["watermark"]) if row else None
+            if current is not None and (watermark is None or watermark < current):
+                watermark = current
+            connection.execute(
+                "INSERT OR REPLACE INTO watermarks (workflow, watermark, updated_at) VALUES (?, ?, ?)",
+                (workflow, format_watermark(watermark), now))
+            if fingerprint:
+                connection.execute(
+                    "INSERT OR REPLACE INTO ingested_files (workflow, fingerprint, filename, run_id, ingested_at) "
+                    "VALUES (?, ?, ?, ?, ?)", (workflow, fingerprint, filename, run_id, now))
+            connection.execute(
+                "INSERT OR REPLACE INTO runs (run_id, workflow, fingerprint, since, watermark, source_rows, "
+                "output_rows, started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, workflow, fingerprint, format_watermark(since), format_watermark(watermark),
+                 source_rows, output_rows, started_at, now))
+        return self.get(workflow)
+
+    def reset(self, workflow: str):
+        """Forget the workflow's state; its next incremental run processes everything"""
+        with self._lock, closing(self._connect()) as connection, connection:
+            for table in ("watermarks", "ingested_files", "runs"):
+                connection.execute(f"DELETE FROM {table} WHERE workflow = ?", (workflow,))
@@ -0,0 +1,308 @@
+"""
+Mergeable sketches for statistics of datasets too large to hold in memory
+
+HyperLogLog estimates distinct counts, KLL quantiles (the median) and
+Misra-Gries the heavy hitters of a column. Each sketch takes whole numpy or
+pandas batches, so a pass over a column costs a few vectorized operations per
+batch and constant memory. Sketches of the same parameters merge: partitions
+of a Spark job, batches of a Parquet file and the runs of an incremental
+load each build their own and the results are combined. to_dict/from_dict
+give a JSON-safe form for shipping them between processes and storing them.
+"""
+
+import base64
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_HLL_PRECISION = 14
+
+DEFAULT_KLL_K = 200
+
+# Smallest capacity of a KLL level
+_KLL_MIN_CAPACITY = 8
+
+
+def hash_values(values):
+    """
+    64-bit hashes of a column. Numbers are hashed as float64, so the same id
+    hashes alike whether a batch read it as an integer or, next to nulls, as a
+    float; everything else is hashed as its string.
+    """
+    import numpy as np
+    import pandas as pd
+
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        values = values.astype("float64")
+    else:
+        values = values.astype(object).where(values.isna(), values.astype(str))
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+
+
+class HyperLogLog:
+    """
+    Distinct count estimate with a relative standard error of
+    1.04 / sqrt(2 ** precision). Like HLL++, it counts exactly (the distinct
+    hashes themselves) while there are at most 2 ** precision / 16 values.
+    """
+
+    def __init__(self, precision: int = DEFAULT_HLL_PRECISION):
+        import numpy as np
+
+        if not 4 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+        # Distinct hashes seen, None once there are too many to keep
+        self.small = np.empty(0, dtype=np.uint64)
+
+    def _keep_small(self, hashes):
+        import numpy as np
+
+        if self.small is not None:
+            self.small = np.union1d(self.small, hashes)
+            if len(self.small) > len(self.registers) // 16:
+                self.small = None
+
+    def update(self, values):
+        """Add a batch of values (nulls count as one distinct value)"""
+        self.update_hashes(hash_values(values))
+
+    def update_hashes(self, hashes):
+        import numpy as np
+
+        if not len(hashes):
+            return
+        self._keep_small(hashes)
+        rest_bits = 64 - self.precision
+        index = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        # Position of the leftmost 1 in the remaining bits. frexp gives the bit
+        # length of each 32-bit half exactly (a half fits a float64 mantissa,
+        # the up to 60 remaining bits do not)
+        _, high_length = np.frexp((rest >> np.uint64(32)).astype(np.float64))
+        _, low_length = np.frexp((rest & np.uint64(0xFFFFFFFF)).astype(np.float64))
+        bit_length = np.where(high_length > 0, high_length + 32, low_length)
+        rank = (rest_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        import numpy as np
+
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        if other.small is None:
+            self.small = None
+        else:
+            self._keep_small(other.small)
+        return self
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def estimate(self) -> int:
+        import numpy as np
+
+        if self.small is not None:
+            return len(self.small)
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int32)).sum()
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(self.registers.tobytes()).decode(),
+            "small": None if self.small is None else base64.b64encode(self.small.tobytes()).decode(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        import numpy as np
+
+        sketch = cls(data["precision"])
+        sketch.registers = np.frombuffer(base64.b64decode(data["registers"]), dtype=np.uint8).copy()
+        sketch.small = None if data["small"] is None else \
+            np.frombuffer(base64.b64decode(data["small"]), dtype=np.uint64).copy()
+        return sketch
+
+
+class KLLSketch:
+    """
+    Quantile estimate (Karnin, Lang and Liberty) keeping about 3 * k values.
+    Level h holds values standing for 2 ** h input values each; a level over
+    its capacity is sorted and every other value (from a random offset) moves
+    up a level.
+    """
+
+    def __init__(self, k: int = DEFAULT_KLL_K, seed: Optional[int] = None):
+        import numpy as np
+
+        if k < _KLL_MIN_CAPACITY:
+            raise ValueError(f"KLL k must be at least {_KLL_MIN_CAPACITY}")
+        self.k = k
+        self.n = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.levels = [np.empty(0)]
+        self._random = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(_KLL_MIN_CAPACITY, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        """Add a batch of numbers (NaNs are skipped)"""
+        import numpy as np
+
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def _compress(self):
+        import numpy as np
+
+        while True:
+            full = [level for level in range(len(self.levels)) if len(self.levels[level]) > self._capacity(level)]
+            if not full:
+                return
+            level = full[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # An odd value out stays; the others are halved into the next level
+            odd = len(items) % 2
+            self.levels[level] = items[:odd]
+            promoted = items[odd + int(self._random.integers(2))::2]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        import numpy as np
+
+        if other.k != self.k:
+            raise ValueError("Cannot merge KLL sketches of different k")
+        if not other.n:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+        return self
+
+    @property
+    def rank_error(self) -> float:
+        """Normalized rank error bound (99% confidence, the DataSketches KLL fit)"""
+        return 2.296 / self.k ** 0.9723
+
+    def quantile(self, fraction: float) -> Optional[float]:
+        import numpy as np
+
+        if not self.n:
+            return None
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        position = min(int(np.searchsorted(cumulative, fraction * cumulative[-1])), len(values) - 1)
+        return float(min(max(values[order][position], self.min), self.max))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "k": self.k,
+            "n": self.n,
+            "min": self.min,
+            "max": self.max,
+            "levels": [items.tolist() for items in self.levels],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KLLSketch":
+        import numpy as np
+
+        sketch = cls(data["k"])
+        sketch.n, sketch.min, sketch.max = data["n"], data["min"], data["max"]
+        sketch.levels = [np.array(items, dtype=np.float64) for items in data["levels"]]
+        return sketch
+
+
+class MisraGries:
+    """
+    Heavy hitters of a column in at most capacity counters. Counts are
+    underestimated by at most error (<= rows / (capacity + 1)), so every value
+    occurring more than error times is kept.
+    """
+
+    def __init__(self, capacity: int):
+        import pandas as pd
+
+        if capacity < 1:
+            raise ValueError("Misra-Gries capacity must be at least 1")
+        self.capacity = capacity
+        self.counters = pd.Series(dtype="int64")
+        self.n = 0
+        self.error = 0
+
+    def update(self, values):
+        """Add a batch of values (nulls are skipped); values are kept as strings"""
+        import pandas as pd
+
+        values = pd.Series(values).dropna()
+        self.n += len(values)
+        self._add(values.astype(str).value_counts())
+
+    def _add(self, counts):
+        combined = self.counters.add(counts, fill_value=0).astype("int64")
+        if len(combined) > self.capacity:
+            # Subtract the (capacity + 1)-th largest count from every counter
+            cut = int(combined.nlargest(self.capacity + 1).iloc[-1])
+            combined = combined[combined > cut] - cut
+            self.error += cut
+        self.counters = combined
+
+    def merge(self, other: "MisraGries") -> "MisraGries":
+        if other.capacity != self.capacity:
+            raise ValueError("Cannot merge Misra-Gries summaries of different capacity")
+        self.n += other.n
+        self.error += other.error
+        self._add(other.counters)
+        return self
+
+    def top(self, count: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(value, estimated count) of the heaviest values, most frequent first"""
+        entries = sorted(self.counters.items(), key=lambda entry: (-entry[1], entry[0]))
+        return [(value, int(estimate)) for value, estimate in entries[:count]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "n": self.n,
+            "error": self.error,
+            "counters": {str(value): int(count) for value, count in self.counters.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MisraGries":
+        import pandas as pd
+
+        sketch = cls(data["capacity"])
+        sketch.n, sketch.error = data["n"], data["error"]
+        sketch.counters = pd.Series(data["counters"], dtype="int64")
+        return sketch
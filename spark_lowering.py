@@ -0,0 +1,790 @@
+"""
+Lower a compiled mapping DAG (see mapping_compiler.py) to a Spark logical plan
+
+Every instance becomes a DataFrame transformation; chaining them in topological
+order yields one lazily evaluated plan per target that Catalyst optimizes as a
+whole.
+"""
+
+import re
+import warnings
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql.functions import col, row_number, to_timestamp
+from pyspark.sql import functions as F
+from pyspark.sql.types import (
+    BooleanType, DataType, DateType, DecimalType, DoubleType, IntegerType, LongType,
+    NumericType, StringType, StructField, StructType, TimestampType,
+)
+from pyspark.sql.window import Window
+
+from expression_translator import apply_program, compile_expressions
+from flat_file import (
+    FixedWidthField, charset, datetime_format, fixed_width_fields, int_attribute, is_fixed_width,
+    null_character, separator,
+)
+from mapping_compiler import (
+    AGGREGATOR, EXPRESSION, SORTER, SOURCE_DEFINITION, SOURCE_QUALIFIER, TARGET_DEFINITION,
+    CompiledMapping, MappingGraph, Node, Port,
+)
+from staging import is_staged
+
+_STRING_TYPES = {"string", "nstring", "varchar", "varchar2", "nvarchar", "char", "nchar", "text", "ntext", "clob"}
+_DATETIME_TYPES = {"date/time", "datetime", "timestamp"}
+_FLOAT_TYPES = {"double", "float", "real"}
+
+
+def spark_type(datatype: str, precision: int = 0, scale: int = 0) -> DataType:
+    """Map an Informatica / flat-file / relational datatype to a Spark type"""
+    datatype = (datatype or "string").lower()
+    if datatype in _STRING_TYPES:
+        return StringType()
+    if datatype in _DATETIME_TYPES:
+        return TimestampType()
+    if datatype == "date":
+        return DateType()
+    if datatype in ("integer", "int", "small integer", "smallint"):
+        return IntegerType()
+    if datatype == "bigint":
+        return LongType()
+    if datatype in _FLOAT_TYPES:
+        return DoubleType()
+    if datatype in ("number", "decimal", "numeric"):
+        if scale == 0 and 0 < precision <= 9:
+            return IntegerType()
+        if scale == 0 and 0 < precision <= 18:
+            return LongType()
+        return DecimalType(min(precision or 38, 38), min(scale, 38))
+    return StringType()
+
+
+def port_type(port: Port) -> DataType:
+    return spark_type(port.datatype, port.precision, port.scale)
+
+
+# QUOTE_CHARACTER -> CSV quote option; NUL disables quoting
+_QUOTES = {"NONE": "\u0000", "SINGLE": "'", "DOUBLE": '"'}
+
+
+def _decimal_locale(node: Node) -> Optional[str]:
+    """Locale whose number format matches the source's Decimal Separator"""
+    if separator(node.attributes.get("Decimal Separator")) == ",":
+        return "de-DE"
+    return None  # Default en-US: '.' decimals, ',' grouping is stripped by Spark
+
+
+def reader_timestamp_format(node: Node) -> Optional[str]:
+    """
+    The CSV reader takes a single timestampFormat; use the pattern shared by
+    most datetime fields. Fields with another pattern are parsed afterwards.
+    """
+    formats = [datetime_format(node, port) for port in node.ports
+               if isinstance(port_type(port), (TimestampType, DateType))]
+    formats = [pattern for pattern in formats if pattern]
+    return Counter(formats).most_common(1)[0][0] if formats else None
+
+
+def _read_type(node: Node, port: Port, timestamp_format: Optional[str]) -> DataType:
+    """Type the reader parses a field with; fields that need a fix-up are read as text"""
+    datatype = port_type(port)
+    if isinstance(datatype, (TimestampType, DateType)):
+        return datatype if datetime_format(node, port) in ("", timestamp_format) else StringType()
+    if isinstance(datatype, (IntegerType, LongType)) and separator(node.attributes.get("Thousand Separator")):
+        # Grouped integers parse through the decimal locale, then get cast
+        return DecimalType(38, 0)
+    return datatype
+
+
+def source_schema(node: Node) -> StructType:
+    """Schema the flat-file reader parses a source definition with"""
+    timestamp_format = reader_timestamp_format(node)
+    return StructType([
+        StructField(port.name, _read_type(node, port, timestamp_format), port.nullable)
+        for port in node.ports
+    ])
+
+
+def flatfile_options(node: Node) -> Dict[str, str]:
+    """
+    Map the FLATFILE element and source attributes of a delimited source to
+    Spark CSV reader options, so nulls, quoting, encoding, datetimes and
+    decimals are handled once, while parsing.
+
+    The reader skips at most one header line; SKIPROWS above 1 is handled
+    after parsing by _skip_leading_rows, at the cost of a second scan of the
+    input (with a warning), and is rejected for streams.
+    """
+    flatfile = node.flatfile
+    delimiters = flatfile.get("DELIMITERS", ",")
+    if len(delimiters) > 1 and flatfile.get("MULTIDELIMITERSASAND", "NO") != "YES":
+        raise ValueError(f"Source '{node.name}' splits on any of the delimiters {delimiters!r}, "
+                         "which the CSV reader does not support")
+    if flatfile.get("CONSECDELIMITERSASONE", "NO") == "YES":
+        raise ValueError(f"Source '{node.name}' treats consecutive delimiters as one, "
+                         "which the CSV reader does not support")
+
+    quote_character = flatfile.get("QUOTE_CHARACTER", "NONE")
+    quote = _QUOTES.get(quote_character.upper(), quote_character)
+    options = {
+        "sep": delimiters,
+        "header": "true" if int_attribute(flatfile, "SKIPROWS") == 1 else "false",
+        "quote": quote,
+        # Without an escape character a doubled quote is the only escape
+        "escape": flatfile.get("ESCAPE_CHARACTER") or (quote if quote != "\u0000" else "\\"),
+        "encoding": charset(node),
+        "ignoreLeadingWhiteSpace": "false",
+        "ignoreTrailingWhiteSpace": "true" if flatfile.get("STRIPTRAILINGBLANKS", "NO") == "YES" else "false",
+        "mode": "PERMISSIVE",
+    }
+
+    null_value = null_character(flatfile)
+    if null_value:
+        options["nullValue"] = null_value
+
+    row_delimiter = int_attribute(flatfile, "ROWDELIMITER")
+    if row_delimiter not in (0, 10):
+        options["lineSep"] = chr(row_delimiter)
+
+    timestamp_format = reader_timestamp_format(node)
+    if timestamp_format:
+        options["timestampFormat"] = timestamp_format
+        options["dateFormat"] = timestamp_format
+
+    locale = _decimal_locale(node)
+    if locale:
+        options["locale"] = locale
+    return options
+
+
+# ---------------------------------------------------------------------------
+# Per-instance lowering
+# ---------------------------------------------------------------------------
+
+def _skip_leading_rows(df: DataFrame, node: Node, skip_rows: int) -> DataFrame:
+    """
+    Drop the first skip_rows records of every file (the reader can only skip
+    one header line). Row ids are consecutive within the split that starts
+    each file, so a record is skipped when it lies in that split and fewer
+    than skip_rows ids after the split's first id.
+
+    Finding each file's first id scans the input a second time (an aggregate
+    on the file name, broadcast joined back), so this warns.
+    """
+    warnings.warn(f"Source '{node.name}' skips {skip_rows} leading rows per file, "
+                  "which the reader cannot do; they are dropped after an extra scan of the input")
+    columns = df.columns
+    numbered = df.select(
+        "*",
+        F.input_file_name().alias("__file"),
+        F.input_file_block_start().alias("__block"),
+        F.monotonically_increasing_id().alias("__row"),
+    )
+    first_rows = numbered.where(col("__block") == 0).groupBy("__file").agg(F.min("__row").alias("__first"))
+    kept = numbered.join(F.broadcast(first_rows), "__file", "left").where(
+        (col("__block") != 0) | (col("__row") - col("__first") >= skip_rows)
+    )
+    return kept.select(*columns)
+
+
+def _read_records(spark: SparkSession, node: Node, path: str) -> DataFrame:
+    """
+    Records of a fixed-width file as raw bytes in a single 'value' column. The
+    text source splits lines without decoding them, so the cast to binary
+    returns the file's bytes in any single-byte or ASCII-compatible code page.
+    """
+    encoding = charset(node)
+    if encoding.upper().startswith("UTF-16"):
+        raise ValueError(f"Fixed-width source '{node.name}' uses {encoding}, which has no byte-level line splitting")
+    reader = spark.read
+    row_delimiter = int_attribute(node.flatfile, "ROWDELIMITER")
+    if row_delimiter not in (0, 10):
+        reader = reader.option("lineSep", chr(row_delimiter))
+    return reader.text(path).select(col("value").cast("binary").alias("value"))
+
+
+# Patterns a plain cast parses; it is several times faster than to_timestamp with a formatter
+_CAST_DATETIME_PATTERNS = {
+    "yyyy-MM-dd", "yyyy-MM-dd HH:mm:ss", "yyyy-MM-dd HH:mm:ss.SSS", "yyyy-MM-dd HH:mm:ss.SSSSSS",
+}
+
+
+def _fixed_width_column(node: Node, field: FixedWidthField):
+    """substring -> decode -> trim -> null check -> typed value for one fixed-width field"""
+    port = field.port
+    encoding = charset(node)
+    sliced = F.substring(col("value"), field.offset + 1, field.length)
+    # Spark strings are UTF-8, so UTF-8 and ASCII bytes need no conversion
+    raw = sliced.cast("string") if encoding.upper() in ("UTF-8", "US-ASCII") else F.decode(sliced, encoding)
+    datatype = port_type(port)
+
+    if isinstance(datatype, StringType):
+        typed = F.rtrim(raw) if node.flatfile.get("STRIPTRAILINGBLANKS", "NO") == "YES" else raw
+        null_char = null_character(node.flatfile)
+        if null_char:
+            # A field filled with the null character is null
+            quoted = f"\\Q{null_char}\\E"
+            typed = F.when(raw.rlike(f"^ *{quoted}( |{quoted})*$"), F.lit(None)).otherwise(typed)
+        return typed.alias(port.name)
+
+    # Casts trim blanks, and a field of null characters does not parse
+    if isinstance(datatype, (TimestampType, DateType)):
+        pattern = datetime_format(node, port)
+        if not pattern or pattern in _CAST_DATETIME_PATTERNS:
+            typed = raw.cast(datatype)
+        elif isinstance(datatype, TimestampType):
+            typed = to_timestamp(F.trim(raw), pattern)
+        else:
+            typed = F.to_date(F.trim(raw), pattern)
+    else:
+        number = raw
+        thousands = separator(node.attributes.get("Thousand Separator"))
+        decimal = separator(node.attributes.get("Decimal Separator")) or "."
+        if thousands:
+            number = F.translate(number, thousands, "")
+        if decimal != ".":
+            number = F.translate(number, decimal, ".")
+        typed = number.cast(datatype)
+    return typed.alias(port.name)
+
+
+def read_fixed_width(spark: SparkSession, node: Node, path: str) -> DataFrame:
+    """
+    Fixed-width Source Definition: read records as bytes, then slice, decode,
+    trim and type every field in one projection of substring expressions.
+
+    Slicing the binary record keeps PHYSICALOFFSET/PHYSICALLENGTH byte exact
+    and O(1) per field; substring on a string has to walk its UTF-8 characters.
+    """
+    fields = fixed_width_fields(node)
+    records = _read_records(spark, node, path)
+    skip_rows = int_attribute(node.flatfile, "SKIPROWS")
+    if skip_rows:
+        records = _skip_leading_rows(records, node, skip_rows)
+    return records.select(*[_fixed_width_column(node, field) for field in fields])
+
+
+def read_source(spark: SparkSession, node: Node, path: str) -> DataFrame:
+    """
+    Source Definition: parse the flat file once, with the declared types.
+    A staged upload (.parquet) is read as is.
+
+    Nulls, quoting, encoding, the common datetime pattern and the decimal
+    locale are reader options (see flatfile_options); only datetime fields
+    with a different pattern and grouped integers need a projection.
+    """
+    flatfile = node.flatfile
+    if is_staged(path):
+        # Typed Parquet written from this reader's output (see staging.py)
+        return spark.read.parquet(path)
+    if is_fixed_width(node):
+        return read_fixed_width(spark, node, path)
+
+    options = flatfile_options(node)
+    schema = source_schema(node)
+    reader = spark.read.options(**options).schema(schema)
+
+    df = reader.csv(path)
+    skip_rows = int_attribute(flatfile, "SKIPROWS")
+    if skip_rows > 1:
+        df = _skip_leading_rows(df, node, skip_rows)
+    return _declared_types(node, schema, df)
+
+
+def write_staged(spark: SparkSession, node: Node, source_path: str, path: str,
+                 partitions: Optional[int] = None) -> None:
+    """
+    Parse source_path with read_source and write it as a staging file (see
+    staging.py), optionally in a given number of files.
+
+    The file is written with microsecond timestamps: INT96, Spark's default,
+    has no footer min/max for the staged stats and timestamp pushdown. The
+    type is a session setting, not a writer option, so the write runs in a
+    child session and leaves spark's own settings alone.
+    """
+    staging = spark.newSession()
+    # A new session starts from the SparkConf; keep runtime settings the parse depends on
+    staging.conf.set("spark.sql.session.timeZone", spark.conf.get("spark.sql.session.timeZone"))
+    staging.conf.set("spark.sql.parquet.outputTimestampType", "TIMESTAMP_MICROS")
+    df = read_source(staging, node, source_path)
+    if partitions:
+        df = df.repartition(partitions)
+    df.write.parquet(path)
+
+
+def read_source_stream(spark: SparkSession, node: Node, directory: str,
+                       max_files_per_trigger: Optional[int] = None) -> DataFrame:
+    """
+    Source Definition as a stream: every delimited file that lands in
+    directory is parsed like read_source() parses one file, new files being
+    picked up by each micro-batch (at most max_files_per_trigger of them).
+    """
+    if is_fixed_width(node):
+        raise ValueError(f"Fixed-width source '{node.name}' cannot be streamed")
+    if int_attribute(node.flatfile, "SKIPROWS") > 1:
+        raise ValueError(f"Source '{node.name}' skips several leading rows, which a stream cannot do per file")
+    schema = source_schema(node)
+    reader = spark.readStream.options(**flatfile_options(node)).schema(schema)
+    if max_files_per_trigger:
+        reader = reader.option("maxFilesPerTrigger", max_files_per_trigger)
+    return _declared_types(node, schema, reader.csv(directory))
+
+
+def _declared_types(node: Node, schema: StructType, df: DataFrame) -> DataFrame:
+    """Parse the fields the reader could not type itself (datetimes in another pattern)"""
+    fixups = {}
+    for port, read_field in zip(node.ports, schema.fields):
+        declared = port_type(port)
+        if read_field.dataType == declared:
+            continue
+        column = col(port.name)
+        if isinstance(declared, TimestampType):
+            column = to_timestamp(column, datetime_format(node, port))
+        elif isinstance(declared, DateType):
+            column = F.to_date(column, datetime_format(node, port))
+        fixups[port.name] = column.cast(declared).alias(port.name)
+    if not fixups:
+        return df
+    return df.select(*[fixups.get(name, col(name)) for name in df.columns])
+
+
+def connect(graph: MappingGraph, node: Node, frames: Dict[str, DataFrame]) -> DataFrame:
+    """Project the connected upstream ports onto this instance's input port names"""
+    edges = graph.inputs_of(node.name)
+    upstream = {edge.from_instance for edge in edges}
+    if len(upstream) != 1:
+        raise ValueError(
+            f"Instance '{node.name}' ({node.kind}) has {len(upstream)} upstream instances; "
+            "only single-input transformations are supported"
+        )
+    frame = frames[upstream.pop()]
+    if [edge.from_field for edge in edges] == frame.columns and all(
+            edge.from_field == edge.to_field for edge in edges):
+        return frame  # Identity projection, keep the plan flat
+    return frame.select(*[col(edge.from_field).alias(edge.to_field) for edge in edges])
+
+
+def _cast_ports(df: DataFrame, ports: List[Port]) -> DataFrame:
+    return df.select(*[col(port.name).cast(port_type(port)).alias(port.name) for port in ports])
+
+
+def lower_source_qualifier(graph: MappingGraph, node: Node, df: DataFrame, **options) -> DataFrame:
+    """Source Qualifier: cast connected fields to the qualifier port types"""
+    ports = [port for port in node.output_ports if port.name in df.columns]
+    return _cast_ports(df, ports)
+
+
+def lower_expression(graph: MappingGraph, node: Node, df: DataFrame, **options) -> DataFrame:
+    """
+    Expression: translate every port expression to a native Column (see
+    expression_translator.py) and compute all output ports in one projection.
+    Subexpressions shared between ports are computed once in hidden columns.
+    """
+    program = compile_expressions(node, options.get("parameters"))
+    df, outputs = apply_program(df, program)
+    return df.select(*[outputs[port.name].cast(port_type(port)).alias(port.name) for port in node.output_ports])
+
+
+def sort_columns(node: Node, rename: Optional[Dict[str, str]] = None,
+                 keys: Optional[List[Port]] = None) -> list:
+    """Sort expressions for a Sorter's keys, honoring direction and 'Null Treated Low'"""
+    rename = rename or {}
+    nulls_low = node.attributes.get("Null Treated Low", "NO") == "YES"
+    expressions = []
+    for port in (node.ports if keys is None else keys):
+        if not port.is_sort_key:
+            continue
+        column = col(rename.get(port.name, port.name))
+        if port.sort_direction == "DESCENDING":
+            expressions.append(column.desc_nulls_last() if nulls_low else column.desc_nulls_first())
+        else:
+            expressions.append(column.asc_nulls_first() if nulls_low else column.asc_nulls_last())
+    return expressions
+
+
+def lower_sorter(graph: MappingGraph, node: Node, df: DataFrame, **options) -> DataFrame:
+    """
+    Sorter: global sort on the key ports, optionally distinct.
+
+    A Sorter fused into its Aggregator (see fuse_sorted_aggregation) is a
+    pass-through; the Aggregator orders rows within each group instead.
+    """
+    if node.fused_into:
+        return df
+    if node.attributes.get("Distinct", "NO") == "YES":
+        df = df.dropDuplicates()
+    if df.isStreaming:
+        # A stream has no global order; a downstream Aggregator orders each group by these keys itself
+        return df
+    return df.orderBy(*sort_columns(node))
+
+
+_AGGREGATE_CALL = re.compile(r"^\s*([A-Za-z_]+)\s*\(\s*([A-Za-z_$][A-Za-z0-9_$]*)\s*\)\s*$")
+
+_AGGREGATE_FUNCTIONS = {
+    "SUM": F.sum,
+    "AVG": F.avg,
+    "MIN": F.min,
+    "MAX": F.max,
+    "COUNT": F.count,
+    "MEDIAN": F.median,
+    "FIRST": lambda column: F.first(column, ignorenulls=False),
+    "LAST": lambda column: F.last(column, ignorenulls=False),
+}
+
+
+def parse_aggregate(expression: str):
+    """Split 'FUNC(port)' into (FUNC, port); returns None for anything else"""
+    match = _AGGREGATE_CALL.match(expression or "")
+    if not match or match.group(1).upper() not in _AGGREGATE_FUNCTIONS:
+        return None
+    return match.group(1).upper(), match.group(2)
+
+
+def group_by_ports(node: Node) -> List[str]:
+    return [port.name for port in node.ports if port.expression_type == "GROUPBY"]
+
+
+def input_sort_keys(graph: MappingGraph, node: Node) -> List[Tuple[str, bool, bool]]:
+    """
+    Row order an Aggregator sees as (column, descending, nulls_first) triples,
+    taken from the upstream Sorter's keys and renamed through the connectors
+    onto the aggregator's ports.
+
+    Group-by keys are dropped (they are constant within a group) and the
+    DESCENDING keys lead, so FIRST() picks the most recent record per group
+    with the remaining keys as deterministic tie-breakers. This matches the
+    session's MERGE Post SQL (ROW_NUMBER() ... ORDER BY Last_Updated_Timestamp DESC).
+    """
+    upstream = [graph.nodes[name] for name in graph.upstream(node.name)]
+    sorters = [up for up in upstream if up.kind == SORTER]
+    if not sorters:
+        return []
+    sorter = sorters[0]
+    nulls_low = sorter.attributes.get("Null Treated Low", "NO") == "YES"
+    rename = {edge.from_field: edge.to_field for edge in graph.inputs_of(node.name)}
+    groups = set(group_by_ports(node))
+    keys = [port for port in sorter.ports
+            if port.is_sort_key and rename.get(port.name, port.name) not in groups]
+    keys.sort(key=lambda port: port.sort_direction != "DESCENDING")
+    # Same null placement as sort_columns()
+    return [(rename.get(port.name, port.name),
+             port.sort_direction == "DESCENDING",
+             nulls_low != (port.sort_direction == "DESCENDING"))
+            for port in keys]
+
+
+def input_order(graph: MappingGraph, node: Node) -> list:
+    """Sort expressions for input_sort_keys()"""
+    return [_key_order(*key) for key in input_sort_keys(graph, node)]
+
+
+# ---------------------------------------------------------------------------
+# Dedup strategies: keep the first row per group in input order
+# ---------------------------------------------------------------------------
+
+def _dedup_window(df: DataFrame, groups: List[str], keys: List[Tuple[str, bool, bool]]) -> DataFrame:
+    """row_number() over each group; sorts every group partition in full"""
+    order = [_key_order(*key) for key in keys]
+    window_spec = Window.partitionBy(*groups).orderBy(*(order or [col(name) for name in groups]))
+    return df.withColumn("__rn", row_number().over(window_spec)).filter(col("__rn") == 1).drop("__rn")
+
+
+def _key_order(name: str, descending: bool, nulls_first: bool):
+    column = col(name)
+    if descending:
+        return column.desc_nulls_first() if nulls_first else column.desc_nulls_last()
+    return column.asc_nulls_first() if nulls_first else column.asc_nulls_last()
+
+
+def _ascending_key(df: DataFrame, name: str, descending: bool, nulls_first: bool) -> List:
+    """
+    Struct fields whose ascending order equals the key's order: a null flag
+    followed by the value, negated for DESCENDING keys.
+    """
+    column = col(name)
+    flag = column.isNotNull() if nulls_first else column.isNull()
+    if not descending:
+        return [flag, column]
+    datatype = df.schema[name].dataType
+    if isinstance(datatype, TimestampType):
+        value = -F.unix_micros(column)
+    elif isinstance(datatype, DateType):
+        value = -F.unix_date(column)
+    elif isinstance(datatype, BooleanType):
+        value = ~column
+    elif isinstance(datatype, NumericType):
+        value = -column
+    else:
+        raise ValueError(f"DESCENDING key '{name}' of type {datatype.simpleString()} "
+                         f"is not supported by the max_by dedup strategy")
+    return [flag, value]
+
+
+def _dedup_max_by(df: DataFrame, groups: List[str], keys: List[Tuple[str, bool, bool]]) -> DataFrame:
+    """
+    groupBy().agg(min_by(struct(row), struct(order keys))): a partial aggregate
+    that combines duplicates map-side before the shuffle, so the shuffle only
+    carries one row per group and map task.
+    """
+    payload = [name for name in df.columns if name not in groups]
+    order_fields = []
+    for index, (name, descending, nulls_first) in enumerate(keys):
+        for position, value in enumerate(_ascending_key(df, name, descending, nulls_first)):
+            order_fields.append(value.alias(f"k{index}_{position}"))
+    if not order_fields:
+        order_fields = [F.lit(0).alias("k")]
+    picked = df.groupBy(*groups).agg(
+        F.min_by(F.struct(*[col(name) for name in payload]), F.struct(*order_fields)).alias("__row")
+    )
+    return picked.select(*[col(name) for name in groups], *[col(f"__row.{name}").alias(name) for name in payload])
+
+
+def _dedup_sorted_partitions(df: DataFrame, groups: List[str], keys: List[Tuple[str, bool, bool]]) -> DataFrame:
+    """
+    repartition(groups) + sortWithinPartitions(groups, order keys), then a
+    streaming pass over Arrow batches that keeps the first row of each run of
+    equal group keys. No window buffer is materialized.
+    """
+    order = [_key_order(*key) for key in keys]
+    sorted_df = df.repartition(*groups).sortWithinPartitions(*[col(name) for name in groups], *order)
+
+    def first_per_group(batches):
+        previous = None
+        for batch in batches:
+            if batch.empty:
+                continue
+            group_keys = batch[groups]
+            shifted = group_keys.shift()
+            if previous is not None:
+                shifted.iloc[0] = previous
+            same = (group_keys == shifted) | (group_keys.isna() & shifted.isna())
+            changed = ~same.all(axis=1)
+            if previous is None:
+                changed.iloc[0] = True
+            previous = group_keys.iloc[-1]
+            yield batch[changed.values]
+
+    return sorted_df.mapInPandas(first_per_group, schema=df.schema)
+
+
+DEDUP_STRATEGIES = {
+    "window": _dedup_window,
+    "max_by": _dedup_max_by,
+    "sort_within_partitions": _dedup_sorted_partitions,
+}
+
+DEFAULT_DEDUP_STRATEGY = "window"
+
+
+def dedup_first(df: DataFrame, groups: List[str], keys: List[Tuple[str, bool, bool]],
+                strategy: Optional[str] = None) -> DataFrame:
+    """Keep the first row of every group in key order using one of DEDUP_STRATEGIES"""
+    strategy = strategy or DEFAULT_DEDUP_STRATEGY
+    if strategy not in DEDUP_STRATEGIES:
+        raise ValueError(f"Unknown dedup strategy '{strategy}'; expected one of {', '.join(DEDUP_STRATEGIES)}")
+    return DEDUP_STRATEGIES[strategy](df, groups, keys)
+
+
+class _Descending:
+    """Sort key wrapper reversing the order of a DESCENDING key's values"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def _order_value(value):
+    """A key value in a JSON-safe form with the same order: timestamps as epoch nanoseconds, dates in ISO format"""
+    import pandas as pd
+
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return pd.Timestamp(value).value
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Tie-breakers only; float order is exact up to 15 significant digits
+        return float(value)
+    return value.item() if hasattr(value, "item") else value
+
+
+def _row_order(values: List, keys: List[Tuple[str, bool, bool]]) -> Tuple:
+    """Ascending sort key of a row's order key values (see _order_value) under keys"""
+    order = []
+    for value, (_, descending, nulls_first) in zip(values, keys):
+        if value is None:
+            order.append((0 if nulls_first else 2, None))
+        else:
+            order.append((1, _Descending(value) if descending else value))
+    return tuple(order)
+
+
+def dedup_first_stream(df: DataFrame, groups: List[str], keys: List[Tuple[str, bool, bool]]) -> DataFrame:
+    """
+    Streaming dedup: the first row of every group in key order so far,
+    emitted whenever a micro-batch brings a row that comes before the one
+    emitted last (the output is a stream of upserts, one row per group and
+    batch). The state is each group's emitted key values, kept in
+    applyInPandasWithState until the watermark of the stream's event-time
+    column passes the group's latest event time; rows older than the
+    watermark are dropped, which keeps the state bounded.
+    """
+    import json
+
+    import pandas as pd
+    from pyspark.sql.streaming.state import GroupStateTimeout
+
+    event_time = df.schema[keys[0][0]] if keys else None
+    if event_time is None or not isinstance(event_time.dataType, (TimestampType, DateType)) or \
+            not event_time.metadata.get("spark.watermarkDelayMs"):
+        raise ValueError("Streaming dedup needs its leading order key to be an event-time column with a watermark")
+    key_names = [name for name, _, _ in keys]
+    columns = df.columns
+
+    def first_per_group(group, frames, state):
+        if state.hasTimedOut:
+            state.remove()
+            return
+        watermark = state.getCurrentWatermarkMs()
+        emitted, event_ms = (json.loads(state.get[0]), state.get[1]) if state.exists else (None, None)
+        best, best_order = None, _row_order(emitted, keys) if emitted is not None else None
+        for frame in frames:
+            for row in frame[frame["__event_ms"].isna() | (frame["__event_ms"] >= watermark)].to_dict("records"):
+                values = [_order_value(row[name]) for name in key_names]
+                order = _row_order(values, keys)
+                if best_order is None or order < best_order:
+                    best, best_order, emitted = row, order, values
+                    event_ms = row["__event_ms"] if pd.notna(row["__event_ms"]) else event_ms
+        if best is not None:
+            state.update((json.dumps(emitted), None if event_ms is None else int(event_ms)))
+            yield pd.DataFrame([{name: best[name] for name in columns}], columns=columns)
+        if state.exists:
+            # Forget the group once the watermark passes its latest event time
+            state.setTimeoutTimestamp(max(int(state.get[1] or 0), watermark + 1))
+
+    timed = df.withColumn("__event_ms", F.unix_millis(col(event_time.name).cast("timestamp")))
+    return timed.groupBy(*groups).applyInPandasWithState(
+        first_per_group,
+        outputStructType=df.schema,
+        stateStructType=StructType([StructField("keys", StringType()), StructField("event_ms", LongType())]),
+        outputMode="update",
+        timeoutConf=GroupStateTimeout.EventTimeTimeout,
+    )
+
+
+def lower_aggregator(graph: MappingGraph, node: Node, df: DataFrame, **options) -> DataFrame:
+    """
+    Aggregator: group by the GROUPBY ports.
+
+    When every output is FIRST(...) or a pass-through port the aggregator picks
+    one row per group, which is lowered through dedup_first() with the
+    'dedup_strategy' option (default: row_number() over the input order).
+    Other aggregates are lowered to groupBy().agg().
+    """
+    groups = group_by_ports(node)
+    outputs = [port for port in node.output_ports if port.name not in groups]
+    calls = {port.name: parse_aggregate(port.expression) for port in outputs if not port.is_input}
+
+    for name, call in calls.items():
+        if call is None:
+            port = node.port(name)
+            raise ValueError(f"Aggregate expression '{port.expression}' on port {node.name}.{name} is not supported")
+
+    if all(call[0] == "FIRST" for call in calls.values()):
+        if df.isStreaming:
+            picked = dedup_first_stream(df, groups, input_sort_keys(graph, node))
+        else:
+            picked = dedup_first(df, groups, input_sort_keys(graph, node), options.get("dedup_strategy"))
+        projection = [col(name) for name in groups]
+        for port in outputs:
+            source = port.name if port.is_input else calls[port.name][1]
+            projection.append(col(source).cast(port_type(port)).alias(port.name))
+        return picked.select(*projection)
+
+    aggregates = []
+    for port in outputs:
+        if port.is_input:
+            # Informatica returns the last row's value for non-aggregated ports
+            aggregates.append(F.last(col(port.name)).cast(port_type(port)).alias(port.name))
+        else:
+            function, argument = calls[port.name]
+            aggregates.append(_AGGREGATE_FUNCTIONS[function](col(argument)).cast(port_type(port)).alias(port.name))
+    return df.groupBy(*groups).agg(*aggregates)
+
+
+def lower_target(graph: MappingGraph, node: Node, df: DataFrame, **options) -> DataFrame:
+    """Target Definition: cast connected fields to the target column types"""
+    ports = [port for port in node.ports if port.name in df.columns]
+    return _cast_ports(df, ports)
+
+
+LOWERINGS = {
+    SOURCE_QUALIFIER: lower_source_qualifier,
+    EXPRESSION: lower_expression,
+    SORTER: lower_sorter,
+    AGGREGATOR: lower_aggregator,
+    TARGET_DEFINITION: lower_target,
+}
+
+
+def lower_node(graph: MappingGraph, node: Node, frames: Dict[str, DataFrame],
+               options: Optional[Dict[str, Any]] = None) -> DataFrame:
+    """
+    Lower one non-source instance given the DataFrames of its upstream instances.
+
+    options are passed to every lowering as keyword arguments (e.g. dedup_strategy).
+    """
+    if node.kind not in LOWERINGS:
+        raise ValueError(f"Transformation type '{node.kind}' ({node.name}) is not supported")
+    return LOWERINGS[node.kind](graph, node, connect(graph, node, frames), **(options or {}))
+
+
+def _source_path(node: Node, source_paths: Union[str, Dict[str, str]]) -> str:
+    if isinstance(source_paths, str):
+        return source_paths
+    for key in (node.name, node.definition):
+        if key in source_paths:
+            return source_paths[key]
+    raise ValueError(f"No input path given for source '{node.name}'")
+
+
+def build_plans(compiled: CompiledMapping,
+                spark: SparkSession,
+                source_paths: Union[str, Dict[str, str]],
+                options: Optional[Dict[str, Any]] = None) -> Dict[str, DataFrame]:
+    """Lower the whole mapping; returns one DataFrame per target instance"""
+    graph = compiled.graph
+    frames = {}
+    for name in graph.topological_order():
+        node = graph.nodes[name]
+        if node.kind == SOURCE_DEFINITION:
+            frames[name] = read_source(spark, node, _source_path(node, source_paths))
+        else:
+            frames[name] = lower_node(graph, node, frames, options)
+    return {target.name: frames[target.name] for target in graph.targets}
+
+
+def build_plan(compiled: CompiledMapping,
+               spark: SparkSession,
+               source_paths: Union[str, Dict[str, str]],
+               target: Optional[str] = None,
+               options: Optional[Dict[str, Any]] = None) -> DataFrame:
+    """Lower the pipeline feeding a single target (default: the primary target)"""
+    graph = compiled.graph
+    frames = {}
+    for node in graph.pipeline(target):
+        if node.kind == SOURCE_DEFINITION:
+            frames[node.name] = read_source(spark, node, _source_path(node, source_paths))
+        else:
+            frames[node.name] = lower_node(graph, node, frames, options)
+    return frames[target or graph.primary_target.name]
@@ -0,0 +1,313 @@
+"""
+Columnar staging of uploaded source files
+
+Each upload is parsed once, with the source definition's reader, into a
+typed, compressed Parquet staging file. Runs of either engine and the
+dashboard then read the Parquet file, so Spark and pyarrow prune columns
+and push filters down to row groups instead of re-parsing the CSV. Staging
+files are keyed by the upload's content hash together with the mapping
+and the engine that typed them. Re-uploading the same bytes therefore
+reuses the staged file. Per-column min/max/null-count statistics are
+collected from the Parquet footers and kept in a JSON sidecar. The cache is
+bounded in size; the least recently used files go first, except files pinned
+by the runs still reading them.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_STAGING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".staging_cache")
+
+STAGED_SUFFIX = ".parquet"
+
+# Bump to invalidate staging files written by older code
+STAGING_VERSION = "1"
+
+# Least recently used staging files are deleted beyond this total size
+DEFAULT_MAX_STAGING_BYTES = 10 * 1024 ** 3
+
+
+@dataclass
+class StagedFile:
+    """A typed Parquet copy of an upload and the statistics of its columns"""
+    key: str
+    path: str
+    engine: str
+    rows: int
+    columns: Dict[str, Dict[str, Any]]
+    source_bytes: int
+    staged_bytes: int
+    staging_seconds: float
+    # Session time zone of a Spark-written file, whose timestamps are stored in UTC
+    timezone: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def is_staged(path: str) -> bool:
+    return path.endswith(STAGED_SUFFIX)
+
+
+def staging_key(content_hash: str, mapping_hash: str, source_name: str, engine: str) -> str:
+    """Key of a staged upload: the same bytes typed by the same source reader"""
+    key = f"{STAGING_VERSION}:{content_hash}:{mapping_hash}:{source_name}:{engine}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def parquet_files(path: str) -> List[str]:
+    """Data files of a Parquet file or of a directory written by Spark"""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "*.parquet")))
+    return [path]
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _min_max(statistics, arrow_type):
+    try:
+        return statistics.min, statistics.max
+    except NotImplementedError:
+        # pyarrow cannot convert decimals stored as INT32/INT64 (Spark's layout
+        # for small precisions); the raw values are the unscaled integers
+        if hasattr(arrow_type, "scale") and isinstance(statistics.min_raw, int):
+            return (Decimal(statistics.min_raw).scaleb(-arrow_type.scale),
+                    Decimal(statistics.max_raw).scaleb(-arrow_type.scale))
+        raise
+
+
+def row_group_stats(file_path: str, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Row count and per-column min, max and null count of every row group of
+    one Parquet file, read from its footer. min and max are None where the
+    writer kept no statistics (or the column is all null).
+    """
+    import pyarrow.parquet as pq
+
+    metadata = pq.ParquetFile(file_path).metadata
+    schema = metadata.schema.to_arrow_schema()
+    row_groups = []
+    for group in range(metadata.num_row_groups):
+        row_group = metadata.row_group(group)
+        entries = {}
+        for index in range(row_group.num_columns):
+            column = row_group.column(index)
+            name = column.path_in_schema
+            if columns is not None and name not in columns:
+                continue
+            entry = entries[name] = {"min": None, "max": None, "null_count": None}
+            statistics = column.statistics
+            if statistics is None:
+                continue
+            if statistics.has_null_count:
+                entry["null_count"] = statistics.null_count
+            if statistics.has_min_max:
+                entry["min"], entry["max"] = _min_max(statistics, schema.field(name).type)
+        row_groups.append({"rows": row_group.num_rows, "columns": entries})
+    return row_groups
+
+
+def column_stats(path: str) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+    """
+    Row count and per-column min, max and null count of a Parquet file or
+    directory, read from the row-group statistics in the footers
+    """
+    import pyarrow.parquet as pq
+
+    rows = 0
+    stats: Dict[str, Dict[str, Any]] = {}
+    for file_path in parquet_files(path):
+        schema = pq.read_schema(file_path)
+        for name in schema.names:
+            stats.setdefault(name, {"type": str(schema.field(name).type), "min": None, "max": None, "null_count": 0})
+        for row_group in row_group_stats(file_path):
+            rows += row_group["rows"]
+            for name, column in row_group["columns"].items():
+                entry = stats[name]
+                entry["null_count"] += column["null_count"] or 0
+                if column["min"] is not None:
+                    entry["min"] = column["min"] if entry["min"] is None else min(entry["min"], column["min"])
+                    entry["max"] = column["max"] if entry["max"] is None else max(entry["max"], column["max"])
+    for entry in stats.values():
+        entry["min"] = _json_value(entry["min"])
+        entry["max"] = _json_value(entry["max"])
+    return rows, stats
+
+
+def read_parquet_pandas(path: str, columns: Optional[List[str]] = None, filters=None,
+                        timezone: Optional[str] = None):
+    """
+    Read a Parquet file or directory into pandas, only the given columns and
+    only the row groups that can match the pyarrow filters (see arrow_to_pandas)
+    """
+    import pyarrow.parquet as pq
+    return arrow_to_pandas(pq.read_table(path, columns=columns, filters=filters), timezone)
+
+
+def arrow_to_pandas(table, timezone: Optional[str] = None):
+    """
+    An Arrow table in pandas. Decimals come back as float64, which is what
+    the pandas engine and the dashboard compute with, and timestamps as the
+    naive wall-clock times Spark itself would show in the session time zone
+    timezone.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    decimals = [i for i, column in enumerate(table.schema) if pa.types.is_decimal(column.type)]
+    for i in decimals:
+        table = table.set_column(i, table.schema.field(i).name, table.column(i).cast(pa.float64()))
+    df = table.to_pandas()
+    for name in df.columns:
+        if isinstance(df[name].dtype, pd.DatetimeTZDtype):
+            df[name] = df[name].dt.tz_convert(timezone or "UTC").dt.tz_localize(None)
+    return df
+
+
+def read_staged_pandas(staged: StagedFile, columns: Optional[List[str]] = None, filters=None):
+    """A staged file in pandas (see read_parquet_pandas)"""
+    return read_parquet_pandas(staged.path, columns, filters, staged.timezone)
+
+
+def _load_sidecar(sidecar: str) -> Optional[StagedFile]:
+    try:
+        with open(sidecar) as handle:
+            return StagedFile(**json.load(handle))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _remove(path: str):
+    """Delete a Parquet file or directory if it exists"""
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+class StagingCache:
+    """Staged uploads on disk, written at most once per key even under concurrent requests"""
+
+    def __init__(self, directory: str = DEFAULT_STAGING_DIR, max_bytes: int = DEFAULT_MAX_STAGING_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        # Keys in use by readers (pin count), which prune() leaves alone
+        self._pins: Dict[str, int] = {}
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + STAGED_SUFFIX)
+
+    def get(self, key: str) -> Optional[StagedFile]:
+        """The staged file for key if it exists; marks it recently used"""
+        sidecar = self.path(key) + ".json"
+        staged = _load_sidecar(sidecar)
+        if staged is not None:
+            os.utime(sidecar)
+        return staged
+
+    def pin(self, key: str):
+        """Keep the staged file of key from being pruned until a matching release()"""
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def release(self, key: str):
+        with self._lock:
+            count = self._pins.get(key, 0) - 1
+            if count > 0:
+                self._pins[key] = count
+            else:
+                self._pins.pop(key, None)
+
+    def is_pinned(self, key: str) -> bool:
+        with self._lock:
+            return key in self._pins
+
+    def prune(self, keep: Optional[str] = None):
+        """
+        Delete least recently used staging files until the cache fits
+        max_bytes, skipping keep and pinned files (Spark reads a staged file
+        lazily, for as long as the run that holds it lasts)
+        """
+        entries = []
+        for sidecar in glob.glob(os.path.join(self.directory, "*" + STAGED_SUFFIX + ".json")):
+            staged = _load_sidecar(sidecar)
+            if staged is not None:
+                entries.append((os.path.getmtime(sidecar), staged))
+        total = sum(staged.staged_bytes for _, staged in entries)
+        for _, staged in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            if staged.key == keep:
+                continue
+            # Checked under the key lock, which stage(pin=True) pins under
+            with self._key_lock(staged.key):
+                if self.is_pinned(staged.key):
+                    continue
+                _remove(staged.path + ".json")
+                _remove(staged.path)
+            total -= staged.staged_bytes
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def stage(self, key: str, source_path: str, engine: str, write: Callable[[str], None],
+              timezone: Optional[str] = None, pin: bool = False) -> StagedFile:
+        """
+        The staged file for key, calling write(path) to produce the Parquet
+        output at a temporary path the first time. With pin, the file is
+        pinned before it is returned; the caller releases it when done.
+        """
+        with self._key_lock(key):
+            staged = self.get(key)
+            if staged is not None and os.path.exists(staged.path):
+                if pin:
+                    self.pin(key)
+                return staged
+
+            start = time.time()
+            os.makedirs(self.directory, exist_ok=True)
+            final_path = self.path(key)
+            temp_path = f"{final_path}.tmp-{uuid.uuid4().hex}{STAGED_SUFFIX}"
+            try:
+                write(temp_path)
+                _remove(final_path)
+                os.replace(temp_path, final_path)
+            finally:
+                _remove(temp_path)
+
+            rows, columns = column_stats(final_path)
+            staged = StagedFile(
+                key=key,
+                path=final_path,
+                engine=engine,
+                rows=rows,
+                columns=columns,
+                source_bytes=os.path.getsize(source_path),
+                staged_bytes=sum(os.path.getsize(file_path) for file_path in parquet_files(final_path)),
+                staging_seconds=round(time.time() - start, 3),
+                timezone=timezone,
+            )
+            with open(final_path + ".json", "w") as handle:
+                json.dump(staged.to_dict(), handle)
+            if pin:
+                self.pin(key)
+        self.prune(keep=key)
+        return staged
@@ -4,6 +4,11 @@
 let businessLogicData = null;
 let uploadedFileInfo = null;
 let executionResults = null;
+let currentJobId = null;
+
+const JOB_POLL_INTERVAL_MS = 1000;
+const FINISHED_JOB_STATES = ['succeeded', 'failed', 'cancelled'];
+const RESULTS_PAGE_SIZE = 100;
 
 // DOM elements
 const uploadArea = document.getElementById('uploadArea');
@@ -212,20 +217,14 @@ async function handleFile(file) {
         return;
     }
     
-    if (file.size > 16 * 1024 * 1024) { // 16MB limit
-        showAlert('error', 'File size must be less than 16MB.');
-        return;
-    }
-    
     try {
         showSpinner('uploadArea');
         
-        const formData = new FormData();
-        formData.append('file', file);
-        
-        const response = await fetch('/api/upload', {
+        // Send the file as the raw body; the server streams it to disk as it arrives
+        const response = await fetch(`/api/upload?filename=${encodeURIComponent(file.name)}`, {
             method: 'POST',
-            body: formData
+            headers: { 'Content-Type': 'text/csv' },
+            body: file
         });
         
         const data = await response.json();
@@ -315,7 +314,7 @@ function enableExecuteButton() {
     executeBtn.classList.add('pulse');
 }
 
-// Execute workflow
+// Execute workflow: submit a run, then poll its job until it finishes
 async function executeWorkflow() {
     if (!uploadedFileInfo) {
         showAlert('error', 'Please upload a test data file first.');
@@ -334,54 +333,132 @@ async function executeWorkflow() {
         
         const data = await response.json();
         
-        if (data.success) {
-            executionResults = data.results;
-            displayExecutionResults(data.results);
-            showAlert('success', data.message);
-        } else {
+        if (!data.success) {
             showAlert('error', 'Execution failed: ' + data.error);
+            return;
+        }
+        
+        currentJobId = data.job_id;
+        const job = await waitForJob(data.job_id);
+        
+        if (job.status === 'succeeded') {
+            const resultResponse = await fetch(`/api/jobs/${job.job_id}/result`);
+            const result = await resultResponse.json();
+            executionResults = result.results;
+            displayExecutionResults(result.results);
+            showAlert('success', result.message);
+        } else if (job.status === 'cancelled') {
+            showAlert('warning', 'Execution cancelled.');
+        } else {
+            showAlert('error', 'Execution failed: ' + job.error);
         }
     } catch (error) {
         console.error('Execution error:', error);
         showAlert('error', 'Execution failed. Please try again.');
     } finally {
+        currentJobId = null;
         executeBtn.disabled = false;
         executeBtn.innerHTML = '<i class="fas fa-play me-2"></i>Run Workflow';
         executeBtn.classList.remove('pulse');
     }
 }
 
+// Poll a job until it reaches a final state
+async function waitForJob(jobId) {
+    while (true) {
+        const response = await fetch(`/api/jobs/${jobId}`);
+        const data = await response.json();
+        
+        if (!data.success) {
+            throw new Error(data.error);
+        }
+        
+        updateExecutionStatus(data.job);
+        if (FINISHED_JOB_STATES.includes(data.job.status)) {
+            return data.job;
+        }
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+}
+
+// Cancel the running job
+async function cancelExecution() {
+    if (!currentJobId) return;
+    
+    try {
+        const response = await fetch(`/api/jobs/${currentJobId}/cancel`, {
+            method: 'POST'
+        });
+        const data = await response.json();
+        if (!data.success) {
+            showAlert('warning', data.error);
+        }
+    } catch (error) {
+        console.error('Cancel error:', error);
+    }
+}
+
 // Show execution status
 function showExecutionStatus() {
     const container = document.getElementById('executionContent');
     const section = document.getElementById('executionStatus');
     
-    const steps = [
-        'Reading source data...',
-        'Applying transformations...',
-        'Sorting and deduplicating...',
-        'Aggregating data...',
-        'Preparing results...'
-    ];
+    container.innerHTML = `
+        <div class="execution-item">
+            <div class="execution-icon">
+                <i class="fas fa-spinner fa-spin status-info"></i>
+            </div>
+            <div class="execution-text">Submitting workflow run...</div>
+        </div>
+    `;
+    section.style.display = 'block';
+}
+
+// Render a job's phase and Spark task progress
+function updateExecutionStatus(job) {
+    const container = document.getElementById('executionContent');
+    const finished = FINISHED_JOB_STATES.includes(job.status);
+    const icon = {
+        'succeeded': 'fa-check-circle status-success',
+        'failed': 'fa-times-circle status-error',
+        'cancelled': 'fa-ban status-warning'
+    }[job.status] || 'fa-spinner fa-spin status-info';
+    
+    let html = `
+        <div class="execution-item">
+            <div class="execution-icon">
+                <i class="fas ${icon}"></i>
+            </div>
+            <div class="execution-text">
+                ${job.phase.charAt(0).toUpperCase() + job.phase.slice(1)}
+                <small class="text-muted ms-2">${job.run_seconds.toFixed(1)}s</small>
+            </div>
+        </div>
+    `;
     
-    let html = '';
-    steps.forEach((step, index) => {
+    if (job.tasks && job.tasks.total > 0) {
+        const percent = Math.round(100 * job.tasks.completed / job.tasks.total);
         html += `
-            <div class="execution-item">
-                <div class="execution-icon">
-                    <i class="fas fa-spinner fa-spin status-info"></i>
-                </div>
-                <div class="execution-text">${step}</div>
+            <div class="progress mb-2" style="height: 8px;">
+                <div class="progress-bar" role="progressbar" style="width: ${percent}%"></div>
             </div>
+            <small class="text-muted">${job.tasks.completed} / ${job.tasks.total} Spark tasks</small>
         `;
-    });
+    }
+    
+    if (!finished) {
+        html += `
+            <button class="btn btn-outline-danger btn-sm mt-2" onclick="cancelExecution()">
+                <i class="fas fa-stop me-1"></i>Cancel
+            </button>
+        `;
+    }
     
     container.innerHTML = html;
-    section.style.display = 'block';
 }
 
 // Display execution results
-function displayExecutionResults(results) {
+function displayExecutionResults(results, scroll = true) {
     const container = document.getElementById('resultsContent');
     const section = document.getElementById('resultsSection');
     
@@ -437,11 +514,14 @@ function displayExecutionResults(results) {
         `;
         
         if (results.total_records > results.data.length) {
+            const loadMore = results.rows_url && results.next_offset !== null
+                ? `<a href="#" onclick="loadMoreResults(); return false;" class="alert-link">Load more rows</a> or `
+                : '';
             html += `
                 <div class="alert alert-info mt-3">
                     <i class="fas fa-info-circle me-2"></i>
                     Showing first ${results.data.length} rows of ${results.total_records} total records.
-                    <a href="#" onclick="downloadResults()" class="alert-link">Download full results</a>.
+                    ${loadMore}<a href="#" onclick="downloadResults('csv'); return false;" class="alert-link">Download full results</a>.
                 </div>
             `;
         }
@@ -449,7 +529,33 @@ function displayExecutionResults(results) {
     
     container.innerHTML = html;
     section.style.display = 'block';
-    section.scrollIntoView({ behavior: 'smooth' });
+    if (scroll) {
+        section.scrollIntoView({ behavior: 'smooth' });
+    }
+}
+
+// Fetch the next page of the stored results and append it to the table
+async function loadMoreResults() {
+    if (!executionResults || executionResults.next_offset === null) {
+        return;
+    }
+    
+    try {
+        const response = await fetch(`${executionResults.rows_url}?offset=${executionResults.next_offset}&limit=${RESULTS_PAGE_SIZE}`);
+        const page = await response.json();
+        
+        if (!page.success) {
+            showAlert('error', 'Could not load more rows: ' + page.error);
+            return;
+        }
+        
+        executionResults.data = executionResults.data.concat(page.data);
+        executionResults.next_offset = page.next_offset;
+        displayExecutionResults(executionResults, false);
+    } catch (error) {
+        console.error('Load more error:', error);
+        showAlert('error', 'Could not load more rows.');
+    }
 }
 
 // Open dashboard
@@ -464,34 +570,19 @@ function openDashboard() {
 }
 
 // Download results
-async function downloadResults() {
+function downloadResults(format = 'csv') {
     if (!executionResults) {
         showAlert('error', 'No results available to download.');
         return;
     }
     
-    try {
-        const response = await fetch('/api/download-results');
-        
-        if (response.ok) {
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = `workflow_results_${new Date().getTime()}.csv`;
-            document.body.appendChild(a);
-            a.click();
-            window.URL.revokeObjectURL(url);
-            document.body.removeChild(a);
-            
-            showAlert('success', 'Results downloaded successfully.');
-        } else {
-            showAlert('error', 'Failed to download results.');
-        }
-    } catch (error) {
-        console.error('Download error:', error);
-        showAlert('error', 'Failed to download results.');
-    }
+    // Let the browser stream the file to disk (and resume it) instead of
+    // buffering the whole result in a blob
+    const a = document.createElement('a');
+    a.href = `/api/download-results?format=${encodeURIComponent(format)}`;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
 }
 
 // Reset workflow
@@ -17,7 +17,7 @@ async function loadDashboardData() {
     try {
         showLoadingModal(true);
         
-        const response = await fetch('/api/dashboard-data');
+        const response = await fetch(`/api/dashboard-data?bins=${encodeURIComponent(binStrategy())}`);
         const result = await response.json();
         
         if (result.success) {
@@ -69,7 +69,12 @@ function updateSummaryCards() {
     document.getElementById('beforeTotalRecords').textContent = summary.before.total_records.toLocaleString();
     document.getElementById('beforeTotalAmount').textContent = `$${summary.before.total_amount.toLocaleString()}`;
     document.getElementById('beforeAvgAmount').textContent = `$${summary.before.avg_amount.toFixed(2)}`;
-    document.getElementById('beforeDuplicates').textContent = (summary.before.total_records - summary.before.unique_transactions).toLocaleString();
+    // Distinct ids do not roll up, so filtered views have none; approximate
+    // profiles estimate them
+    const approximate = filteredData.approximation && filteredData.approximation.before ? '≈ ' : '';
+    document.getElementById('beforeDuplicates').textContent = summary.before.unique_transactions === null
+        ? 'n/a'
+        : approximate + (summary.before.total_records - summary.before.unique_transactions).toLocaleString();
     
     // After cards
     document.getElementById('afterTotalRecords').textContent = summary.after.total_records.toLocaleString();
@@ -577,29 +582,53 @@ function updateDataTables() {
     document.getElementById('comparisonDataTable').innerHTML = '<p class="text-center text-muted">Side-by-side comparison will be shown here</p>';
 }
 
-// Apply filters
-function applyFilters() {
+// Histogram bin strategy picked on the page (equal-width, quantile or log)
+function binStrategy() {
+    return document.getElementById('binStrategy').value;
+}
+
+// Apply filters: the server rolls the metrics up over the pre-aggregated cube
+async function applyFilters() {
     console.log('🔍 Applying filters...');
     
-    // Get filter values
+    const dateRange = dashboardData.summary.before.date_range;
+    const startDate = document.getElementById('startDate').value;
+    const endDate = document.getElementById('endDate').value;
     const filters = {
-        startDate: document.getElementById('startDate').value,
-        endDate: document.getElementById('endDate').value,
-        transactionTypes: Array.from(document.getElementById('transactionTypeFilter').selectedOptions).map(o => o.value),
+        transaction_types: Array.from(document.getElementById('transactionTypeFilter').selectedOptions).map(o => o.value),
         statuses: Array.from(document.getElementById('statusFilter').selectedOptions).map(o => o.value),
         channels: Array.from(document.getElementById('channelFilter').selectedOptions).map(o => o.value),
         branches: Array.from(document.getElementById('branchFilter').selectedOptions).map(o => o.value),
-        searchTerm: document.getElementById('transactionSearch').value
+        // The full date range is no filter
+        start_date: startDate && startDate !== dateRange.start ? startDate : null,
+        end_date: endDate && endDate !== dateRange.end ? endDate : null,
+        min_amount: document.getElementById('minAmountFilter').value || null,
+        max_amount: document.getElementById('maxAmountFilter').value || null
     };
     
-    // Apply filters to data (simplified - in real implementation, this would filter the actual datasets)
-    filteredData = JSON.parse(JSON.stringify(originalData)); // Reset to original
-    
-    // Update all components with filtered data
-    updateSummaryCards();
-    updateAllCharts();
-    
-    showAlert('info', 'Filters applied successfully!');
+    try {
+        const response = await fetch(`/api/dashboard-filter?bins=${encodeURIComponent(binStrategy())}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(filters)
+        });
+        const result = await response.json();
+        
+        if (!result.success) {
+            showAlert('error', result.error || 'Failed to apply filters');
+            return;
+        }
+        filteredData = result.data;
+        
+        // Update all components with filtered data
+        updateSummaryCards();
+        updateAllCharts();
+        
+        showAlert('info', `Filters applied in ${result.elapsed_ms} ms`);
+    } catch (error) {
+        console.error('Error applying filters:', error);
+        showAlert('error', 'Failed to connect to server. Please try again.');
+    }
 }
 
 // Reset filters
@@ -614,6 +643,8 @@ function resetFilters() {
     document.getElementById('channelFilter').selectedIndex = -1;
     document.getElementById('branchFilter').selectedIndex = -1;
     document.getElementById('transactionSearch').value = '';
+    document.getElementById('minAmountFilter').value = '';
+    document.getElementById('maxAmountFilter').value = '';
     
     // Reset data to original
     filteredData = JSON.parse(JSON.stringify(originalData));
@@ -0,0 +1,499 @@
+"""
+SCD Type 1 / CDC merge into a local Parquet target
+
+The session's Post SQL merges each run into the target table (MERGE INTO ...
+WHEN MATCHED THEN UPDATE ... WHEN NOT MATCHED THEN INSERT). MergeTarget does
+the same for a Parquet table on local disk without rewriting all of it. Rows
+are spread over a fixed number of buckets by a hash of the merge key, and a
+merge only looks at the buckets the incoming delta touches. INSERT and
+UPDATE rows of the delta upsert their key, as the MERGE does. DELETE rows
+remove the key, which is an extension: the session's MERGE has no DELETE
+clause and keeps a matched row, updating its Record_Operation.
+
+Within a bucket, rows are clustered (sorted on one column such as
+Transaction_Date or the key, or Z-ordered on several) into files of at most
+file_rows rows, and every file's min/max index and (optional) Bloom filter
+of its keys (see parquet_index.py) is kept in the manifest. A merge only rewrites the files
+that may hold keys of the delta, plus the bucket's small files so inserts do
+not pile up; scan() uses the same index to skip buckets, files and row
+groups that cannot hold the rows asked for.
+
+The files that make up the table are listed in the manifest. A merge writes
+new files under fresh names, then commits by atomically replacing the
+manifest, so readers see either the old version or the new one and a
+crashed merge leaves the table as it was. Files a commit replaces are kept
+for one more version, for readers that loaded the previous manifest, and
+deleted by the next commit.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from parquet_index import file_index, matching_row_groups
+
+DEFAULT_TARGET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".targets")
+
+DEFAULT_TARGET_BUCKETS = 32
+
+# Largest data file of a bucket, and the row groups its files are written in
+DEFAULT_FILE_ROWS = 65_536
+ROW_GROUP_ROWS = 8_192
+
+OPERATION_COLUMN = "Record_Operation"
+DELETE = "DELETE"
+
+MANIFEST = "_manifest.json"
+
+# Buckets rewritten at once by a merge
+MERGE_THREADS = 8
+
+# Bump when the manifest layout changes
+MANIFEST_VERSION = 2
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def _table_lock(path: str) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def merge_key(graph) -> str:
+    """
+    Merge key of a mapping: the GROUPBY port of the Aggregator that keeps one
+    record per key, which is also the key the Post SQL MERGE matches on
+    """
+    for node in graph.pipeline(graph.primary_target.name):
+        keys = [port.name for port in node.ports if port.expression_type == "GROUPBY"]
+        if keys:
+            if len(keys) > 1:
+                raise ValueError(f"Merging on a composite key ({', '.join(keys)}) is not supported")
+            return keys[0]
+    raise ValueError(f"Mapping {graph.name} has no Aggregator key to merge on")
+
+
+def cluster_columns(graph) -> List[str]:
+    """
+    Columns a mapping's target is clustered on: its first date port
+    (Transaction_Date), so date ranges read few row groups, or else the merge
+    key. Key lookups are served by the hash buckets and the files' Bloom
+    filters either way.
+    """
+    key = merge_key(graph)
+    dates = [port.name for port in graph.primary_target.ports
+             if port.datatype in ("date", "date/time", "datetime", "timestamp") and port.name != key]
+    return dates[:1] or [key]
+
+
+def key_hashes(keys):
+    """
+    64-bit hashes of an Arrow array of keys. Numbers hash as float64 (see
+    sketches.hash_values), so a key hashes alike whether an engine typed it
+    as an integer or a decimal.
+    """
+    import pyarrow as pa
+
+    from sketches import hash_values
+    from staging import arrow_to_pandas
+
+    return hash_values(arrow_to_pandas(pa.table({"key": keys}))["key"])
+
+
+def bucket_ids(keys, buckets: int):
+    """Bucket of every key of an Arrow array: its hash modulo buckets"""
+    import numpy as np
+
+    return (key_hashes(keys) % np.uint64(buckets)).astype(np.int64)
+
+
+def cluster_order(table, columns: Sequence[str]):
+    """
+    Row order clustering a table on columns: sorted for one column, Z-order
+    (interleaved bits of every column's dense rank) for several, so that
+    rows close in each of the columns end up in the same files and row groups
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if len(table) < 2:
+        return pa.array(np.arange(len(table)))
+    if len(columns) == 1:
+        return pc.sort_indices(table, [(columns[0], "ascending")], null_placement="at_end")
+    bits = min(32, 64 // len(columns))
+    z = np.zeros(len(table), dtype=np.uint64)
+    for dimension, name in enumerate(columns):
+        rank = pc.rank(table[name].combine_chunks(), tiebreaker="dense", null_placement="at_end")
+        rank = rank.to_numpy().astype(np.uint64) - np.uint64(1)
+        top = int(rank.max())
+        if top:
+            # Stretch every column's ranks over the same bits, so no column dominates the order
+            rank = (rank.astype(np.float64) * ((1 << bits) - 1) / top).astype(np.uint64)
+        for bit in range(bits):
+            z |= ((rank >> np.uint64(bit)) & np.uint64(1)) << np.uint64(bit * len(columns) + dimension)
+    return pa.array(np.argsort(z, kind="stable"))
+
+
+@dataclass
+class MergeResult:
+    """What one merge changed"""
+    version: int
+    inserted: int
+    updated: int
+    deleted: int
+    # DELETEs of keys the target did not hold
+    ignored_deletes: int
+    buckets_rewritten: int
+    buckets: int
+    # Existing files the merge read and replaced, and the rows they held
+    files_rewritten: int
+    rows_rewritten: int
+    files: int
+    rows: int
+    seconds: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class ScanStats:
+    """How much of the table a scan had to read"""
+    files: int = 0
+    files_read: int = 0
+    row_groups: int = 0
+    row_groups_read: int = 0
+    rows: int = 0
+    rows_read: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class MergeTarget:
+    """A bucketed, clustered and indexed Parquet table under path, merged into by key"""
+
+    def __init__(self, path: str, key: str, buckets: int = DEFAULT_TARGET_BUCKETS,
+                 operation_column: str = OPERATION_COLUMN, cluster_by: Optional[Sequence[str]] = None,
+                 file_rows: int = DEFAULT_FILE_ROWS, bloom: bool = True):
+        if buckets < 1:
+            raise ValueError("A merge target needs at least one bucket")
+        if file_rows < 1:
+            raise ValueError("Target files need room for at least one row")
+        self.path = path
+        self.key = key
+        self.operation_column = operation_column
+        self.file_rows = file_rows
+        # Whether written files get a Bloom filter of their keys
+        self.bloom = bloom
+        manifest = self.manifest()
+        # An existing table keeps the layout it was created with
+        self.buckets = manifest["buckets"] if manifest else buckets
+        self.cluster_by = manifest["cluster_by"] if manifest else list(cluster_by or [key])
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.path, MANIFEST)
+
+    def manifest(self) -> Optional[Dict[str, Any]]:
+        """The committed manifest, or None before the first merge"""
+        try:
+            with open(self.manifest_path) as handle:
+                manifest = json.load(handle)
+        except FileNotFoundError:
+            return None
+        if manifest["format"] == 1:
+            # One unindexed file per bucket; its next merge rewrites it clustered and indexed
+            manifest["files"] = {bucket: [dict(entry, index=None)] for bucket, entry in manifest["files"].items()}
+            manifest["cluster_by"] = [manifest["key"]]
+        return manifest
+
+    def _schema(self, manifest: Dict[str, Any]):
+        import pyarrow as pa
+        return pa.ipc.read_schema(pa.py_buffer(bytes.fromhex(manifest["schema"])))
+
+    def files(self, manifest: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Data files of the committed version, in bucket order"""
+        manifest = manifest or self.manifest()
+        if manifest is None:
+            return []
+        buckets = sorted(manifest["files"].items(), key=lambda item: int(item[0]))
+        return [os.path.join(self.path, entry["path"]) for _, entries in buckets for entry in entries]
+
+    def read(self, columns: Optional[List[str]] = None):
+        """The committed version as an Arrow table (None before the first merge)"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        manifest = self.manifest()
+        if manifest is None:
+            return None
+        tables = [pq.read_table(path, columns=columns) for path in self.files(manifest)]
+        if not tables:
+            schema = self._schema(manifest)
+            return schema.empty_table().select(columns) if columns else schema.empty_table()
+        return pa.concat_tables(tables)
+
+    def _row_groups(self, entry: Dict[str, Any], equals=None, ranges=None) -> List[int]:
+        """Row groups of a file that may hold matching rows (all of them for unindexed files)"""
+        import pyarrow.parquet as pq
+
+        if entry["index"] is None:
+            return list(range(pq.ParquetFile(os.path.join(self.path, entry["path"])).num_row_groups))
+        return matching_row_groups(entry["index"], equals, ranges)
+
+    def scan(self, keys: Optional[Sequence] = None, ranges: Optional[Dict[str, Tuple[Any, Any]]] = None,
+             columns: Optional[List[str]] = None):
+        """
+        Rows whose key is one of keys and whose columns lie within ranges
+        (inclusive (low, high) bounds, either of which may be None), reading
+        only the buckets, files and row groups the index cannot rule out.
+        Returns the rows (None before the first merge) and the ScanStats.
+        """
+        import numpy as np
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        manifest = self.manifest()
+        if manifest is None:
+            return None, ScanStats()
+        schema = self._schema(manifest)
+        ranges = dict(ranges or {})
+        unknown = [name for name in list(ranges) + list(columns or []) if name not in schema.names]
+        if unknown:
+            raise ValueError(f"Unknown target columns: {', '.join(unknown)}")
+
+        def typed(value, name):
+            try:
+                return None if value is None else pa.scalar(value).cast(schema.field(name).type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, TypeError) as e:
+                raise ValueError(f"{value!r} is not a valid {name} value: {e}")
+
+        bounds = {name: (typed(low, name), typed(high, name)) for name, (low, high) in ranges.items()}
+        buckets = manifest["files"]
+        equals = None
+        if keys is not None:
+            try:
+                key_values = pa.array(list(keys)).cast(schema.field(self.key).type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError, TypeError) as e:
+                raise ValueError(f"Keys are not valid {self.key} values: {e}")
+            hashes = key_hashes(key_values)
+            equals = (self.key, key_values.to_pylist(), hashes)
+            wanted = {str(bucket) for bucket in (hashes % np.uint64(self.buckets)).astype(np.int64)}
+            buckets = {bucket: entries for bucket, entries in buckets.items() if bucket in wanted}
+        index_ranges = {name: tuple(None if bound is None else bound.as_py() for bound in pair)
+                        for name, pair in bounds.items()}
+
+        stats = ScanStats()
+        for entries in manifest["files"].values():
+            for entry in entries:
+                stats.files += 1
+                stats.rows += entry["rows"]
+                stats.row_groups += len(entry["index"]["row_groups"]) if entry["index"] else 1
+        read_columns = None if columns is None else list(dict.fromkeys(list(columns) + [self.key] + list(ranges)))
+        projected = schema if read_columns is None else pa.schema([schema.field(name) for name in read_columns])
+        tables = [projected.empty_table()]
+        for entries in buckets.values():
+            for entry in entries:
+                row_groups = self._row_groups(entry, equals, index_ranges)
+                if not row_groups:
+                    continue
+                table = pq.ParquetFile(os.path.join(self.path, entry["path"])).read_row_groups(
+                    row_groups, columns=read_columns)
+                stats.files_read += 1
+                stats.row_groups_read += len(row_groups)
+                stats.rows_read += len(table)
+                tables.append(table.cast(projected))
+
+        # Pruning is conservative, the rows read are filtered exactly
+        table = pa.concat_tables(tables)
+        mask = pa.array(np.ones(len(table), dtype=bool))
+        if equals is not None:
+            mask = pc.and_(mask, pc.is_in(table[self.key], value_set=key_values))
+        for name, (low, high) in bounds.items():
+            if low is not None:
+                mask = pc.and_(mask, pc.greater_equal(table[name], low))
+            if high is not None:
+                mask = pc.and_(mask, pc.less_equal(table[name], high))
+        table = table.filter(pc.fill_null(mask, False))
+        return (table.select(columns) if columns is not None else table), stats
+
+    def _prepare(self, delta, schema):
+        """The delta in the target's schema, checked for one row per key"""
+        import pyarrow.compute as pc
+
+        if self.key not in delta.column_names:
+            raise ValueError(f"Merge key {self.key} is not a column of the delta")
+        if delta[self.key].null_count:
+            raise ValueError(f"Delta has rows without a {self.key}")
+        missing = [name for name in self.cluster_by if name not in delta.column_names]
+        if missing:
+            raise ValueError(f"Delta lacks the columns the target is clustered on: {', '.join(missing)}")
+        delta = delta.replace_schema_metadata(None)
+        if schema is not None:
+            missing = [name for name in schema.names if name not in delta.column_names]
+            if missing:
+                raise ValueError(f"Delta lacks target columns {', '.join(missing)}")
+            try:
+                delta = delta.select(schema.names).cast(schema)
+            except (TypeError, ValueError, NotImplementedError) as e:
+                raise ValueError(f"Delta does not match the target schema: {e}")
+        if pc.count_distinct(delta[self.key]).as_py() != len(delta):
+            raise ValueError(f"Delta has several rows for some {self.key} values; deduplicate it first")
+        return delta
+
+    def _write_files(self, data_dir: str, bucket: int, version: int, table) -> List[Dict[str, Any]]:
+        """Write rows of a bucket clustered into files of at most file_rows rows; returns their manifest entries"""
+        import pyarrow.parquet as pq
+
+        table = table.take(cluster_order(table, self.cluster_by))
+        entries = []
+        for start in range(0, len(table), self.file_rows):
+            chunk = table.slice(start, self.file_rows)
+            name = f"bucket-{int(bucket):05d}-v{version:06d}-{uuid.uuid4().hex}.parquet"
+            pq.write_table(chunk, os.path.join(data_dir, name), row_group_size=ROW_GROUP_ROWS)
+            entries.append({
+                "path": os.path.join("data", name),
+                "rows": len(chunk),
+                "index": file_index(os.path.join(data_dir, name), list(dict.fromkeys([self.key] + self.cluster_by)),
+                                    bloom_column=self.key if self.bloom else None,
+                                    bloom_hashes=key_hashes(chunk[self.key]) if self.bloom else None),
+            })
+        return entries
+
+    def _merge_bucket(self, data_dir: str, bucket: int, version: int, schema, entries, changes, is_delete):
+        """
+        Apply a bucket's changes. The files that may hold a changed key (by
+        their key range and Bloom filter) and the files under a quarter of
+        file_rows are read, merged with the changes and written anew; the
+        others are kept as they are. Returns the (inserted, updated, deleted,
+        ignored deletes) counts, the files written and the files replaced.
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        equals = (self.key, changes[self.key].to_pylist(), key_hashes(changes[self.key]))
+        affected = [entry for entry in entries
+                    if entry["rows"] < self.file_rows // 4 or self._row_groups(entry, equals)]
+        current = pa.concat_tables([schema.empty_table()] + [
+            pq.read_table(os.path.join(self.path, entry["path"])).cast(schema) for entry in affected])
+        # Matched keys are replaced (UPDATE) or dropped (DELETE), new ones appended (INSERT).
+        # The files left alone cannot hold a changed key, so matching against the others is exact
+        matched = pc.is_in(changes[self.key], value_set=current[self.key]).to_numpy(zero_copy_only=False)
+        counts = ((~matched & ~is_delete).sum(), (matched & ~is_delete).sum(),
+                  (matched & is_delete).sum(), (~matched & is_delete).sum())
+        kept = current.filter(pc.invert(pc.is_in(current[self.key], value_set=changes[self.key])))
+        merged = pa.concat_tables([kept, changes.filter(pa.array(~is_delete))])
+        return counts, self._write_files(data_dir, bucket, version, merged), affected
+
+    def merge(self, delta) -> MergeResult:
+        """
+        Merge a delta (an Arrow table or a Parquet file or directory) into the
+        table and commit a new version
+        """
+        import numpy as np
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        start = time.time()
+        if isinstance(delta, str):
+            delta = pq.read_table(delta)
+
+        with _table_lock(self.path):
+            manifest = self.manifest()
+            schema = None
+            if manifest is not None:
+                if manifest["key"] != self.key:
+                    raise ValueError(f"Target {self.path} is keyed by {manifest['key']}, not {self.key}")
+                schema = self._schema(manifest)
+            delta = self._prepare(delta, schema)
+            schema = delta.schema
+            version = (manifest["version"] if manifest else 0) + 1
+            files = dict(manifest["files"]) if manifest else {}
+
+            if self.operation_column in delta.column_names:
+                operations = pc.utf8_upper(pc.utf8_trim_whitespace(delta[self.operation_column].cast(pa.string())))
+                deletes = pc.fill_null(pc.equal(operations, DELETE), False).to_numpy(zero_copy_only=False)
+            else:
+                deletes = np.zeros(len(delta), dtype=bool)
+
+            data_dir = os.path.join(self.path, "data")
+            os.makedirs(data_dir, exist_ok=True)
+            codes = bucket_ids(delta[self.key], self.buckets)
+            order = np.argsort(codes, kind="stable")
+            touched, starts = np.unique(codes[order], return_index=True)
+            groups = np.split(order, starts[1:]) if len(order) else []
+
+            def merge_bucket(bucket, rows):
+                return self._merge_bucket(data_dir, bucket, version, schema, files.get(str(bucket), []),
+                                          delta.take(pa.array(rows)), deletes[rows])
+
+            # Bucket files are read and written in parallel; pyarrow releases the GIL
+            with ThreadPoolExecutor(max_workers=max(1, min(MERGE_THREADS, len(groups)))) as pool:
+                merged = list(pool.map(merge_bucket, touched, groups))
+            written = [entry["path"] for _, new_entries, _ in merged for entry in new_entries]
+            replaced = [entry for _, _, affected in merged for entry in affected]
+            for bucket, (_, new_entries, affected) in zip(touched, merged):
+                paths = {entry["path"] for entry in affected}
+                entries = [entry for entry in files.get(str(bucket), []) if entry["path"] not in paths] + new_entries
+                if entries:
+                    files[str(bucket)] = entries
+                else:
+                    files.pop(str(bucket), None)
+            counts = np.sum([counts for counts, _, _ in merged], axis=0) if merged else np.zeros(4, dtype=int)
+            inserted, updated, deleted, ignored_deletes = (int(count) for count in counts)
+
+            result = MergeResult(
+                version=version,
+                inserted=inserted,
+                updated=updated,
+                deleted=deleted,
+                ignored_deletes=ignored_deletes,
+                buckets_rewritten=len(touched),
+                buckets=self.buckets,
+                files_rewritten=len(replaced),
+                rows_rewritten=sum(entry["rows"] for entry in replaced),
+                files=sum(len(entries) for entries in files.values()),
+                rows=sum(entry["rows"] for entries in files.values() for entry in entries),
+                seconds=round(time.time() - start, 3),
+            )
+            new_manifest = {
+                "format": MANIFEST_VERSION,
+                "version": version,
+                "key": self.key,
+                "buckets": self.buckets,
+                "cluster_by": self.cluster_by,
+                "schema": schema.serialize().to_pybytes().hex(),
+                "files": files,
+                "replaced": [entry["path"] for entry in replaced],
+                "committed_at": time.time(),
+                "merge": result.to_dict(),
+            }
+            temp_path = f"{self.manifest_path}.tmp-{uuid.uuid4().hex}"
+            try:
+                with open(temp_path, "w") as handle:
+                    json.dump(new_manifest, handle)
+                os.replace(temp_path, self.manifest_path)
+            except BaseException:
+                for path in written:
+                    os.remove(os.path.join(self.path, path))
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+            # Files replaced by the previous commit are no longer read by anyone
+            for path in (manifest or {}).get("replaced", []):
+                full_path = os.path.join(self.path, path)
+                if os.path.exists(full_path):
+                    os.remove(full_path)
+        return result
@@ -0,0 +1,135 @@
+"""
+Per-client workspaces for the web application
+
+Each browser session gets a Workspace holding its upload, its latest results
+and its FAIR scheduler pool, so concurrent users no longer overwrite each
+other's state. Workspaces idle for longer than the TTL are evicted: their
+upload directory is deleted, their runs are cancelled and their scheduler
+pool is handed to the next new workspace (Spark cannot drop a pool, so pool
+names are recycled rather than created per client).
+"""
+
+import glob
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+DEFAULT_WORKSPACE_TTL_SECONDS = 3600
+
+# Minimum interval between eviction sweeps
+EVICTION_INTERVAL_SECONDS = 60
+
+
+@dataclass
+class Workspace:
+    """Upload, results and scheduler pool of one client session"""
+    id: str
+    directory: str
+    pool: str
+    created_at: float = field(default_factory=time.time)
+    last_access: float = field(default_factory=time.time)
+    upload: Optional[Dict[str, Any]] = None
+    results: Optional[Dict[str, Any]] = None
+
+    def clear(self):
+        """Forget the upload and results and delete the uploaded files"""
+        self.upload = None
+        self.results = None
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def upload_path(self, filename: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{uuid.uuid4()}_{filename}")
+
+    def result_path(self, run_id: str, suffix: str = ".parquet") -> str:
+        """Where a run stores its full output (Parquet, or CSV without pyarrow)"""
+        directory = os.path.join(self.directory, "results")
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{run_id}{suffix}")
+
+    def metrics_path(self, run_id: str, bins: str) -> str:
+        """Where the dashboard profiles of a run are cached, one file per histogram bin strategy"""
+        return self.result_path(run_id, f".metrics.{bins}.npz")
+
+    def set_results(self, results: Dict[str, Any]):
+        """Make results current and delete the stored output and metrics of the results they replace"""
+        previous, self.results = self.results, results
+        if previous and previous.get("result_path") and previous["result_path"] != results.get("result_path"):
+            remove_result(previous["result_path"])
+            for path in glob.glob(self.result_path(previous["result_id"], ".metrics.*.npz")):
+                remove_result(path)
+
+
+def remove_result(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+class WorkspaceRegistry:
+    """Thread-safe map of workspace id -> Workspace with TTL eviction"""
+
+    def __init__(self, root: str, ttl_seconds: float = DEFAULT_WORKSPACE_TTL_SECONDS,
+                 on_evict: Optional[Callable[[Workspace], None]] = None):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self._on_evict = on_evict or (lambda workspace: None)
+        self._workspaces: Dict[str, Workspace] = {}
+        self._free_pools: List[str] = []
+        self._pool_count = 0
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, workspace_id: Optional[str]) -> Optional[Workspace]:
+        """The live workspace with this id (touched), or None"""
+        with self._lock:
+            workspace = self._workspaces.get(workspace_id) if workspace_id else None
+            if workspace is not None:
+                workspace.last_access = time.time()
+            return workspace
+
+    def create(self) -> Workspace:
+        with self._lock:
+            if self._free_pools:
+                pool = self._free_pools.pop()
+            else:
+                self._pool_count += 1
+                pool = f"workspace-{self._pool_count}"
+            workspace_id = uuid.uuid4().hex
+            workspace = Workspace(id=workspace_id, directory=os.path.join(self.root, workspace_id), pool=pool)
+            self._workspaces[workspace_id] = workspace
+            return workspace
+
+    def get_or_create(self, workspace_id: Optional[str]) -> Workspace:
+        return self.get(workspace_id) or self.create()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._workspaces)
+
+    def evict_expired(self, force: bool = False) -> int:
+        """
+        Evict workspaces idle for longer than the TTL; sweeps at most once per
+        EVICTION_INTERVAL_SECONDS unless forced. Returns the number evicted.
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_sweep < EVICTION_INTERVAL_SECONDS:
+                return 0
+            self._last_sweep = now
+            expired = [workspace for workspace in self._workspaces.values()
+                       if now - workspace.last_access > self.ttl_seconds]
+            for workspace in expired:
+                del self._workspaces[workspace.id]
+        for workspace in expired:
+            self._on_evict(workspace)
+            workspace.clear()
+            with self._lock:
+                self._free_pools.append(workspace.pool)
+        return len(expired)